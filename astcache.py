@@ -0,0 +1,101 @@
+"""
+astcache.py — on-disk cache of parsed .kuda files.
+
+parse_file(path) returns the AST of a file, lexing and parsing it only when
+the source changed. The pickled tree lives next to the source:
+
+    lib.kuda  ->  __kudacache__/lib.kudac
+
+A cache file holds two pickles: a header (format tag, mtime, size, sha256
+of the source) and the ProgramNode. The tag is derived from the lexer and
+parser sources, so editing either of them invalidates every cache. When
+mtime/size differ but the content hash still matches (a touched or
+re-checked-out file), the tree is reused and the header refreshed.
+
+KUDA_NO_CACHE=1 turns the cache off. A cache that cannot be read or
+written (read-only directory, corrupt file) is silently ignored.
+"""
+
+import hashlib
+import os
+import pickle
+
+CACHE_DIR = '__kudacache__'
+FORMAT = 1
+_tag = None
+
+
+def cache_tag():
+    """Format version + fingerprint of lexer.py and parser.py."""
+    global _tag
+    if _tag is None:
+        h = hashlib.sha256(str(FORMAT).encode())
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in ('lexer.py', 'parser.py'):
+            with open(os.path.join(here, name), 'rb') as f:
+                h.update(f.read())
+        _tag = f'kudac-{FORMAT}-{h.hexdigest()[:16]}'
+    return _tag
+
+
+def cache_path(path):
+    path = os.path.abspath(path)
+    name = os.path.splitext(os.path.basename(path))[0] + '.kudac'
+    return os.path.join(os.path.dirname(path), CACHE_DIR, name)
+
+
+def parse_source(source):
+    from lexer import Lexer
+    from parser import Parser
+    return Parser(Lexer(source).tokenize()).parse()
+
+
+def parse_file(path):
+    """AST of a .kuda file, from __kudacache__ when it is up to date."""
+    if os.environ.get('KUDA_NO_CACHE'):
+        with open(path, 'r', encoding='utf-8') as f:
+            return parse_source(f.read())
+
+    st = os.stat(path)
+    cpath = cache_path(path)
+    header = None
+    try:
+        with open(cpath, 'rb') as f:
+            header = pickle.load(f)
+            if header[0] == cache_tag() and header[1:3] == (st.st_mtime_ns, st.st_size):
+                return pickle.load(f)
+    except Exception:
+        header = None
+
+    with open(path, 'rb') as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    if header and header[0] == cache_tag() and header[3] == digest:
+        try:
+            with open(cpath, 'rb') as f:
+                pickle.load(f)
+                ast = pickle.load(f)
+            _write(cpath, (cache_tag(), st.st_mtime_ns, st.st_size, digest), ast)
+            return ast
+        except Exception:
+            pass
+
+    # jak open(..., 'r'): uniwersalne końce linii
+    source = raw.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+    ast = parse_source(source)
+    _write(cpath, (cache_tag(), st.st_mtime_ns, st.st_size, digest), ast)
+    return ast
+
+
+def _write(cpath, header, ast):
+    tmp = f'{cpath}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(cpath), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(ast, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cpath)
+    except Exception:
+        # read-only katalog, zbyt głębokie drzewo dla pickle itp. — bez cache
+        try: os.unlink(tmp)
+        except Exception: pass
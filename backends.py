@@ -0,0 +1,187 @@
+"""
+backends.py — static backend-capability analysis.
+
+One pass over the AST lists every construct one of the backends cannot
+run, with its line, so run_fast picks C, mixed mode or the interpreter up
+front instead of compiling first and falling back when gcc fails.
+`kuda check --backend file.kuda` prints the same report.
+
+When the walk finds nothing, the program also goes through codegen's
+front end (type inference and C generation, no gcc). What codegen cannot
+type, such as the list parameter of a generator it never sees called,
+becomes a finding too, so 'c' means codegen has produced the program.
+run_fast compiles that C (report.c_code) and does not generate it again;
+if gcc still rejects it, the program runs in mixed mode.
+"""
+
+from parser import *
+
+# use <module> names the interpreter provides itself (Interpreter.exec_use)
+KUDA_STDLIB = ('json', 'path', 'env', 'http')
+
+C_BACKEND      = 'C'
+INTERP_BACKEND = 'interpreter'
+
+
+class Finding:
+    def __init__(self, line, construct, unsupported):
+        self.line = line                # source line (0 if unknown)
+        self.construct = construct      # human-readable construct name
+        self.unsupported = unsupported  # backend that cannot run it
+
+    def __repr__(self):
+        return f'Finding({self.line}, {self.construct!r}, {self.unsupported!r})'
+
+
+class BackendReport:
+    def __init__(self, findings, generator=None, c_code=None):
+        self.findings = sorted(findings, key=lambda f: f.line)
+        self.generator = generator  # CGenerator that produced c_code
+        self.c_code = c_code        # the whole program in C, when backend == 'c'
+
+    def blocks(self, backend):
+        return [f for f in self.findings if f.unsupported == backend]
+
+    @property
+    def backend(self):
+        """'c' when the whole program compiles, otherwise 'mixed' (C where possible)."""
+        return 'mixed' if self.blocks(C_BACKEND) else 'c'
+
+    def format(self, path=''):
+        lines = [f'{path}: backend report' if path else 'Backend report']
+        if not self.findings:
+            lines.append('  everything is supported by both backends')
+        for f in self.findings:
+            where = f'line {f.line}' if f.line else 'line ?'
+            lines.append(f'  {where:<9} {f.construct:<44} not in {f.unsupported}')
+        if self.backend == 'c':
+            choice = 'C (compiled)'
+        else:
+            choice = 'mixed (C for functions that compile alone, interpreter for the rest)'
+        lines.append(f'Backend: {choice}')
+        if self.blocks(INTERP_BACKEND) and self.backend != 'c':
+            lines.append('Warning: some constructs only work compiled and others only interpreted')
+        return '\n'.join(lines)
+
+
+def _line(node, default):
+    return node.line or default
+
+
+def _is_data_chain(n):
+    if isinstance(n, IdentNode) and n.name == 'data': return True
+    if isinstance(n, AttrNode): return _is_data_chain(n.obj)
+    if isinstance(n, CallNode): return _is_data_chain(n.func)
+    return False
+
+
+def _is_str_value(n):
+    if isinstance(n, StringNode): return True
+    if isinstance(n, BinOpNode) and n.op == '+':
+        return _is_str_value(n.left) or _is_str_value(n.right)
+    if isinstance(n, CallNode) and isinstance(n.func, IdentNode):
+        return n.func.name in ('str', 'caps', 'small', 'trim', 'input', 'read')
+    return False
+
+
+def analyze(ast, source_file=None):
+    """Walk the whole program and return a BackendReport."""
+    from codegen import CGenerator, CompileError
+    from mixed import bound_names, free_names
+    findings = []
+    has_net = any(isinstance(s, NetNode) for s in ast.statements)
+    c_libs = CGenerator.C_LIBS
+
+    def add(node, line, what, backend=C_BACKEND):
+        findings.append(Finding(_line(node, line), what, backend))
+
+    def visit(node, line, fun, top):
+        line = _line(node, line)
+        if isinstance(node, DictNode):
+            add(node, line, 'dict literal')
+        elif isinstance(node, TupleNode):
+            add(node, line, 'tuple')
+        elif isinstance(node, AnonFunNode):
+            add(node, line, 'anonymous fun (closure)')
+        elif isinstance(node, FunNode) and not top:
+            add(node, line, f"nested fun '{node.name}' (closure)")
+        elif isinstance(node, EachUnpackNode):
+            add(node, line, f"each {', '.join(node.vars)} in ... (unpacking)")
+        elif isinstance(node, ModelNode):
+            add(node, line, f"model '{node.name}'")
+        elif isinstance(node, UseNode) and node.filepath is None:
+            if node.module in KUDA_STDLIB:
+                add(node, line, f"stdlib module '{node.module}'")
+            elif node.module in c_libs:
+                add(node, line, f"C library '{node.module}'", INTERP_BACKEND)
+            else:
+                add(node, line, f"Python module '{node.module}'")
+        elif isinstance(node, ListNode) and any(isinstance(e, ListNode) for e in node.elements):
+            add(node, line, 'nested list literal')
+        elif isinstance(node, ExternNode) and node.name is not None:
+            add(node, line, f"extern C function '{node.name}'", INTERP_BACKEND)
+        elif isinstance(node, YieldNode):
+            if fun is None:
+                add(node, line, 'yield outside of a function')
+            elif _is_str_value(node.value):
+                add(node, line, f"generator '{fun}' yields strings")
+        elif isinstance(node, (TryNode, CheckNode)):
+            if fun is not None and CGenerator()._has_yield([node]):
+                kind = 'try' if isinstance(node, TryNode) else 'check'
+                add(node, line, f"yield inside {kind} in generator '{fun}'")
+
+        # DataBuilder: C builds it only as a net's ~data (or data.cust for it)
+        if isinstance(node, NetNode):
+            return
+        if isinstance(node, AssignNode):
+            if isinstance(node.name, AttrNode) and _is_data_chain(node.name):
+                return
+            if top and has_net and _is_data_chain(node.value):
+                return
+        if _is_data_chain(node):
+            add(node, line, 'DataBuilder dataset used as a value')
+            return
+
+        if isinstance(node, ModelNode):
+            for m in node.body:
+                if isinstance(m, FunNode):
+                    for s in m.body:
+                        visit(s, line, f'{node.name}.{m.name}', False)
+            return
+        if isinstance(node, FunNode):
+            for s in node.body:
+                visit(s, line, node.name, False)
+            return
+        for child in node.children():
+            visit(child, line, fun, False)
+
+    for stmt in ast.statements:
+        visit(stmt, 0, None, True)
+
+    # top-level variables are locals of main() in C, a fun cannot see them
+    top_vars = set()
+    for s in ast.statements:
+        if not isinstance(s, (FunNode, ModelNode, NetNode, NetLoadNode, UseNode, ExternNode)):
+            top_vars |= bound_names(s)
+    for f in ast.statements:
+        if not isinstance(f, FunNode):
+            continue
+        used = free_names(f) & top_vars
+        for n in walk(f):
+            name = n.name if isinstance(n, (IdentNode, AugAssignNode)) else None
+            if name in used:
+                add(n, f.line, f"fun '{f.name}' uses top-level variable '{name}'")
+                used.discard(name)
+
+    if any(f.unsupported == C_BACKEND for f in findings):
+        return BackendReport(findings)
+
+    # codegen's own limits: its type inference decides what it can emit
+    gen = CGenerator()
+    try:
+        # generate() inlines use "file.kuda" into the statements — keep the caller's tree intact
+        c_code = gen.generate(ProgramNode(list(ast.statements)), source_file=source_file)
+    except CompileError as e:
+        findings.append(Finding(e.line, e.msg, C_BACKEND))
+        return BackendReport(findings)
+    return BackendReport(findings, gen, c_code)
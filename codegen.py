@@ -3,8 +3,33 @@ from parser import *
 import math
 
 class CompileError(Exception):
-    def __init__(self, msg):
-        super().__init__(f'[Kuda CompileError] {msg}')
+    def __init__(self, msg, line=0):
+        self.msg = msg
+        self.line = line    # source line (0 if unknown), for backends.analyze()
+        super().__init__(f'[Kuda CompileError] line {line}: {msg}' if line else f'[Kuda CompileError] {msg}')
+
+
+_openmp = None
+
+def openmp_flags():
+    """['-fopenmp'] when gcc can build OpenMP code, else [] (nets then train on one thread)."""
+    global _openmp
+    if _openmp is None:
+        import os, subprocess, tempfile
+        src = tempfile.NamedTemporaryFile(suffix='.c', delete=False, mode='w')
+        src.write('#include <omp.h>\nint main(void){return omp_get_max_threads() < 1;}\n')
+        src.close()
+        out = src.name[:-2]
+        try:
+            ok = subprocess.run(['gcc', '-fopenmp', '-o', out, src.name],
+                                capture_output=True).returncode == 0
+        except OSError:
+            ok = False
+        for f in (src.name, out):
+            try: os.unlink(f)
+            except OSError: pass
+        _openmp = ['-fopenmp'] if ok else []
+    return _openmp
 
 
 class CGenerator:
@@ -36,7 +61,18 @@ class CGenerator:
         self.extern_decls = []  # extern C function declarations
         self.extern_funcs = {}  # name -> ret_type for extern functions
         self.extra_c_files = []  # .c files to compile alongside main
+        self.source_file = None  # .kuda being compiled (for __kudacache__ paths)
+        self.quantize_loaded = False  # kuda build --quantize: net.load() nets predict in int8
+        self.quantized_nets = set()   # nets the program calls .quantize() on (int8 code only for them)
         self.namespaces = {}   # alias -> set of function/var names from that file
+        self._gen_ctx = None   # set while lowering a generator function
+        self._try_nest = []    # 'try' / 'loop' markers of the function being emitted
+        self.library = None    # mixed mode: names of the functions built into a shared library
+        self._fun_ret = None   # (name, return type from _scan_return_type) of the function being emitted
+        self._try_vars = set() # variables assigned inside try bodies (declared volatile)
+        self.uses_try = False
+        self.uses_data = False # a net builds its DataBuilder dataset in C
+        self._data_cust = None # C lines of the compiled data.cust function
 
     def fresh_tmp(self):
         self.tmp_count += 1
@@ -45,24 +81,6 @@ class CGenerator:
     def emit(self, line=''):
         self.lines.append('    ' * self.indent + line)
 
-    def _uses_data_builder(self, ast):
-        """Check if AST uses data builder — if so, fall back to interpreter."""
-        import ast as pyast
-        src = str([(type(s).__name__, getattr(s, '__dict__', {})) for s in ast.statements])
-        # Simple check: walk all nodes looking for IdentNode with name 'data'
-        def _check(node):
-            if isinstance(node, IdentNode) and node.name == 'data':
-                return True
-            for attr in vars(node).values() if hasattr(node, '__dict__') else []:
-                if hasattr(attr, '__dict__') and _check(attr): return True
-                if isinstance(attr, list):
-                    for item in attr:
-                        if hasattr(item, '__dict__') and _check(item): return True
-            return False
-        for stmt in ast.statements:
-            if _check(stmt): return True
-        return False
-
     def _prefix_ast(self, stmts, prefix):
         """Rename all FunNode names and top-level AssignNode names with prefix__."""
         renamed = set()
@@ -80,8 +98,7 @@ class CGenerator:
     def _expand_uses(self, ast, source_file=None):
         """Recursively expand use "file.kuda" by inlining the file's AST."""
         import os
-        from lexer import Lexer as _Lex
-        from parser import Parser as _Par, ProgramNode as _ProgNode
+        from astcache import parse_file
         expanded = []
         for stmt in ast.statements:
             if isinstance(stmt, UseNode) and stmt.filepath is not None:
@@ -94,10 +111,8 @@ class CGenerator:
                     path = os.path.join(base, stmt.filepath)
                 path = os.path.normpath(path)
                 if not os.path.exists(path):
-                    raise CompileError(f"use: plik nie istnieje: '{path}'", getattr(stmt, 'line', None))
-                with open(path, 'r', encoding='utf-8') as f:
-                    src = f.read()
-                sub_ast = _Par(_Lex(src).tokenize()).parse()
+                    raise CompileError(f"use: plik nie istnieje: '{path}'", stmt.line)
+                sub_ast = parse_file(path)
                 # Recursively expand nested uses relative to this file
                 sub_ast = self._expand_uses(sub_ast, path)
                 if stmt.alias:
@@ -112,7 +127,12 @@ class CGenerator:
         ast.statements = expanded
         return ast
 
-    def generate(self, ast, source_file=None):
+    def generate(self, ast, source_file=None, library=None):
+        """
+        Translate a program to C. With library = a set of function names only
+        those functions are emitted (no nets, models or main) — mixed mode
+        builds them into a shared library for the interpreter.
+        """
         self.includes.add('#include <stdio.h>')
         self.includes.add('#include <stdlib.h>')
         self.includes.add('#include <string.h>')
@@ -121,9 +141,18 @@ class CGenerator:
         self.includes.add('#include <unistd.h>')
         self.includes.add('#include <ctype.h>')
         self.includes.add('#include <stdint.h>')
+        self.includes.add('#include <setjmp.h>')
 
         # Expand use "file.kuda" statements by inlining their AST
+        self.source_file = source_file
+        self.library = library
         ast = self._expand_uses(ast, source_file)
+        self._try_vars = set()
+        self.uses_try = self._scan_try(ast.statements, False)
+        # net.quantize(): only these nets get int8 weights and forward_q
+        self.quantized_nets = {n.func.obj.name for s in ast.statements for n in walk(s)
+                               if isinstance(n, CallNode) and isinstance(n.func, AttrNode)
+                               and n.func.attr == 'quantize' and isinstance(n.func.obj, IdentNode)}
 
         func_decls = []
         model_decls = []
@@ -151,6 +180,9 @@ class CGenerator:
         # Register function return types before scanning call sites
         self.func_return_types = {}  # func_name -> return type
         for f in func_decls:
+            if self._has_yield(f.body):
+                self.func_return_types[f.name] = 'gen'
+                continue
             ret = self._scan_return_type(f.body)
             self.func_return_types[f.name] = ret
 
@@ -162,6 +194,10 @@ class CGenerator:
         # Third pass: scan call sites with enriched type info
         self._scan_call_sites(ast.statements)
 
+        if library is not None:
+            func_decls = [f for f in func_decls if f.name in library]
+            model_decls, net_decls, net_load_decls = [], [], []
+
         runtime = self._runtime()
 
         # Generate model structs and methods
@@ -191,6 +227,20 @@ class CGenerator:
         for f in func_decls:
             func_code.extend(self._gen_function(f))
 
+        if library is not None:
+            final = sorted(self.includes) + ['']
+            final.extend(self.extern_decls)
+            final.extend(runtime)
+            final.append('')
+            # returned strings are always a fresh copy, the interpreter frees it with kuda_lib_free
+            final.append('char* kuda_lib_own(const char* s) { return strdup(s ? s : ""); }')
+            final.append('')
+            final.extend(func_code)
+            final.append('void kuda_lib_init(void) { srand(time(NULL)); }')
+            final.append('void kuda_lib_flush(void) { fflush(stdout); }')
+            final.append('void kuda_lib_free(void* p) { free(p); }')
+            return '\n'.join(final)
+
         # Register net names so they're known during prescan
         for n in net_decls:
             self.vars[n.name] = 'net'
@@ -205,12 +255,8 @@ class CGenerator:
         self.emit('srand(time(NULL));')
         for vname, vtyp in pre.items():
             self.vars[vname] = vtyp
-            if vtyp == 'str':          self.emit(f'char* {vname} = NULL;')
-            elif vtyp == 'bool':       self.emit(f'int {vname} = 0;')
-            elif vtyp in ('list', 'strlist'):  self.emit(f'KList* {vname} = NULL;')
-            elif vtyp in self.models:  self.emit(f'{vtyp}* {vname} = NULL;')
-            elif vtyp == 'net':        pass  # net structs declared in net_code
-            else:                      self.emit(f'double {vname} = 0;')
+            if vtyp == 'net': continue  # net structs declared in net_code
+            self.emit(self._local_decl(vname, vtyp))
         for stmt in main_stmts:
             self._gen_stmt(stmt)
         self.emit('return 0;')
@@ -226,6 +272,12 @@ class CGenerator:
             final.append('')
         final.extend(runtime)
         final.append('')
+        if self.uses_data:
+            final.extend(self._data_runtime())
+            final.append('')
+            if self._data_cust:
+                final.extend(self._data_cust)
+                final.append('')
         final.extend(model_code)
         final.append('')
         final.extend(net_code)
@@ -278,6 +330,8 @@ class CGenerator:
                         var_types[v] = self.func_return_types[fname]
                     elif fname in STR_FUNCS or self.func_return_types.get(fname) == 'str':
                         var_types[v] = 'str'
+                    elif self.func_return_types.get(fname) == 'gen':
+                        var_types[v] = 'gen'
                     elif fname in LIST_FUNCS or self.func_return_types.get(fname) == 'list':
                         var_types[v] = 'list'
                     elif fname in STRLIST_FUNCS:
@@ -311,6 +365,9 @@ class CGenerator:
                 var_types[node.var] = 'double'
                 self._deep_prescan(node.body, var_types)
             if isinstance(node, TilNode):    self._deep_prescan(node.body, var_types)
+            if isinstance(node, TryNode):
+                self._deep_prescan(node.try_body, var_types)
+                for _, _, body in node.fail_clauses: self._deep_prescan(body, var_types)
 
     def _scan_call_sites(self, stmts):
         """Scan all statements to find how functions are called and what types they receive."""
@@ -332,6 +389,7 @@ class CGenerator:
 
         def get_arg_type(arg):
             if is_str_expr(arg): return 'str'
+            if isinstance(arg, (ListNode, ListCompNode)): return 'list'
             if isinstance(arg, IdentNode):
                 return self.vars.get(arg.name, 'double')
             elif isinstance(arg, CallNode) and isinstance(arg.func, IdentNode):
@@ -349,19 +407,25 @@ class CGenerator:
                 for i in range(max(len(arg_types), len(existing))):
                     a = arg_types[i] if i < len(arg_types) else 'double'
                     e = existing[i] if i < len(existing) else 'double'
-                    merged.append(a if (a in self.models or a == 'str') else e)
+                    merged.append(a if (a in self.models or a in ('str', 'list', 'strlist')) else e)
                 self.func_param_types[fname] = merged
 
+        def register_calls(expr):
+            # every call in the expression, also inside method chains and
+            # arguments: sq2([1, 2]).collect(), out(f(g([1])))
+            if expr is None: return
+            for n in walk(expr):
+                register_call(n)
+
         def scan(stmts):
             for node in stmts:
                 # Scan calls at statement level AND inside assignment RHS
-                register_call(node)
-                if isinstance(node, AssignNode):
-                    register_call(node.value)
-                if isinstance(node, OutNode):
-                    register_call(node.value)
-                if isinstance(node, GiveNode):
-                    register_call(node.value)
+                if isinstance(node, (CallNode, AttrNode)):
+                    register_calls(node)
+                if isinstance(node, (AssignNode, AugAssignNode, OutNode, GiveNode)):
+                    register_calls(node.value)
+                if isinstance(node, EachNode):
+                    register_calls(node.iterable)
 
                 if isinstance(node, FunNode):    scan(node.body)
                 if isinstance(node, ModelNode):
@@ -373,6 +437,9 @@ class CGenerator:
                 if isinstance(node, RepeatNode): scan(node.body)
                 if isinstance(node, EachNode):   scan(node.body)
                 if isinstance(node, TilNode):    scan(node.body)
+                if isinstance(node, TryNode):
+                    scan(node.try_body)
+                    for _, _, body in node.fail_clauses: scan(body)
 
         scan(stmts)
 
@@ -383,6 +450,104 @@ class CGenerator:
             '#define MAX_MAT  512',
             '#define MAX_LIST 1024',
             '',
+            '/* kuda build --f32 (-DKUDA_F32): Matrix values stored and computed as float;',
+            '   KUDA_R(tanh) picks the float twin (tanhf) of a math / activation function */',
+            '#ifdef KUDA_F32',
+            'typedef float kuda_real;',
+            '#define KUDA_R(fn) fn##f',
+            '#else',
+            'typedef double kuda_real;',
+            '#define KUDA_R(fn) fn',
+            '#endif',
+            '',
+            '/* Error context stack for try/fail: kuda_raise() longjmps to the',
+            '   innermost try. Outside a try the error sites keep their lenient',
+            '   results (0, empty string), as compiled programs always did. */',
+            '#define KUDA_MAX_TRY 256',
+            'static jmp_buf* kuda_try_stack[KUDA_MAX_TRY];',
+            'static int kuda_try_depth = 0;',
+            'static const char* kuda_err_type = "";',
+            'static char kuda_err_msg[MAX_STR];',
+            '',
+            'void kuda_try_push(jmp_buf* jb) {',
+            '    if (kuda_try_depth >= KUDA_MAX_TRY) {',
+            '        printf("[Kuda RuntimeError] try nested too deeply\\n"); exit(1);',
+            '    }',
+            '    kuda_try_stack[kuda_try_depth++] = jb;',
+            '}',
+            '',
+            'void kuda_raise(const char* type, const char* msg) {',
+            '    kuda_err_type = type;',
+            '    if (msg != kuda_err_msg) snprintf(kuda_err_msg, MAX_STR, "%s", msg);',
+            '    if (kuda_try_depth > 0) longjmp(*kuda_try_stack[--kuda_try_depth], 1);',
+            '    printf("[Kuda RuntimeError] %s\\n", kuda_err_msg);',
+            '    exit(1);',
+            '}',
+            '',
+            '/* fail ErrType: same classes as Interpreter.exec_try — division by zero',
+            '   and bad indexes are RuntimeError_ there, so RuntimeError catches them */',
+            'int kuda_err_is(const char* type) {',
+            '    if (strcmp(kuda_err_type, type) == 0) return 1;',
+            '    if (strcmp(type, "RuntimeError") == 0)',
+            '        return strcmp(kuda_err_type, "ZeroDivision") == 0 || strcmp(kuda_err_type, "IndexError") == 0;',
+            '    return 0;',
+            '}',
+            '',
+            'char* kuda_err_text() {',
+            '    char* s = malloc(strlen(kuda_err_msg) + 1);',
+            '    strcpy(s, kuda_err_msg);',
+            '    return s;',
+            '}',
+            '',
+            'double kuda_div(double a, double b) {',
+            '    if (b == 0 && kuda_try_depth > 0) kuda_raise("ZeroDivision", "Division by zero");',
+            '    return a / b;',
+            '}',
+            '',
+            'double kuda_mod(double a, double b) {',
+            '    if ((long long)b == 0) {',
+            '        if (kuda_try_depth > 0) kuda_raise("ZeroDivision", "Division by zero");',
+            '        return 0;',
+            '    }',
+            '    return (double)((long long)a % (long long)b);',
+            '}',
+            '',
+            'void kuda_index_error() {',
+            '    if (kuda_try_depth > 0) kuda_raise("IndexError", "Index error: list index out of range");',
+            '}',
+            '',
+            'void kuda_file_error(const char* path) {',
+            '    char m[MAX_STR];',
+            '    if (kuda_try_depth == 0) return;',
+            '    snprintf(m, MAX_STR, "[Errno 2] No such file or directory: \'%s\'", path);',
+            '    kuda_raise("FileError", m);',
+            '}',
+            '',
+            '/* int("12") like Python: surrounding spaces allowed, anything else is a ValueError */',
+            'double kuda_parse_int(const char* s) {',
+            '    char* end; char m[MAX_STR];',
+            '    long long v = strtoll(s, &end, 10);',
+            '    while (isspace((unsigned char)*end)) end++;',
+            '    if (end != s && *end == 0) return (double)v;',
+            '    if (kuda_try_depth > 0) {',
+            '        snprintf(m, MAX_STR, "invalid literal for int() with base 10: \'%s\'", s);',
+            '        kuda_raise("ValueError", m);',
+            '    }',
+            '    return (double)atoi(s);',
+            '}',
+            '',
+            'double kuda_parse_float(const char* s) {',
+            '    char* end; char m[MAX_STR];',
+            '    double v = strtod(s, &end);',
+            '    while (isspace((unsigned char)*end)) end++;',
+            '    if (end != s && *end == 0) return v;',
+            '    if (kuda_try_depth > 0) {',
+            '        snprintf(m, MAX_STR, "could not convert string to float: \'%s\'", s);',
+            '        kuda_raise("ValueError", m);',
+            '    }',
+            '    return atof(s);',
+            '}',
+            '',
             '/* Dynamic List Type */',
             'typedef struct {',
             '    double* data;',
@@ -398,6 +563,10 @@ class CGenerator:
             '    return l;',
             '}',
             '',
+            'void kuda_list_free(KList* l) {',
+            '    if (l) { free(l->data); free(l); }',
+            '}',
+            '',
             'void kuda_list_add(KList* l, double v) {',
             '    if (l->len >= l->cap) {',
             '        l->cap *= 2;',
@@ -415,12 +584,12 @@ class CGenerator:
             '    l->data[l->len++] = (double)(intptr_t)ptr;',
             '}',
             'KList* kuda_list_grab_ptr(KList* l, int idx) {',
-            '    if (idx < 0 || idx >= l->len) return NULL;',
+            '    if (idx < 0 || idx >= l->len) { kuda_index_error(); return NULL; }',
             '    return (KList*)(intptr_t)l->data[idx];',
             '}',
             '',
             'double kuda_list_grab(KList* l, int idx) {',
-            '    if (idx < 0 || idx >= l->len) return 0;',
+            '    if (idx < 0 || idx >= l->len) { kuda_index_error(); return 0; }',
             '    return l->data[idx];',
             '}',
             '',
@@ -474,10 +643,44 @@ class CGenerator:
             '    return count;',
             '}',
             '',
-            'typedef struct { double data[MAX_MAT][MAX_MAT]; int rows; int cols; } KMatrix;',
+            'typedef struct { kuda_real data[MAX_MAT][MAX_MAT]; int rows; int cols; } KMatrix;',
+            '',
+            '/* Generators (fun with yield) - step() resumes at the saved label */',
+            'typedef struct KGen {',
+            '    int state;           /* resume label, -1 when exhausted */',
+            '    double value;        /* last yielded value */',
+            '    int (*step)(struct KGen*);',
+            '    void* frame;         /* locals of the current run */',
+            '    void* start;         /* frame right after the call, for collect() */',
+            '    size_t frame_size;',
+            '} KGen;',
+            '',
+            'KGen* kuda_gen_new(int (*step)(KGen*), void* frame, size_t size) {',
+            '    KGen* g = malloc(sizeof(KGen));',
+            '    g->state = 0; g->value = 0; g->step = step; g->frame_size = size;',
+            '    g->frame = malloc(size); memcpy(g->frame, frame, size);',
+            '    g->start = malloc(size); memcpy(g->start, frame, size);',
+            '    return g;',
+            '}',
+            'int kuda_gen_step(KGen* g) { return g->state < 0 ? 0 : g->step(g); }',
+            '/* next() past the end: NAN stands for the interpreter\'s None (it equals',
+            '   no value, not even a yielded 0); g.done() tells the end apart */',
+            'double kuda_gen_next(KGen* g) { return kuda_gen_step(g) ? g->value : NAN; }',
+            'int kuda_gen_done(KGen* g) { return g->state < 0; }',
+            'KList* kuda_gen_collect(KGen* g) {',
+            '    /* like KudaGenerator.collect(): a fresh run, the original is not consumed */',
+            '    KGen run = *g;',
+            '    run.state = 0;',
+            '    run.frame = malloc(g->frame_size); memcpy(run.frame, g->start, g->frame_size);',
+            '    KList* r = kuda_list_new();',
+            '    while (kuda_gen_step(&run)) kuda_list_add(r, run.value);',
+            '    free(run.frame);',
+            '    return r;',
+            '}',
             '',
             '/* Print */',
             'void kuda_print_double(double v) {',
+            '    if (isnan(v)) { printf("None\\n"); return; }   /* g.next() past the end */',
             '    if (v == (long long)v && v > -1e15 && v < 1e15) printf("%lld\\n", (long long)v);',
             '    else printf("%.6g\\n", v);',
             '}',
@@ -589,6 +792,17 @@ class CGenerator:
             'double kuda_linear(double x){return x;}',
             'double kuda_linear_act(double x){return x;}',
             'double kuda_linear_d(double x){(void)x;return 1.0;}',
+            '/* ~dtype = f32 nets and KUDA_F32 matrices: the same in float */',
+            'float kuda_sigmoidf(float x){return 1.0f/(1.0f+expf(-x));}',
+            'float kuda_sigmoid_df(float x){return x*(1.0f-x);}',
+            'float kuda_tanh_actf(float x){return tanhf(x);}',
+            'float kuda_tanh_df(float x){return 1.0f-x*x;}',
+            'float kuda_reluf(float x){return x>0.0f?x:0.0f;}',
+            'float kuda_relu_df(float x){return x>0.0f?1.0f:0.0f;}',
+            'float kuda_leakyf(float x){return x>0.0f?x:0.01f*x;}',
+            'float kuda_leaky_df(float x){return x>0.0f?1.0f:0.01f;}',
+            'float kuda_linear_actf(float x){return x;}',
+            'float kuda_linear_df(float x){(void)x;return 1.0f;}',
             'double kuda_clip(double x,double lo,double hi){return x<lo?lo:(x>hi?hi:x);}',
             '/* AI - list operations */',
             'double kuda_dot(KList* a,KList* b){double s=0;int n=a->len<b->len?a->len:b->len;for(int i=0;i<n;i++)s+=a->data[i]*b->data[i];return s;}',
@@ -600,6 +814,115 @@ class CGenerator:
             '/* AI - weight init */',
             'KList* kuda_xav(int n_in,int n_out){KList* r=kuda_list_new();double std=sqrt(2.0/(n_in+n_out));for(int i=0;i<n_in*n_out;i++){double u1=(double)(rand()+1)/(RAND_MAX+1.0),u2=(double)(rand()+1)/(RAND_MAX+1.0);kuda_list_add(r,std*sqrt(-2.0*log(u1))*cos(2.0*3.14159265*u2));}return r;}',
             'KList* kuda_he(int n_in){KList* r=kuda_list_new();double std=sqrt(2.0/n_in);for(int i=0;i<n_in;i++){double u1=(double)(rand()+1)/(RAND_MAX+1.0),u2=(double)(rand()+1)/(RAND_MAX+1.0);kuda_list_add(r,std*sqrt(-2.0*log(u1))*cos(2.0*3.14159265*u2));}return r;}',
+            '/* AI - net.load(): "key": [v, ...] (or "key": v) from a JSON file, returns values read */',
+            'int kuda_json_doubles(FILE* f,const char* key,double* out,int n){',
+            '    char pat[64]; snprintf(pat,sizeof pat,"\\"%s\\"",key);',
+            '    int m=strlen(pat),hit=0,c,got=0; rewind(f);',
+            '    while((c=fgetc(f))!=EOF){',
+            '        hit=(c==pat[hit])?hit+1:(c==pat[0]);',
+            '        if(hit<m) continue;',
+            '        hit=0; while((c=fgetc(f))==\' \'||c==\'\\t\'||c==\'\\n\'||c==\'\\r\');',
+            '        if(c==\':\') break;',
+            '    }',
+            '    if(c==EOF) return 0;',
+            '    while((c=fgetc(f))==\' \'||c==\'\\t\'||c==\'\\n\'||c==\'\\r\');',
+            '    if(c!=\'[\'){ungetc(c,f); return n>0&&fscanf(f,"%lf",out)==1;}',
+            '    while(got<n&&fscanf(f," %lf",&out[got])==1){got++; if(fscanf(f," ,")==EOF) break;}',
+            '    return got;',
+            '}',
+            '/* "key": "text" from a JSON file into out (n bytes with the 0); 1 when found */',
+            'int kuda_json_str(FILE* f,const char* key,char* out,int n){',
+            '    char pat[64]; snprintf(pat,sizeof pat,"\\"%s\\"",key);',
+            '    int m=strlen(pat),hit=0,c,k=0; rewind(f);',
+            '    while((c=fgetc(f))!=EOF){',
+            '        hit=(c==pat[hit])?hit+1:(c==pat[0]);',
+            '        if(hit<m) continue;',
+            '        hit=0; while((c=fgetc(f))==\' \'||c==\'\\t\'||c==\'\\n\'||c==\'\\r\');',
+            '        if(c==\':\') break;',
+            '    }',
+            '    if(c==EOF) return 0;',
+            '    while((c=fgetc(f))==\' \'||c==\'\\t\'||c==\'\\n\'||c==\'\\r\');',
+            '    if(c!=\'"\') return 0;',
+            '    while((c=fgetc(f))!=EOF&&c!=\'"\'&&k<n-1) out[k++]=c;',
+            '    out[k]=0; return 1;',
+            '}',
+            '/* AI - net .kw: binary weights, header + little-endian arrays (format: netfile.py) */',
+            'unsigned kuda_crc32(unsigned c,const void* p,size_t n){',
+            '    static unsigned t[256]; const unsigned char* b=p;',
+            '    if(!t[1]) for(unsigned i=0;i<256;i++){unsigned r=i;for(int k=0;k<8;k++)r=(r&1)?0xEDB88320u^(r>>1):r>>1;t[i]=r;}',
+            '    c=~c; while(n--) c=t[(c^*b++)&255]^(c>>8); return ~c;',
+            '}',
+            'int kuda_is_kw(const char* p){size_t n=strlen(p);return n>3&&strcmp(p+n-3,".kw")==0;}',
+            '/* ds: bytes per value of the arrays a (8 double, 4 float), written as they are;',
+            '   tail: tail_n bytes after them (~checkpoint: training position), inside the CRC */',
+            'int kuda_kw_write(const char* path,const int* ly,int nl,int act,int act_out,int opt,long opt_t,int ds,void** a,const int* n,int na,const void* tail,int tail_n){',
+            '    FILE* f=fopen(path,"wb"); if(!f) return 0;',
+            '    uint32_t h[7]={1,(uint32_t)ds,(uint32_t)nl,(uint32_t)act,(uint32_t)act_out,(uint32_t)opt,0}; int64_t t=opt_t; uint32_t l;',
+            '    for(int i=0;i<na;i++) h[6]=kuda_crc32(h[6],a[i],(size_t)ds*n[i]);',
+            '    h[6]=kuda_crc32(h[6],tail,tail_n);',
+            '    fwrite("KUDW",1,4,f); fwrite(h,4,7,f); fwrite(&t,8,1,f);',
+            '    for(int i=0;i<nl+nl%2;i++){l=i<nl?(uint32_t)ly[i]:0; fwrite(&l,4,1,f);}',
+            '    for(int i=0;i<na;i++) fwrite(a[i],ds,n[i],f);',
+            '    if(tail_n) fwrite(tail,1,tail_n,f);',
+            '    return fclose(f)==0;',
+            '}',
+            '/* -1: no file, 0: bad file (reported), 1: ok; ~opt state only when the file has the same opt.',
+            '   Values are converted when the file dtype differs from ds (the arrays a).',
+            '   tail: the first tail_n bytes after the arrays (zeros past the end of the file). */',
+            'int kuda_kw_read(const char* path,const int* ly,int nl,int opt,long* opt_t,int ds,void** a,const int* n,int na,void* tail,int tail_n){',
+            '    FILE* f=fopen(path,"rb"); if(!f) return -1;',
+            '    char mg[4]; uint32_t h[7],l,crc=0; int64_t t; const char* err=NULL; unsigned char buf[4096]; double v[512];',
+            '    if(fread(mg,1,4,f)!=4||memcmp(mg,"KUDW",4)||fread(h,4,7,f)!=7||fread(&t,8,1,f)!=1) err="nie jest plikiem .kw";',
+            '    else if(h[0]!=1) err="nieznana wersja .kw";',
+            '    else if(h[1]!=8&&h[1]!=4) err="zly dtype";',
+            '    else if(h[2]!=(uint32_t)nl) err="inna liczba warstw";',
+            '    for(int i=0;!err&&i<nl+nl%2;i++) if(fread(&l,4,1,f)!=1||(i<nl&&l!=(uint32_t)ly[i])) err="inne rozmiary warstw";',
+            '    if(!err&&(int)h[5]!=opt) na=2;',
+            '    for(int i=0;!err&&i<na;i++){',
+            '        if(h[1]==(uint32_t)ds){ if(fread(a[i],ds,n[i],f)!=(size_t)n[i]) err="plik uciety"; else crc=kuda_crc32(crc,a[i],(size_t)ds*n[i]); continue; }',
+            '        for(int j=0;!err&&j<n[i];j+=512){',
+            '            int m=n[i]-j<512?n[i]-j:512;',
+            '            if(fread(v,h[1],m,f)!=(size_t)m){err="plik uciety";break;}',
+            '            crc=kuda_crc32(crc,v,h[1]*(size_t)m);',
+            '            for(int k=0;k<m;k++){',
+            '                double x=h[1]==8?v[k]:((float*)v)[k];',
+            '                if(ds==8) ((double*)a[i])[j+k]=x; else ((float*)a[i])[j+k]=(float)x;',
+            '            }',
+            '        }',
+            '    }',
+            '    size_t r,tg=0; if(tail_n) memset(tail,0,tail_n);',
+            '    while(!err&&(r=fread(buf,1,sizeof buf,f))>0){',
+            '        if(tg<(size_t)tail_n){size_t c=r<tail_n-tg?r:tail_n-tg; memcpy((char*)tail+tg,buf,c); tg+=c;}',
+            '        crc=kuda_crc32(crc,buf,r);',
+            '    }',
+            '    if(!err&&crc!=h[6]) err="zla suma kontrolna (plik uszkodzony)";',
+            '    fclose(f);',
+            '    if(err){printf("net.load: %s: %s\\n",path,err); return 0;}',
+            '    if(na>2&&opt_t) *opt_t=(long)t;',
+            '    return 1;',
+            '}',
+            '/* AI - net.quantize(): weight bytes, and float vs int8 outputs (pf, pq) on validation targets t */',
+            'double kuda_quant_report(const char* name,KList* pf,KList* pq,KList* t,long wf,long wq){',
+            '    printf("net.quantize: %s: int8, wagi %ld -> %ld B\\n",name,wf,wq);',
+            '    if(!t) return 0.0;',
+            '    int n=pf->len<t->len?pf->len:t->len,cf=0,cq=0; double ef=0,eq=0,md=0;',
+            '    for(int i=0;i<n;i++){',
+            '        double f=pf->data[i],q=pq->data[i],y=t->data[i];',
+            '        ef+=(f-y)*(f-y); eq+=(q-y)*(q-y); if(fabs(f-q)>md) md=fabs(f-q);',
+            '        cf+=(int)round(f)==(int)round(y); cq+=(int)round(q)==(int)round(y);',
+            '    }',
+            '    double d=n?(double)n:1.0;',
+            '    printf("  %d values | float: mse %.6f acc %.2f%% | int8: mse %.6f acc %.2f%% | max diff %.6f\\n",',
+            '           n,ef/d,100.0*cf/d,eq/d,100.0*cq/d,md);',
+            '    return (cq-cf)/d;',
+            '}',
+            '/* AI - net.stats(): wall clock, and one value by name (order: netengine.STATS) */',
+            'double kuda_wall(void){struct timespec t;clock_gettime(CLOCK_MONOTONIC,&t);return t.tv_sec+t.tv_nsec*1e-9;}',
+            'double kuda_net_stat(const double* st,const char* key){',
+            '    static const char* k[]={"epochs","time","samples_per_sec","loss","grad_norm","lr"};',
+            '    for(int i=0;i<6;i++) if(strcmp(k[i],key)==0) return st[i];',
+            '    printf("net.stats: nieznany klucz \'%s\'\\n",key); return 0.0;',
+            '}',
             '/* AI - metrics */',
             'double kuda_acc(KList* pred,KList* target){int c=0;for(int i=0;i<target->len;i++)if((int)round(pred->data[i])==(int)round(target->data[i]))c++;return (double)c/target->len;}',
             'double kuda_crent(KList* pred,KList* target){double s=0;for(int i=0;i<target->len;i++){double p=pred->data[i]<1e-15?1e-15:pred->data[i];s+=target->data[i]*log(p);}return -s/target->len;}',
@@ -623,7 +946,7 @@ class CGenerator:
             'KMatrix* kuda_mat_rand(int r,int c){',
             '    KMatrix* m=kuda_mat_new(r,c);',
             '    double sc=sqrt(2.0/(r+c));',
-            '    for(int i=0;i<r;i++) for(int j=0;j<c;j++) m->data[i][j]=((double)rand()/RAND_MAX*2-1)*sc;',
+            '    for(int i=0;i<r;i++) for(int j=0;j<c;j++) m->data[i][j]=(kuda_real)(((double)rand()/RAND_MAX*2-1)*sc);',
             '    return m;',
             '}',
             'double kuda_mat_get(KMatrix* m,int r,int c){return m->data[r][c];}',
@@ -645,8 +968,8 @@ class CGenerator:
             '    return C;',
             '}',
             'KMatrix* kuda_mat_scale(KMatrix* A,double s){',
-            '    KMatrix* C=kuda_mat_new(A->rows,A->cols);',
-            '    for(int i=0;i<A->rows;i++) for(int j=0;j<A->cols;j++) C->data[i][j]=A->data[i][j]*s;',
+            '    KMatrix* C=kuda_mat_new(A->rows,A->cols); kuda_real k=(kuda_real)s;',
+            '    for(int i=0;i<A->rows;i++) for(int j=0;j<A->cols;j++) C->data[i][j]=A->data[i][j]*k;',
             '    return C;',
             '}',
             'KMatrix* kuda_mat_T(KMatrix* A){',
@@ -678,17 +1001,17 @@ class CGenerator:
             '/* Matrix activation functions (use scalar ones defined earlier) */',
             'KMatrix* kuda_mat_sigmoid(KMatrix* A){',
             '    KMatrix* C=kuda_mat_new(A->rows,A->cols);',
-            '    for(int i=0;i<A->rows;i++) for(int j=0;j<A->cols;j++) C->data[i][j]=kuda_sigmoid(A->data[i][j]);',
+            '    for(int i=0;i<A->rows;i++) for(int j=0;j<A->cols;j++) C->data[i][j]=KUDA_R(kuda_sigmoid)(A->data[i][j]);',
             '    return C;',
             '}',
             'KMatrix* kuda_mat_sigmoid_deriv(KMatrix* A){',
             '    KMatrix* C=kuda_mat_new(A->rows,A->cols);',
-            '    for(int i=0;i<A->rows;i++) for(int j=0;j<A->cols;j++){double s=kuda_sigmoid(A->data[i][j]);C->data[i][j]=s*(1-s);}',
+            '    for(int i=0;i<A->rows;i++) for(int j=0;j<A->cols;j++){kuda_real s=KUDA_R(kuda_sigmoid)(A->data[i][j]);C->data[i][j]=s*(1-s);}',
             '    return C;',
             '}',
             'KMatrix* kuda_mat_relu(KMatrix* A){',
             '    KMatrix* C=kuda_mat_new(A->rows,A->cols);',
-            '    for(int i=0;i<A->rows;i++) for(int j=0;j<A->cols;j++) C->data[i][j]=kuda_relu(A->data[i][j]);',
+            '    for(int i=0;i<A->rows;i++) for(int j=0;j<A->cols;j++) C->data[i][j]=KUDA_R(kuda_relu)(A->data[i][j]);',
             '    return C;',
             '}',
             'KMatrix* kuda_mat_relu_deriv(KMatrix* A){',
@@ -698,7 +1021,7 @@ class CGenerator:
             '}',
             'KMatrix* kuda_mat_tanh(KMatrix* A){',
             '    KMatrix* C=kuda_mat_new(A->rows,A->cols);',
-            '    for(int i=0;i<A->rows;i++) for(int j=0;j<A->cols;j++) C->data[i][j]=tanh(A->data[i][j]);',
+            '    for(int i=0;i<A->rows;i++) for(int j=0;j<A->cols;j++) C->data[i][j]=KUDA_R(tanh)(A->data[i][j]);',
             '    return C;',
             '}',
             '',
@@ -769,8 +1092,9 @@ class CGenerator:
                     interp.exec(stmt, interp.global_env)
                 except Exception:
                     pass
-        _ACT_NAMES  = {'tanh', 'sigmoid', 'relu', 'leaky', 'linear'}
+        _ACT_NAMES  = {'tanh', 'sigmoid', 'relu', 'leaky', 'linear', 'softmax'}
         _INIT_NAMES = {'xav', 'he'}
+        from netengine import OPTIMIZERS as _OPT_NAMES, LOSSES as _LOSS_NAMES, SCHEDULES as _SCHED_NAMES
         _runtime_inputs  = None
         _runtime_targets = None
         for key, val_node in node.params.items():
@@ -792,11 +1116,47 @@ class CGenerator:
 
         def eval_fn(val_node):
             if isinstance(val_node, _IdentNode):
-                if val_node.name in _ACT_NAMES or val_node.name in _INIT_NAMES:
+                if val_node.name in _ACT_NAMES or val_node.name in _INIT_NAMES \
+                        or val_node.name in _OPT_NAMES or val_node.name in _LOSS_NAMES \
+                        or val_node.name in _SCHED_NAMES:
                     return val_node.name
             return interp.eval(val_node, interp.global_env)
 
-        result_lines, ninfo = gen_net_c(node, eval_fn)
+        # ~data = DataBuilder chain: build the samples in C at program start
+        # instead of baking every one of them into array literals
+        data_fill = None
+        if 'data' in node.params:
+            aliases = {s.name: s.value for s in (pre_stmts or [])
+                       if isinstance(s, _AssignNode) and isinstance(s.name, str)}
+            try:
+                spec = self._data_spec(node.params['data'], aliases, eval_fn)
+            except Exception:
+                spec = None
+            if spec and spec['target'] == 'cust' and self._data_cust is None:
+                self._data_cust = self._gen_data_cust(pre_stmts) or []
+            if spec and spec['target'] == 'cust' and not self._data_cust:
+                spec = None  # data.cust bound to something else: evaluate it as before
+            if spec:
+                data_fill = {
+                    'n_samples': spec['n_samples'],
+                    'n_inputs':  spec['n_inputs'],
+                    'n_outputs': 1,
+                    'fill':      self._data_fill_c(spec, node.name),
+                }
+                if spec['target'] == 'cust':
+                    data_fill['fill'].insert(0, 'kuda_data_cust_fn = kuda_data_cust;')
+                self.uses_data = True
+
+        blob = None if (_runtime_inputs and _runtime_targets) else self._data_blob_path(node.name)
+        result_lines, ninfo = gen_net_c(node, eval_fn, data_fill, blob,
+                                        quantize=node.name in self.quantized_nets)
+        if ninfo.get('signals'):
+            self.includes.add('#include <signal.h>')   # ~checkpoint: zapis na Ctrl-C
+        if ninfo.get('threads'):
+            # ~threads / KUDA_THREADS: OpenMP, when the compiler has it
+            for f in openmp_flags():
+                if f not in self.link_flags:
+                    self.link_flags.append(f)
 
         # If inputs/targets are runtime KList* variables, patch the train function
         # to read data from them dynamically instead of static arrays
@@ -810,6 +1170,177 @@ class CGenerator:
 
         return result_lines, ninfo
 
+    def _data_spec(self, val_node, aliases, eval_fn):
+        """
+        Read a DataBuilder chain (data.binary(3).random(50).parity,
+        data.numeric.sequential(0.0, 6.28, 0.1).sin, or a variable holding
+        one) the way DataBuilder would, without generating the samples.
+        Returns a dict describing the dataset, or None if it is not a chain.
+        """
+        from data_builder import DataBuilder
+        seen = set()
+        while isinstance(val_node, IdentNode) and val_node.name in aliases and val_node.name not in seen:
+            seen.add(val_node.name)
+            val_node = aliases[val_node.name]
+
+        steps = []
+        n = val_node
+        while True:
+            if isinstance(n, AttrNode):   steps.append((n.attr, None)); n = n.obj
+            elif isinstance(n, CallNode): steps.append((None, n.args)); n = n.func
+            else: break
+        if not (isinstance(n, IdentNode) and n.name == 'data') or not steps:
+            return None
+        steps.reverse()
+
+        spec = {'dtype': None, 'mode': None, 'args': None, 'n_bits': 2, 'target': None}
+        for attr, args in steps:
+            if args is not None:
+                vals = [eval_fn(a) for a in args]
+                if spec['dtype'] == 'binary' and spec['mode'] is None:
+                    spec['n_bits'] = int(vals[0])
+                else:
+                    spec['args'] = vals
+            elif attr in ('binary', 'numeric'):
+                spec['dtype'] = attr
+            elif attr in ('sequential', 'random'):
+                spec['mode'] = attr
+            elif attr in DataBuilder.TARGETS or attr == 'cust':
+                spec['target'] = attr
+            else:
+                return None
+        if spec['dtype'] is None or spec['target'] is None:
+            return None
+
+        if spec['dtype'] == 'binary':
+            spec['n_inputs'] = spec['n_bits']
+            if spec['mode'] == 'random':
+                spec['n_samples'] = int(spec['args'][0]) if spec['args'] else 100
+            else:
+                spec['n_samples'] = 2 ** spec['n_bits']
+        else:
+            if spec['mode'] is None or not spec['args']:
+                return None
+            spec['n_inputs'] = 1
+            if spec['mode'] == 'random':
+                spec['n_samples'] = int(spec['args'][0])
+            else:
+                # same float stepping as DataBuilder._gen_numeric
+                start, stop, step = (float(v) for v in spec['args'])
+                count, x = 0, start
+                while x <= stop + 1e-9:
+                    count += 1; x += step
+                spec['n_samples'] = count
+        return spec
+
+    def _data_fill_c(self, spec, name):
+        """C statements filling {name}_data_in / {name}_data_tgt from a DataBuilder spec."""
+        target = 'KD_' + spec['target'].upper()
+        if spec['dtype'] == 'binary':
+            count = spec['n_samples'] if spec['mode'] == 'random' else -1
+            return [f'kuda_data_binary({name}_data_in, {name}_data_tgt, {spec["n_bits"]}, {count}, {target});']
+        n = spec['n_samples']
+        if spec['mode'] == 'random':
+            _, lo, hi = (float(v) for v in spec['args'])
+            return [f'kuda_data_numeric({name}_data_in, {name}_data_tgt, {n}, {lo!r}, {hi!r}, 0.0, 1, {target});']
+        start, _, step = (float(v) for v in spec['args'])
+        return [f'kuda_data_numeric({name}_data_in, {name}_data_tgt, {n}, {start!r}, 0.0, {step!r}, 0, {target});']
+
+    def _gen_data_cust(self, pre_stmts):
+        """Compile data.cust = fun(bits): ... to a C target function taking a KList*."""
+        fn = None
+        for stmt in pre_stmts or []:
+            if (isinstance(stmt, AssignNode) and isinstance(stmt.name, AttrNode)
+                    and isinstance(stmt.name.obj, IdentNode) and stmt.name.obj.name == 'data'
+                    and stmt.name.attr == 'cust' and isinstance(stmt.value, AnonFunNode)):
+                fn = stmt.value
+        if fn is None or len(fn.params) != 1:
+            return None
+        self.func_param_types['kuda_data_cust'] = ['list']
+        self.func_return_types['kuda_data_cust'] = 'double'
+        return self._gen_function(FunNode('kuda_data_cust', fn.params, fn.body))
+
+    def _data_runtime(self):
+        """DataBuilder in C — only emitted when a net builds its dataset at runtime."""
+        return [
+            '/* DataBuilder: targets in DataBuilder.TARGETS order, then cust */',
+            'enum { KD_XOR, KD_KAND, KD_KOR, KD_NAND, KD_NOR, KD_PARITY, KD_SUM,',
+            '       KD_SQUARE, KD_SQRT, KD_SIN, KD_COS, KD_IDENTITY, KD_CUST };',
+            'double (*kuda_data_cust_fn)(KList*) = NULL;',
+            '',
+            'double kuda_data_target(double* in, int n, int target) {',
+            '    double x = in[0], s = 0; long long bx = 0, bs = 0; int ones = 0;',
+            '    for (int i = 0; i < n; i++) {',
+            '        s += in[i]; bx ^= (long long)in[i]; bs += (long long)in[i];',
+            '        if (in[i] == 1.0) ones++;',
+            '    }',
+            '    switch (target) {',
+            '        case KD_XOR:      return (double)bx;',
+            '        case KD_KAND:     return ones == n ? 1.0 : 0.0;',
+            '        case KD_KOR:      return ones > 0 ? 1.0 : 0.0;',
+            '        case KD_NAND:     return ones == n ? 0.0 : 1.0;',
+            '        case KD_NOR:      return ones > 0 ? 0.0 : 1.0;',
+            '        case KD_PARITY:   return bs % 2 == 0 ? 1.0 : 0.0;',
+            '        case KD_SUM:      return s;',
+            '        case KD_SQUARE:   return x * x;',
+            '        case KD_SQRT:     return sqrt(fabs(x));',
+            '        case KD_SIN:      return sin(x);',
+            '        case KD_COS:      return cos(x);',
+            '        case KD_IDENTITY: return x;',
+            '        case KD_CUST: {',
+            '            static KList* bits = NULL;',
+            '            if (!bits) bits = kuda_list_new();',
+            '            bits->len = 0;',
+            '            for (int i = 0; i < n; i++) kuda_list_add(bits, in[i]);',
+            '            return kuda_data_cust_fn(bits);',
+            '        }',
+            '    }',
+            '    return 0;',
+            '}',
+            '',
+            '/* data.binary(n_bits).sequential (count < 0) or .random(count) */',
+            'void kuda_data_binary(double* in, double* tgt, int n_bits, int count, int target) {',
+            '    int n = count < 0 ? 1 << n_bits : count;',
+            '    for (int s = 0; s < n; s++) {',
+            '        double* row = in + (long)s * n_bits;',
+            '        for (int b = 0; b < n_bits; b++)',
+            '            row[b] = count < 0 ? (double)((s >> (n_bits - 1 - b)) & 1) : (double)(rand() % 2);',
+            '        tgt[s] = kuda_data_target(row, n_bits, target);',
+            '    }',
+            '}',
+            '',
+            '/* data.numeric.sequential(a, _, step) or .random(n, a, b) */',
+            'void kuda_data_numeric(double* in, double* tgt, int n, double a, double b, double step, int random, int target) {',
+            '    double x = a;',
+            '    for (int s = 0; s < n; s++) {',
+            '        double v = random ? a + (b - a) * ((double)rand() / RAND_MAX) : x;',
+            '        x += step;',
+            '        in[s]  = round(v * 1e8) / 1e8;',
+            '        tgt[s] = kuda_data_target(&v, 1, target);',
+            '    }',
+            '}',
+        ]
+
+    def _data_blob_path(self, net_name):
+        """
+        File for a large ~data set of net_name (net.INLINE_DATA_MAX): in
+        __kudacache__ next to the source, or the temp dir when that is not
+        writable. It is only read while gcc runs; the binary embeds it.
+        """
+        import os, tempfile
+        from astcache import CACHE_DIR
+        src = self.source_file
+        stem = os.path.splitext(os.path.basename(src))[0] if src else 'kuda'
+        if src:
+            d = os.path.join(os.path.dirname(os.path.abspath(src)), CACHE_DIR)
+            try:
+                os.makedirs(d, exist_ok=True)
+                if os.access(d, os.W_OK):
+                    return os.path.join(d, f'{stem}.{net_name}.data')
+            except OSError:
+                pass
+        return os.path.join(tempfile.gettempdir(), f'kuda-{os.getpid()}.{stem}.{net_name}.data')
+
     def _patch_net_dynamic_data(self, lines, name, inputs_var, targets_var, ninfo):
         """Patch generated net C code to read inputs/targets from runtime KList* vars."""
         NAME = name.upper()
@@ -821,9 +1352,12 @@ class CGenerator:
         in_train = False
 
         for line in lines:
-            # Remove static data array declarations
-            if (f'static double {name}_data_in[]' in line or
-                    f'static double {name}_data_tgt[]' in line):
+            # Static data arrays become pointers to the runtime copy (~pack step reads them)
+            if f'static double {name}_data_in[]' in line:
+                new_lines.append(f'static double* {name}_data_in  = NULL;')
+                continue
+            if f'static double {name}_data_tgt[]' in line:
+                new_lines.append(f'static double* {name}_data_tgt = NULL;')
                 continue
 
             # Replace n_samples static decl with 0
@@ -849,6 +1383,7 @@ class CGenerator:
                 new_lines.append(f'        if(_row_in)  for(int _fi=0;_fi<{n_in}; _fi++) _dyn_inp[_si*{n_in} +_fi]=kuda_list_grab(_row_in, _fi);')
                 new_lines.append(f'        if(_row_tgt) for(int _fo=0;_fo<{n_out};_fo++) _dyn_tgt[_si*{n_out}+_fo]=kuda_list_grab(_row_tgt,_fo);')
                 new_lines.append(f'    }}')
+                new_lines.append(f'    {name}_data_in = _dyn_inp; {name}_data_tgt = _dyn_tgt;')
                 new_lines.append(f'    const int n = _dyn_n;')
                 new_lines.append(f'    const int ni = {n_in};')
                 new_lines.append(f'    const int no = {n_out};')
@@ -879,20 +1414,55 @@ class CGenerator:
 
         return patched
 
+    def _emit_kw_io(self, tmp, name, info, n_weights, n_biases, write):
+        """
+        net.write() / net.load() on a *.kw path ({tmp}_p): one runtime call
+        that moves {name}_W, {name}_B and the ~opt state as whole arrays.
+        Leaves an open `else {` for the JSON code that follows.
+        """
+        from netengine import OPTIMIZERS
+        from netfile import ACTS, OPTS
+        opt   = info.get('opt', 'sgd')
+        keys  = [k + p for k in OPTIMIZERS[opt] for p in 'WB']
+        arrs  = [f'{name}_W', f'{name}_B'] + [f'{name}_{k}' for k in keys]
+        lens  = [n_weights, n_biases] + [n_weights if k[1] == 'W' else n_biases for k in keys]
+        n_layers = len(info.get('layers', []))
+        ds = 4 if info.get('dtype') == 'f32' else 8
+        self.emit(f'  if(kuda_is_kw({tmp}_p)) {{')
+        self.emit(f'    void* {tmp}_a[] = {{{", ".join(arrs)}}};')
+        self.emit(f'    int {tmp}_n[] = {{{", ".join(str(n) for n in lens)}}};')
+        if write:
+            act = info.get('act', 'tanh')
+            act_out = info.get('act_out', act)
+            codes = ', '.join(str(ACTS.index(a) if a in ACTS else 0) for a in (act, act_out))
+            opt_t = f'{name}_opt_t' if opt != 'sgd' else '0'
+            self.emit(f'    if(kuda_kw_write({tmp}_p, {name}_layers, {n_layers}, {codes}, {OPTS.index(opt)}, '
+                      f'{opt_t}, {ds}, {tmp}_a, {tmp}_n, {len(arrs)}, NULL, 0))')
+            self.emit(f'      printf("Wagi zapisane do %s\\n", {tmp}_p);')
+        else:
+            opt_t = f'&{name}_opt_t' if opt != 'sgd' else 'NULL'
+            self.emit(f'    int {tmp}_r = kuda_kw_read({tmp}_p, {name}_layers, {n_layers}, {OPTS.index(opt)}, '
+                      f'{opt_t}, {ds}, {tmp}_a, {tmp}_n, {len(arrs)}, NULL, 0);')
+            self.emit(f'    if({tmp}_r > 0) printf("Wagi wczytane z %s\\n", {tmp}_p);')
+            self.emit(f'    else if({tmp}_r < 0) printf("Blad: nie mozna otworzyc %s\\n", {tmp}_p);')
+        self.emit(f'  }} else {{')
+
     def _gen_net_load_decl(self, node):
-        """Generate C declarations for ~name = net.load("file.json").
-        Reads the JSON at codegen time to know architecture,
+        """Generate C declarations for ~name = net.load("file.json" / "file.kw").
+        Reads the file header at codegen time to know architecture,
         then emits a _load() function that reads weights at runtime."""
-        import json as _json
+        import netfile
         from interpreter import Interpreter as _Interp
+        from net import gen_threads_c, gen_predict_batch_c, gen_quantize_c, gen_softmax_c
         interp = _Interp()
         path = interp.eval(node.path_node, interp.global_env)
 
         try:
-            with open(path) as _f:
-                data = _json.load(_f)
+            data = netfile.load_header(path)
         except FileNotFoundError:
             raise Exception(f"net.load: plik '{path}' nie istnieje (potrzebny przy kompilacji)")
+        except ValueError as e:
+            raise Exception(f"net.load: {e}")
 
         layers   = data['layers']
         act_name = data.get('act', 'tanh')
@@ -913,9 +1483,11 @@ class CGenerator:
             'relu':    ('kuda_relu',      'kuda_relu_d'),
             'leaky':   ('kuda_leaky',     'kuda_leaky_d'),
             'linear':  ('kuda_linear_act','kuda_linear_d'),
+            'softmax': ('kuda_linear_act','kuda_linear_d'),  # + gen_softmax_c po warstwie
         }
         af, af_d = act_c.get(act_name, ('kuda_tanh_act', 'kuda_tanh_d'))
         of, of_d = act_c.get(out_name, (af, af_d))
+        soft = out_name == 'softmax'
 
         L = []
         L.append(f'/* net.load: {name} from {path} */')
@@ -925,6 +1497,7 @@ class CGenerator:
         L.append(f'static int    {name}_n_inputs   = {n_inputs};')
         L.append(f'static int    {name}_n_outputs  = {n_outputs};')
         L.append(f'static int    {name}_n_samples  = 0;')
+        L.append(f'static double {name}_stats[6];  /* net.stats(): no training here */')
         L.append('')
 
         # activation wrappers
@@ -962,35 +1535,61 @@ class CGenerator:
         L.append(f'        }}')
         L.append(f'        w_off += ni*no;')
         L.append(f'    }}')
+        if soft:
+            L.extend(gen_softmax_c(f'acts[{NAME}_N_LAYERS-1][{{j}}]', n_outputs, 'double', 4))
         L.append(f'}}')
         L.append('')
 
-        # predict
-        L.append(f'static double {name}_predict(double* input) {{')
+        # predict (int8 after net.quantize() / kuda build --quantize)
+        quantize = self.quantize_loaded or name in self.quantized_nets
+        if quantize:
+            L.extend(gen_quantize_c(name, layers, (af, af_d, of, of_d), soft=soft))
+        L.append(f'static void {name}_predict_all(double* input, double* out_arr) {{')
+        if quantize:
+            L.append(f'    if({name}_q_on) {{ {name}_forward_q(input, out_arr); return; }}')
         L.append(f'    double acts[{NAME}_N_LAYERS][{NAME}_MAX_LAYER];')
         L.append(f'    {name}_forward(input, acts);')
-        L.append(f'    return acts[{NAME}_N_LAYERS-1][0];')
+        L.append(f'    for(int j=0; j<{n_outputs}; j++) out_arr[j] = acts[{NAME}_N_LAYERS-1][j];')
+        L.append(f'}}')
+        L.append(f'static double {name}_predict(double* input) {{')
+        L.append(f'    double _out[{n_outputs}];')
+        L.append(f'    {name}_predict_all(input, _out);')
+        L.append(f'    return _out[0];')
         L.append(f'}}')
         L.append('')
+        L.extend(gen_threads_c(name))
+        L.extend(gen_predict_batch_c(name, NAME, layers, (af, af_d, of, of_d), soft=soft, quantize=quantize))
+        for f in openmp_flags():
+            if f not in self.link_flags:
+                self.link_flags.append(f)
 
         # load function — reads weights from file at runtime
         L.append(f'static void {name}_load() {{')
-        L.append(f'    FILE* f = fopen("{path}", "r");')
-        L.append(f'    if(!f) {{ printf("net.load: nie mozna otworzyc {path}\\n"); return; }}')
-        L.append(f'    int wi=0, bi=0, in_w=0, in_b=0, c;')
-        L.append(f'    while((c=fgetc(f))!=EOF) {{')
-        L.append(f'        if(c==\'W\' && !in_w && !in_b) {{ fgetc(f);fgetc(f);fgetc(f); in_w=1; }}')
-        L.append(f'        else if(c==\'B\' && wi>={n_weights} && !in_b) {{ fgetc(f);fgetc(f);fgetc(f); in_b=1; in_w=0; }}')
-        L.append(f'        else if(in_w && (c==\'-\'||(c>=\'0\'&&c<=\'9\'))) {{')
-        L.append(f'            ungetc(c,f); double v; fscanf(f,"%lf",&v);')
-        L.append(f'            if(wi<{n_weights}) {name}_W[wi++]=v;')
-        L.append(f'        }} else if(in_b && (c==\'-\'||(c>=\'0\'&&c<=\'9\'))) {{')
-        L.append(f'            ungetc(c,f); double v; fscanf(f,"%lf",&v);')
-        L.append(f'            if(bi<{n_biases}) {name}_B[bi++]=v;')
-        L.append(f'        }}')
-        L.append(f'    }}')
-        L.append(f'    fclose(f);')
-        L.append(f'    printf("Wagi wczytane z {path}\\n");')
+        if netfile.is_kw(path):
+            # .kw: nagłówek sprawdzony, W i B jednym fread każde
+            L.append(f'    void* a[] = {{{name}_W, {name}_B}}; int n[] = {{{n_weights}, {n_biases}}};')
+            L.append(f'    int r = kuda_kw_read("{path}", {name}_layers, {n_layers}, 0, NULL, 8, a, n, 2, NULL, 0);')
+            L.append(f'    if(r < 0) printf("net.load: nie mozna otworzyc {path}\\n");')
+            L.append(f'    if(r > 0) printf("Wagi wczytane z {path}\\n");')
+        else:
+            L.append(f'    FILE* f = fopen("{path}", "r");')
+            L.append(f'    if(!f) {{ printf("net.load: nie mozna otworzyc {path}\\n"); return; }}')
+            L.append(f'    int wi=0, bi=0, in_w=0, in_b=0, c;')
+            L.append(f'    while((c=fgetc(f))!=EOF) {{')
+            L.append(f'        if(c==\'W\' && !in_w && !in_b) {{ fgetc(f);fgetc(f);fgetc(f); in_w=1; }}')
+            L.append(f'        else if(c==\'B\' && wi>={n_weights} && !in_b) {{ fgetc(f);fgetc(f);fgetc(f); in_b=1; in_w=0; }}')
+            L.append(f'        else if(in_w && (c==\'-\'||(c>=\'0\'&&c<=\'9\'))) {{')
+            L.append(f'            ungetc(c,f); double v; fscanf(f,"%lf",&v);')
+            L.append(f'            if(wi<{n_weights}) {name}_W[wi++]=v;')
+            L.append(f'        }} else if(in_b && (c==\'-\'||(c>=\'0\'&&c<=\'9\'))) {{')
+            L.append(f'            ungetc(c,f); double v; fscanf(f,"%lf",&v);')
+            L.append(f'            if(bi<{n_biases}) {name}_B[bi++]=v;')
+            L.append(f'        }}')
+            L.append(f'    }}')
+            L.append(f'    fclose(f);')
+            L.append(f'    printf("Wagi wczytane z {path}\\n");')
+        if self.quantize_loaded:
+            L.append(f'    {name}_quantize_w(); /* kuda build --quantize */')
         L.append(f'}}')
         L.append('')
 
@@ -998,6 +1597,9 @@ class CGenerator:
             'layers':   layers,
             'n_inputs': n_inputs,
             'n_outputs':n_outputs,
+            'act':      act_name,
+            'act_out':  out_name,
+            'quantize': quantize,
         }
         return L, ninfo
 
@@ -1147,11 +1749,7 @@ class CGenerator:
         elif isinstance(node, IfNode):
             self._gen_if_model(node, model_name)
         elif isinstance(node, GiveNode):
-            val, typ = self._gen_expr(node.value)
-            if typ == 'str' or typ in self.models:
-                self.emit(f'return {val};')
-            else:
-                self.emit(f'return (double)({val});')
+            self._gen_give(node)
         else:
             self._gen_stmt(node)
 
@@ -1174,6 +1772,7 @@ class CGenerator:
     def _gen_model_method(self, fun_node, model_name, fields):
         """Generate a C function for a model method."""
         old_lines, old_indent, old_vars = self.lines, self.indent, dict(self.vars)
+        old_nest, self._try_nest = self._try_nest, []
         self.lines = []; self.indent = 0
         
         params_no_self = [p for p in fun_node.params if p != 'self']
@@ -1196,10 +1795,8 @@ class CGenerator:
         pre = self._prescan_vars(fun_node.body, set(params_no_self) | {'self'})
         for vname, vtyp in pre.items():
             self.vars[vname] = vtyp
-            if vtyp == 'str':    self.emit(f'char* {vname} = NULL;')
-            elif vtyp == 'bool': self.emit(f'int {vname} = 0;')
-            elif vtyp in ('list', 'strlist'): self.emit(f'KList* {vname} = NULL;')
-            else:                self.emit(f'double {vname} = 0;')
+            if vtyp not in ('str', 'bool', 'list', 'strlist'): vtyp = 'double'
+            self.emit(self._local_decl(vname, vtyp))
         
         for stmt in fun_node.body:
             self._gen_model_stmt(stmt, model_name)
@@ -1213,6 +1810,7 @@ class CGenerator:
         
         result = self.lines
         self.lines, self.indent, self.vars = old_lines, old_indent, old_vars
+        self._try_nest = old_nest
         return result
 
     def _prescan_vars(self, stmts, known_params):
@@ -1292,8 +1890,18 @@ class CGenerator:
                                         and attr_node.obj.name in self._net_info):
                                     n_out = self._net_info[attr_node.obj.name].get('n_outputs', 1)
                                     found[node.name] = 'list' if n_out > 1 else 'double'
+                                elif (isinstance(attr_node.obj, IdentNode)
+                                        and attr_node.attr == 'predict_batch'
+                                        and attr_node.obj.name in self._net_info):
+                                    found[node.name] = 'list'
+                                elif (isinstance(attr_node.obj, IdentNode)
+                                        and attr_node.attr == 'stats'
+                                        and attr_node.obj.name in self._net_info):
+                                    found[node.name] = 'double' if node.value.args else 'list'
                                 elif attr_node.attr == 'cut':
                                     found[node.name] = 'strlist'
+                                elif attr_node.attr == 'collect':
+                                    found[node.name] = 'list'
                                 else:
                                     found.setdefault(node.name, 'double')
                             else:
@@ -1329,17 +1937,25 @@ class CGenerator:
                 if isinstance(node, RepeatNode): scan(node.body)
                 if isinstance(node, EachNode):   scan(node.body)
                 if isinstance(node, TilNode):    scan(node.body)
+                if isinstance(node, TryNode):
+                    scan(node.try_body)
+                    for _, _, body in node.fail_clauses: scan(body)
         scan(stmts)
         return found
 
     def _gen_function(self, node):
+        if isinstance(node, FunNode) and self._has_yield(node.body):
+            return self._gen_generator_function(node)
         old_lines, old_indent, old_vars = self.lines, self.indent, dict(self.vars)
+        old_nest, self._try_nest = self._try_nest, []
+        old_ret = self._fun_ret
         self.lines = []; self.indent = 0
         if isinstance(node, FunNode):
             ret_type = self._scan_return_type(node.body)
+            self._fun_ret = (node.name, ret_type)
             if ret_type == 'str':
                 c_ret = 'char*'
-                c_ret_default = 'return "";'
+                c_ret_default = 'return kuda_lib_own("");' if self.library is not None else 'return "";'
             elif ret_type in self.models:
                 c_ret = f'{ret_type}*'
                 c_ret_default = 'return NULL;'
@@ -1353,14 +1969,12 @@ class CGenerator:
             param_var_types = {}
             for i, p in enumerate(node.params):
                 if i < len(scanned) and scanned[i] in self.models:
-                    c_params.append(f'{scanned[i]}* {p}')
                     param_var_types[p] = scanned[i]
-                elif i < len(scanned) and scanned[i] == 'str':
-                    c_params.append(f'char* {p}')
-                    param_var_types[p] = 'str'
+                elif i < len(scanned) and scanned[i] in ('str', 'list', 'strlist'):
+                    param_var_types[p] = scanned[i]
                 else:
-                    c_params.append(f'double {p}')
                     param_var_types[p] = 'double'
+                c_params.append(f'{self._c_type(param_var_types[p])}{self._volatile(p)} {p}')
 
             self.emit(f'{c_ret} {"kuda_main" if node.name == "main" else node.name}({", ".join(c_params)}) {{')
             self.indent += 1
@@ -1369,11 +1983,7 @@ class CGenerator:
             pre = self._prescan_vars(node.body, set(node.params))
             for vname, vtyp in pre.items():
                 self.vars[vname] = vtyp
-                if vtyp == 'str':          self.emit(f'char* {vname} = NULL;')
-                elif vtyp == 'bool':       self.emit(f'int {vname} = 0;')
-                elif vtyp in ('list', 'strlist'):  self.emit(f'KList* {vname} = NULL;')
-                elif vtyp in self.models:  self.emit(f'{vtyp}* {vname} = NULL;')
-                else:                      self.emit(f'double {vname} = 0;')
+                self.emit(self._local_decl(vname, vtyp))
             for stmt in node.body:
                 self._gen_stmt(stmt)
             self.emit(c_ret_default)
@@ -1381,8 +1991,201 @@ class CGenerator:
             self.emit('}')
         result = self.lines
         self.lines, self.indent, self.vars = old_lines, old_indent, old_vars
+        self._try_nest = old_nest
+        self._fun_ret = old_ret
         return result
 
+    def _has_yield(self, stmts):
+        """Recursively check whether a statement list contains yield."""
+        for stmt in stmts:
+            if isinstance(stmt, YieldNode):
+                return True
+            for attr in ('body', 'else_body', 'try_body'):
+                sub = getattr(stmt, attr, None)
+                if isinstance(sub, list) and self._has_yield(sub):
+                    return True
+            if hasattr(stmt, 'cases'):
+                for _, body in stmt.cases:
+                    if self._has_yield(body):
+                        return True
+            if hasattr(stmt, 'fail_clauses'):
+                for _, _, body in stmt.fail_clauses:
+                    if self._has_yield(body):
+                        return True
+        return False
+
+    _GEN_SAVE = '/* @save generator frame */'
+
+    def _c_type(self, vtyp):
+        if vtyp == 'str':               return 'char*'
+        if vtyp in ('bool', 'int'):     return 'int'
+        if vtyp in ('list', 'strlist'): return 'KList*'
+        if vtyp == 'gen':               return 'KGen*'
+        if vtyp in self.models:         return f'{vtyp}*'
+        return 'double'
+
+    def _gen_slot(self, vtyp):
+        """Allocate a hidden frame variable (loop counter, iterator) in the current generator."""
+        slots = self._gen_ctx['slots']
+        name = f'_gs{len(slots)}'
+        slots[name] = vtyp
+        return name
+
+    def _gen_generator_function(self, node):
+        """
+        Lower a generator (fun with yield) into a C state machine.
+
+        Mirrors KudaGenerator: every local lives in a per-call frame struct,
+        each yield stores the locals back and records a resume label, and
+        {name}_step() jumps to that label on the next call. Calling the
+        function only fills the frame and returns a KGen*.
+        """
+        old_lines, old_indent, old_vars = self.lines, self.indent, dict(self.vars)
+        self.lines = []; self.indent = 1
+        c_name = 'kuda_main' if node.name == 'main' else node.name
+
+        scanned = getattr(self, 'func_param_types', {}).get(node.name, [])
+        slots = {}
+        for i, p in enumerate(node.params):
+            pt = scanned[i] if i < len(scanned) else 'double'
+            slots[p] = pt if (pt in ('str', 'list', 'strlist') or pt in self.models) else 'double'
+        for vname, vtyp in self._prescan_vars(node.body, set(node.params)).items():
+            slots[vname] = vtyp
+        self.vars.update(slots)
+
+        self._gen_ctx = {'slots': slots, 'labels': 0}
+        old_nest, self._try_nest = self._try_nest, []
+        for stmt in node.body:
+            self._gen_generator_stmt(stmt)
+        self.emit('_g->state = -1;')
+        self.emit('return 0;')
+        body = self.lines
+        n_labels = self._gen_ctx['labels']
+        self._gen_ctx = None
+        self._try_nest = old_nest
+        self.lines, self.indent, self.vars = old_lines, old_indent, old_vars
+
+        frame = f'{c_name}_frame'
+        L = [f'/* Generator: {node.name} */', 'typedef struct {']
+        for v, t in slots.items():
+            L.append(f'    {self._c_type(t)} {v};')
+        if not slots:
+            L.append('    int _unused;')
+        L.append(f'}} {frame};')
+        L.append('')
+        L.append(f'static int {c_name}_step(KGen* _g) {{')
+        L.append(f'    {frame}* _f = ({frame}*)_g->frame;')
+        for v, t in slots.items():
+            L.append(f'    {self._c_type(t)}{self._volatile(v)} {v} = _f->{v};')
+        L.append('    switch (_g->state) {')
+        L.append('        case 0: break;')
+        for k in range(1, n_labels + 1):
+            L.append(f'        case {k}: goto _y{k};')
+        L.append('        default: return 0;')
+        L.append('    }')
+        for line in body:
+            if line.strip() == self._GEN_SAVE:
+                pad = line[:len(line) - len(line.lstrip())]
+                L.extend(f'{pad}_f->{v} = {v};' for v in slots)
+            else:
+                L.append(line)
+        L.append('}')
+        L.append('')
+        c_params = ', '.join(f'{self._c_type(slots[p])} {p}' for p in node.params)
+        L.append(f'KGen* {c_name}({c_params}) {{')
+        L.append(f'    {frame} _f;')
+        L.append('    memset(&_f, 0, sizeof _f);')
+        for p in node.params:
+            L.append(f'    _f.{p} = {p};')
+        L.append(f'    return kuda_gen_new({c_name}_step, &_f, sizeof _f);')
+        L.append('}')
+        return L
+
+    def _gen_generator_stmt(self, node):
+        """Emit one generator statement; only nodes containing a yield need the resumable form."""
+        if not self._has_yield([node]):
+            self._gen_stmt(node)
+            return
+        if isinstance(node, YieldNode):
+            val, _ = self._gen_expr(node.value)
+            self._gen_ctx['labels'] += 1
+            k = self._gen_ctx['labels']
+            self.emit(f'_g->value = (double)({val});')
+            self.emit(self._GEN_SAVE)
+            self.emit(f'_g->state = {k};')
+            self.emit('return 1;')
+            self.emit(f'_y{k}: ;')
+            return
+        if isinstance(node, IfNode):
+            first = True
+            for cond, body in node.cases:
+                cval, _ = self._gen_expr(cond)
+                if first: self.emit(f'if ({cval}) {{'); first = False
+                else:     self.emit(f'}} else if ({cval}) {{')
+                self.indent += 1
+                for s in body: self._gen_generator_stmt(s)
+                self.indent -= 1
+            if node.else_body:
+                self.emit('} else {')
+                self.indent += 1
+                for s in node.else_body: self._gen_generator_stmt(s)
+                self.indent -= 1
+            self.emit('}')
+            return
+        if isinstance(node, RepeatNode):
+            count, _ = self._gen_expr(node.count)
+            i = self._gen_slot('int'); n = self._gen_slot('int')
+            self.emit(f'{n} = (int)({count});')
+            self.emit(f'for ({i} = 0; {i} < {n}; {i}++) {{')
+        elif isinstance(node, TilNode):
+            cval, _ = self._gen_expr(node.condition)
+            self.emit(f'while ({cval}) {{')
+        elif isinstance(node, EachNode):
+            self._gen_generator_each_head(node)
+        else:
+            raise CompileError(f"yield inside {type(node).__name__} is not supported in C mode", node.line)
+        self.indent += 1
+        self._try_nest.append('loop')
+        for s in node.body: self._gen_generator_stmt(s)
+        self._try_nest.pop()
+        self.indent -= 1
+        self.emit('}')
+
+    def _gen_generator_each_head(self, node):
+        """Open an each loop whose counter and iterator survive a yield (they live in the frame)."""
+        slots = self._gen_ctx['slots']
+        it = node.iterable
+        if isinstance(it, CallNode) and isinstance(it.func, IdentNode) and it.func.name == 'range':
+            args = [self._gen_expr(a)[0] for a in it.args]
+            if len(args) == 1:   start, end, step = '0', args[0], '1'
+            elif len(args) == 2: start, end, step = args[0], args[1], '1'
+            else:                start, end, step = args[0], args[1], args[2]
+            e = self._gen_slot('double'); st = self._gen_slot('double')
+            slots[node.var] = 'double'; self.vars[node.var] = 'double'
+            self.emit(f'{e} = {end}; {st} = {step};')
+            self.emit(f'for ({node.var} = {start}; {node.var} < {e}; {node.var} += {st}) {{')
+            return
+        iterable, ityp = self._gen_expr(it)
+        if ityp == 'gen':
+            g = self._gen_slot('gen')
+            slots[node.var] = 'double'; self.vars[node.var] = 'double'
+            self.emit(f'{g} = {iterable};')
+            self.emit(f'while (kuda_gen_step({g})) {{')
+            self.emit(f'    {node.var} = {g}->value;')
+        elif ityp in ('list', 'strlist'):
+            lst = self._gen_slot(ityp); idx = self._gen_slot('int')
+            if ityp == 'strlist':
+                slots[node.var] = 'str'; self.vars[node.var] = 'str'
+                item = f'(char*)(intptr_t){lst}->data[{idx}]'
+            else:
+                slots[node.var] = 'double'; self.vars[node.var] = 'double'
+                item = f'{lst}->data[{idx}]'
+            self.emit(f'{lst} = {iterable};')
+            self.emit(f'for ({idx} = 0; {idx} < {lst}->len; {idx}++) {{')
+            self.emit(f'    {node.var} = {item};')
+        else:
+            raise CompileError(f"each: unknown iterable type for '{node.var}' in a generator", node.line)
+
     def _scan_return_type(self, stmts):
         """Check if any give statement returns a string or model pointer."""
         for node in stmts:
@@ -1408,6 +2211,10 @@ class CGenerator:
             if isinstance(node, TilNode):
                 t = self._scan_return_type(node.body)
                 if t != 'double': return t
+            if isinstance(node, TryNode):
+                for body in [node.try_body] + [b for _, _, b in node.fail_clauses]:
+                    t = self._scan_return_type(body)
+                    if t != 'double': return t
         return 'double'
 
     def _gen_stmt(self, node):
@@ -1429,7 +2236,10 @@ class CGenerator:
             val, _ = self._gen_expr(node.value)
             op_map = {'+': '+=', '-': '-=', '*': '*=', '/': '/='}
             cop = op_map.get(node.op, node.op)
-            self.emit(f'{node.name} {cop} {val};')
+            if self.uses_try and cop == '/=':
+                self.emit(f'{node.name} = kuda_div({node.name}, {val});')
+            else:
+                self.emit(f'{node.name} {cop} {val};')
         elif isinstance(node, IndexAssignNode):
             obj, otyp = self._gen_expr(node.target.obj)
             idx, _ = self._gen_expr(node.target.index)
@@ -1443,22 +2253,20 @@ class CGenerator:
                 self.emit(f'{obj}[(int)({idx})] = {val};')
         elif isinstance(node, OutNode): self._gen_out(node)
         elif isinstance(node, IfNode): self._gen_if(node)
-        elif isinstance(node, RepeatNode): self._gen_repeat(node)
-        elif isinstance(node, EachNode): self._gen_each(node)
-        elif isinstance(node, TilNode): self._gen_til(node)
+        elif isinstance(node, RepeatNode): self._gen_loop(self._gen_repeat, node)
+        elif isinstance(node, EachNode): self._gen_loop(self._gen_each, node)
+        elif isinstance(node, TilNode): self._gen_loop(self._gen_til, node)
         elif isinstance(node, FunNode): pass
-        elif isinstance(node, GiveNode):
-            val, typ = self._gen_expr(node.value)
-            if typ == 'str' or typ in self.models:
-                self.emit(f'return {val};')
-            else:
-                self.emit(f'return (double)({val});')
-        elif isinstance(node, TryNode):
-            for s in node.try_body: self._gen_stmt(s)
+        elif isinstance(node, GiveNode): self._gen_give(node)
+        elif isinstance(node, TryNode): self._gen_try(node)
         elif isinstance(node, CheckNode):
             self._gen_check(node)
-        elif isinstance(node, BreakNode): self.emit('break;')
-        elif isinstance(node, ContinueNode): self.emit('continue;')
+        elif isinstance(node, BreakNode):
+            self._unwind_trys('loop')
+            self.emit('break;')
+        elif isinstance(node, ContinueNode):
+            self._unwind_trys('loop')
+            self.emit('continue;')
         elif isinstance(node, ExternNode):
             # extern "plik.c" — dołącz plik C do kompilacji
             if node.c_file is not None:
@@ -1484,10 +2292,15 @@ class CGenerator:
                             self.link_flags.append(f)
                 # Python modules are silently ignored in C mode
         else:
+            # anything else must be an expression statement; backends.analyze()
+            # keeps unsupported statements away, so a failure here is a real error
             try:
                 val, _ = self._gen_expr(node)
-                self.emit(f'{val};')
-            except: pass
+            except CompileError:
+                raise
+            except Exception as e:
+                raise CompileError(f"cannot compile {type(node).__name__}: {e}", node.line)
+            self.emit(f'{val};')
 
     def _gen_assign(self, node):
         # Skip data.cust = ... — it's only meaningful for DataBuilder setup, not C
@@ -1503,6 +2316,7 @@ class CGenerator:
                 elif typ == 'bool':       self.emit(f'int {node.name} = {val};')
                 elif typ == 'matrix':     self.emit(f'KMatrix* {node.name} = {val};')
                 elif typ in ('list', 'strlist'): self.emit(f'KList* {node.name} = {val};')
+                elif typ == 'gen':        self.emit(f'KGen* {node.name} = {val};')
                 elif typ in self.models:  self.emit(f'{typ}* {node.name} = {val};')
                 else:                     self.emit(f'double {node.name} = {val};')
             else:
@@ -1528,6 +2342,7 @@ class CGenerator:
         elif typ in ('list', 'strlist'): self.emit(f'kuda_print_list({val});')
         elif typ == 'bool': self.emit(f'kuda_print_bool({val});')
         elif typ == 'matrix': self.emit(f'kuda_mat_print({val});')
+        elif typ == 'gen':  self.emit('kuda_print_str("<kuda generator>");')
         else:               self.emit(f'kuda_print_double({val});')
 
     def _gen_if(self, node):
@@ -1588,6 +2403,127 @@ class CGenerator:
         if not first or node.else_body:
             self.emit('}')
 
+    def _scan_try(self, stmts, in_try):
+        """
+        Find whether the program uses try/fail and collect the variables
+        assigned inside try bodies. Those are declared volatile: after a
+        longjmp back to setjmp, non-volatile locals changed in between
+        are indeterminate.
+        """
+        found = False
+        for node in stmts:
+            if isinstance(node, TryNode):
+                found = True
+                self._scan_try(node.try_body, True)
+                for _, _, body in node.fail_clauses:
+                    self._scan_try(body, in_try)
+                continue
+            if in_try:
+                if isinstance(node, (AssignNode, AugAssignNode)) and isinstance(node.name, str):
+                    self._try_vars.add(node.name)
+                if isinstance(node, EachNode):
+                    self._try_vars.add(node.var)
+            for attr in ('body', 'else_body'):
+                sub = getattr(node, attr, None)
+                if isinstance(sub, list) and self._scan_try(sub, in_try):
+                    found = True
+            if isinstance(node, (IfNode, CheckNode)):
+                for _, body in node.cases:
+                    if self._scan_try(body, in_try):
+                        found = True
+        return found
+
+    def _volatile(self, vname):
+        return ' volatile' if vname in self._try_vars else ''
+
+    def _local_decl(self, vname, vtyp):
+        """Declaration of a pre-scanned local, zero-initialised."""
+        init = '0' if self._c_type(vtyp) in ('double', 'int') else 'NULL'
+        return f'{self._c_type(vtyp)}{self._volatile(vname)} {vname} = {init};'
+
+    def _gen_loop(self, gen, node):
+        """Emit a loop; break/continue inside it only unwind the trys opened within it."""
+        self._try_nest.append('loop')
+        gen(node)
+        self._try_nest.pop()
+
+    def _unwind_trys(self, upto):
+        """Pop the try frames a jump leaves: up to the innermost loop, or all in the function."""
+        n = 0
+        for mark in reversed(self._try_nest):
+            if mark == upto: break
+            if mark == 'try': n += 1
+        if n:
+            self.emit(f'kuda_try_depth -= {n};')
+
+    def _gen_give(self, node):
+        if self._gen_ctx:
+            # give inside a generator just ends it, like in KudaGenerator
+            self._unwind_trys(None)
+            self.emit('_g->state = -1;')
+            self.emit('return 0;')
+            return
+        val, typ = self._gen_expr(node.value)
+        fname, ret = self._fun_ret or (None, None)
+        if fname is not None and ret not in self.models and (
+                typ in ('list', 'strlist', 'gen') or (typ == 'str') != (ret == 'str')):
+            # the C signature comes from _scan_return_type (string literals only);
+            # say so here instead of leaving gcc a type error
+            raise CompileError(f"give: cannot infer that '{fname}' returns a {typ}", node.line)
+        if typ != 'str' and typ not in self.models:
+            val = f'(double)({val})'
+        elif typ == 'str' and self.library is not None:
+            # a literal or a parameter is not ours to free — hand the interpreter a copy
+            val = f'kuda_lib_own({val})'
+        if 'try' in self._try_nest:
+            # evaluate first: an error in the expression still belongs to the try
+            tmp = self.fresh_tmp()
+            self.emit(f'{self._c_type(typ if typ == "str" or typ in self.models else "double")} {tmp} = {val};')
+            self._unwind_trys(None)
+            val = tmp
+        self.emit(f'return {val};')
+
+    def _gen_try(self, node):
+        """
+        try/fail via setjmp: the try pushes its jmp_buf on kuda_try_stack,
+        kuda_raise() pops it and longjmps back, and the fail clauses test
+        kuda_err_type in order. Unmatched errors are raised again outward.
+        """
+        jb = self.fresh_tmp()
+        self.emit('{')
+        self.indent += 1
+        self.emit(f'jmp_buf {jb};')
+        self.emit(f'kuda_try_push(&{jb});')
+        self.emit(f'if (setjmp({jb}) == 0) {{')
+        self.indent += 1
+        self._try_nest.append('try')
+        for s in node.try_body: self._gen_stmt(s)
+        self._try_nest.pop()
+        self.emit('kuda_try_depth--;')
+        self.indent -= 1
+        catch_all = False
+        for err_type, var_name, body in node.fail_clauses:
+            if err_type is None:
+                self.emit('} else {')
+                catch_all = True
+            else:
+                self.emit(f'}} else if (kuda_err_is("{err_type}")) {{')
+            self.indent += 1
+            old_vars = dict(self.vars)
+            if var_name:
+                self.vars[var_name] = 'str'
+                self.emit(f'char* {var_name} = kuda_err_text();')
+            for s in body: self._gen_stmt(s)
+            self.vars = old_vars
+            self.indent -= 1
+            if catch_all: break
+        if not catch_all:
+            self.emit('} else {')
+            self.emit('    kuda_raise(kuda_err_type, kuda_err_msg);')
+        self.emit('}')
+        self.indent -= 1
+        self.emit('}')
+
     def _gen_repeat(self, node):
         count, _ = self._gen_expr(node.count)
         tmp = self.fresh_tmp()
@@ -1642,6 +2578,16 @@ class CGenerator:
             for s in node.body: self._gen_stmt(s)
             self.indent -= 1
             self.emit('}')
+        elif ityp == 'gen':
+            tmp_g = self.fresh_tmp()
+            self.vars[node.var] = 'double'
+            self.emit(f'KGen* {tmp_g} = {iterable};')
+            self.emit(f'while (kuda_gen_step({tmp_g})) {{')
+            self.indent += 1
+            self.emit(f'double {node.var} = {tmp_g}->value;')
+            for s in node.body: self._gen_stmt(s)
+            self.indent -= 1
+            self.emit('}')
         else:
             # fallback — nie znany typ
             self.emit(f'/* each: nieznany typ iteracji dla {iterable} */')
@@ -1677,6 +2623,11 @@ class CGenerator:
                 else:
                     start, _ = self._gen_expr(args[0]); end, _ = self._gen_expr(args[1])
                     self.emit(f'for (double {node.var} = {start}; {node.var} < {end}; {node.var}++) {{')
+            elif ityp == 'gen':
+                tmp_g = self.fresh_tmp()
+                self.emit(f'KGen* {tmp_g} = {iterable};')
+                self.emit(f'while (kuda_gen_step({tmp_g})) {{')
+                self.emit(f'    double {node.var} = {tmp_g}->value;')
             else:
                 tmp_i = self.fresh_tmp()
                 self.emit(f'for (int {tmp_i} = 0; {tmp_i} < {iterable}->len; {tmp_i}++) {{')
@@ -1756,6 +2707,10 @@ class CGenerator:
                 if ltyp == 'matrix' and rtyp == 'matrix': return f'kuda_mat_mul({lval}, {rval})', 'matrix'
                 if ltyp == 'matrix': return f'kuda_mat_scale({lval}, {rval})', 'matrix'
                 return f'kuda_mat_scale({rval}, {lval})', 'matrix'
+        if self.uses_try:
+            # checked division: a zero divisor raises ZeroDivision inside try
+            if op == '/': return f'kuda_div({lval}, {rval})', 'double'
+            if op == '%': return f'kuda_mod({lval}, {rval})', 'double'
         if op == '%': return f'((double)((long long)({lval}) % (long long)({rval})))', 'double'
         typ = 'bool' if op in ('==','!=','<','>','<=','>=') else 'double'
         return f'({lval} {op} {rval})', typ
@@ -1808,11 +2763,11 @@ class CGenerator:
             return f'kuda_double_to_str({val})', 'str'
         if name == 'int':
             val, typ = args_eval[0]
-            if typ == 'str': return f'((double)atoi({val}))', 'double'
+            if typ == 'str': return f'kuda_parse_int({val})', 'double'
             return f'((double)(long long)({val}))', 'double'
         if name == 'float':
             val, typ = args_eval[0]
-            if typ == 'str': return f'((double)atof({val}))', 'double'
+            if typ == 'str': return f'kuda_parse_float({val})', 'double'
             return f'((double)({val}))', 'double'
         if name == 'abs':   val, _ = args_eval[0]; return f'fabs({val})', 'double'
         if name == 'round':
@@ -1926,6 +2881,7 @@ class CGenerator:
             f,_=args_eval[0]; tmp=self.fresh_tmp(); buf=self.fresh_tmp()
             self.emit(f'char* {buf}=malloc(MAX_STR*16); {buf}[0]=0;')
             self.emit(f'FILE* {tmp}=fopen({f},"r"); if({tmp}){{fread({buf},1,MAX_STR*16-1,{tmp});fclose({tmp});}}')
+            self.emit(f'else kuda_file_error({f});')
             return buf, 'str'
         if name == 'append':
             f,_=args_eval[0]; c,_=args_eval[1]; tmp=self.fresh_tmp()
@@ -1943,7 +2899,7 @@ class CGenerator:
             self.emit(f'        kuda_list_add_ptr({lst},(void*)_s);')
             self.emit(f'    }}')
             self.emit(f'    fclose({tmp});')
-            self.emit(f'}}')
+            self.emit(f'}} else kuda_file_error({f});')
             return lst, 'strlist'
         # Macierze
         if name == 'Matrix':     r,_=args_eval[0];c,_=args_eval[1]; return f'kuda_mat_new((int)({r}),(int)({c}))', 'matrix'
@@ -1988,10 +2944,10 @@ class CGenerator:
         # Rename user-defined 'main' to avoid conflict with C main
         c_name = 'kuda_main' if name == 'main' else name
 
-        # User function call - pass model pointers and strings as-is, cast others to double
+        # User function call - pass model pointers, strings and lists as-is, cast others to double
         arg_parts = []
         for v, t in args_eval:
-            if t in self.models or t == 'str':
+            if t in self.models or t in ('str', 'list', 'strlist'):
                 arg_parts.append(v)
             else:
                 arg_parts.append(f'(double)({v})')
@@ -2046,6 +3002,39 @@ class CGenerator:
                 self.emit(f'for(int _j=0;_j<{n_out};_j++) kuda_list_add({tmp}_lst, {tmp}_out[_j]);')
                 return f'{tmp}_lst', 'list'
 
+        # Net batch predict: xor.predict_batch(rows) -> flat KList, n_outputs values per row
+        if obj_typ == 'net' and method == 'predict_batch':
+            arg_val, _ = args_eval[0] if args_eval else ('kuda_list_new()', 'list')
+            return f'{obj_val}_predict_batch({arg_val})', 'list'
+
+        # Net quantize: mynet.quantize() -> int8 predict; mynet.quantize(rows, targets) also
+        # compares float and int8 outputs on rows (targets flat, as predict_batch returns them)
+        if obj_typ == 'net' and method == 'quantize':
+            info = self._net_info.get(obj_val, {})
+            layers = info.get('layers', [])
+            n_weights = sum(a * b for a, b in zip(layers, layers[1:]))
+            w_bytes = n_weights * (4 if info.get('dtype') == 'f32' else 8)
+            self.emit(f'{obj_val}_quantize_w();')
+            if len(args_eval) < 2:
+                return f'kuda_quant_report("{obj_val}", NULL, NULL, NULL, {w_bytes}, {n_weights})', 'double'
+            tmp = self._tmp_var()
+            rows, tgts = args_eval[0][0], args_eval[1][0]
+            self.emit(f'{obj_val}_q_on = 0;')
+            self.emit(f'KList* {tmp}_f = {obj_val}_predict_batch({rows});')
+            self.emit(f'{obj_val}_q_on = 1;')
+            self.emit(f'KList* {tmp}_q = {obj_val}_predict_batch({rows});')
+            return (f'kuda_quant_report("{obj_val}", {tmp}_f, {tmp}_q, {tgts}, {w_bytes}, {n_weights})',
+                    'double')
+
+        # Net stats: mynet.stats() -> KList in netengine.STATS order, mynet.stats("loss") -> double
+        if obj_typ == 'net' and method == 'stats':
+            if args_eval:
+                return f'kuda_net_stat({obj_val}_stats, {args_eval[0][0]})', 'double'
+            tmp = self._tmp_var()
+            self.emit(f'KList* {tmp} = kuda_list_new();')
+            self.emit(f'for(int _i=0;_i<6;_i++) kuda_list_add({tmp}, {obj_val}_stats[_i]);')
+            return tmp, 'list'
+
         # Net write call: mynet.write("file.json") -> save weights to JSON
         if obj_typ == 'net' and method == 'write':
             filename_val, _ = args_eval[0] if args_eval else ('"weights.json"', 'str')
@@ -2055,7 +3044,10 @@ class CGenerator:
             n_weights = sum(layers[i]*layers[i+1] for i in range(n_layers-1))
             n_biases  = sum(layers[i+1] for i in range(n_layers-1))
             tmp = self._tmp_var()
-            self.emit(f'{{ FILE* {tmp}_f = fopen({filename_val}, "w");')
+            opt = info.get('opt', 'sgd')
+            self.emit(f'{{ const char* {tmp}_p = {filename_val};')
+            self._emit_kw_io(tmp, obj_val, info, n_weights, n_biases, write=True)
+            self.emit(f'  FILE* {tmp}_f = fopen({tmp}_p, "w");')
             self.emit(f'  if({tmp}_f) {{')
             self.emit(f'    fprintf({tmp}_f, "{{\\n");')
             self.emit(f'    fprintf({tmp}_f, "  \\"net\\": \\"{obj_val}\\",\\n");')
@@ -2064,6 +3056,12 @@ class CGenerator:
                 comma = ',' if i < n_layers - 1 else ''
                 self.emit(f'    fprintf({tmp}_f, "{l}{comma}");')
             self.emit(f'    fprintf({tmp}_f, "],\\n");')
+            act = info.get('act', 'tanh')
+            act_out = info.get('act_out', act)
+            self.emit(f'    fprintf({tmp}_f, "  \\"act\\": \\"{act}\\",\\n");')
+            self.emit(f'    fprintf({tmp}_f, "  \\"act_out\\": \\"{act_out}\\",\\n");')
+            if info.get('dtype', 'f64') != 'f64':
+                self.emit(f'    fprintf({tmp}_f, "  \\"dtype\\": \\"{info["dtype"]}\\",\\n");')
             self.emit(f'    fprintf({tmp}_f, "  \\"W\\": [");')
             self.emit(f'    for(int _wi=0; _wi<{n_weights}; _wi++) {{')
             self.emit(f'      if(_wi < {n_weights}-1) fprintf({tmp}_f, "%.10f,", {obj_val}_W[_wi]);')
@@ -2075,12 +3073,26 @@ class CGenerator:
             self.emit(f'      if(_bi < {n_biases}-1) fprintf({tmp}_f, "%.10f,", {obj_val}_B[_bi]);')
             self.emit(f'      else fprintf({tmp}_f, "%.10f", {obj_val}_B[_bi]);')
             self.emit(f'    }}')
-            self.emit(f'    fprintf({tmp}_f, "]\\n");')
+            if opt == 'sgd':
+                self.emit(f'    fprintf({tmp}_f, "]\\n");')
+            else:
+                # ~opt: stan optymalizatora, żeby trening dało się wznowić
+                from netengine import OPTIMIZERS
+                self.emit(f'    fprintf({tmp}_f, "],\\n");')
+                self.emit(f'    fprintf({tmp}_f, "  \\"opt\\": \\"{opt}\\",\\n");')
+                self.emit(f'    fprintf({tmp}_f, "  \\"opt_t\\": %ld", {obj_val}_opt_t);')
+                for key in OPTIMIZERS[opt]:
+                    for p, n in (('W', n_weights), ('B', n_biases)):
+                        self.emit(f'    fprintf({tmp}_f, ",\\n  \\"{key}{p}\\": [");')
+                        self.emit(f'    for(int _i=0; _i<{n}; _i++)')
+                        self.emit(f'      fprintf({tmp}_f, _i ? ",%.17g" : "%.17g", {obj_val}_{key}{p}[_i]);')
+                        self.emit(f'    fprintf({tmp}_f, "]");')
+                self.emit(f'    fprintf({tmp}_f, "\\n");')
             self.emit(f'    fprintf({tmp}_f, "}}\\n");')
             self.emit(f'    fclose({tmp}_f);')
-            self.emit(f'    printf("Wagi zapisane do %s\\n", {filename_val});')
+            self.emit(f'    printf("Wagi zapisane do %s\\n", {tmp}_p);')
             self.emit(f'  }}')
-            self.emit(f'}}')
+            self.emit(f'}}}}')
             return 'NULL', 'str'
 
         # Net load call: mynet.load("file.json") -> load weights from JSON
@@ -2092,9 +3104,10 @@ class CGenerator:
             n_weights = sum(layers[i]*layers[i+1] for i in range(n_layers-1))
             n_biases  = sum(layers[i+1] for i in range(n_layers-1))
             tmp = self._tmp_var()
-            self.emit(f'{{ FILE* {tmp}_f = fopen({filename_val}, "r");')
+            self.emit(f'{{ const char* {tmp}_p = {filename_val};')
+            self._emit_kw_io(tmp, obj_val, info, n_weights, n_biases, write=False)
+            self.emit(f'  FILE* {tmp}_f = fopen({tmp}_p, "r");')
             self.emit(f'  if({tmp}_f) {{')
-            self.emit(f'    char {tmp}_buf[32];')
             self.emit(f'    int {tmp}_wi = 0, {tmp}_bi = 0;')
             self.emit(f'    int {tmp}_in_w = 0, {tmp}_in_b = 0;')
             self.emit(f'    int {tmp}_c;')
@@ -2117,12 +3130,40 @@ class CGenerator:
             self.emit(f'        if({tmp}_bi < {n_biases}) {obj_val}_B[{tmp}_bi++] = {tmp}_v2;')
             self.emit(f'      }}')
             self.emit(f'    }}')
+            opt = info.get('opt', 'sgd')
+            if opt != 'sgd':
+                # ~opt: stan zapisany przez write() (brak w pliku — zostaje obecny)
+                from netengine import OPTIMIZERS
+                self.emit(f'    double {tmp}_t;')
+                self.emit(f'    if(kuda_json_doubles({tmp}_f, "opt_t", &{tmp}_t, 1) == 1) {obj_val}_opt_t = (long){tmp}_t;')
+                if info.get('dtype') == 'f32':
+                    # ~dtype = f32: przez bufor double, potem do tablic float
+                    self.emit(f'    double* {tmp}_s = malloc(sizeof(double) * {max(n_weights, n_biases)});')
+                for key in OPTIMIZERS[opt]:
+                    for p, n in (('W', n_weights), ('B', n_biases)):
+                        if info.get('dtype') == 'f32':
+                            self.emit(f'    for(int _i=0, _n=kuda_json_doubles({tmp}_f, "{key}{p}", {tmp}_s, {n}); _i<_n; _i++)')
+                            self.emit(f'      {obj_val}_{key}{p}[_i] = (float){tmp}_s[_i];')
+                        else:
+                            self.emit(f'    kuda_json_doubles({tmp}_f, "{key}{p}", {obj_val}_{key}{p}, {n});')
+                if info.get('dtype') == 'f32':
+                    self.emit(f'    free({tmp}_s);')
             self.emit(f'    fclose({tmp}_f);')
-            self.emit(f'    printf("Wagi wczytane z %s\\n", {filename_val});')
-            self.emit(f'  }} else {{ printf("Blad: nie mozna otworzyc %s\\n", {filename_val}); }}')
-            self.emit(f'}}')
+            self.emit(f'    printf("Wagi wczytane z %s\\n", {tmp}_p);')
+            self.emit(f'  }} else {{ printf("Blad: nie mozna otworzyc %s\\n", {tmp}_p); }}')
+            self.emit(f'}}}}')
+            # po net.quantize() predict dalej w int8 — z nowych wag
+            if info.get('quantize'):
+                self.emit(f'if({obj_val}_q_on) {obj_val}_quantize_w();')
             return 'NULL', 'str'
 
+        # Generator methods: g.next() -> next value or None (NAN), g.done() -> past the end,
+        # g.collect() -> fresh run into a list
+        if obj_typ == 'gen':
+            if method == 'next':    return f'kuda_gen_next({obj_val})', 'double'
+            if method == 'done':    return f'kuda_gen_done({obj_val})', 'bool'
+            if method == 'collect': return f'kuda_gen_collect({obj_val})', 'list'
+
         # Model instance method call: hero.bark() -> Hero_bark(hero)
         if obj_typ in self.models:
             args_str = ', '.join(v for v, t in args_eval)
@@ -3,6 +3,9 @@ import sys
 import random
 import numpy as np
 from data_builder import DataBuilder
+from netengine import (NetEngine, Optimizer, DTYPES, OPTIMIZERS, SCHEDULES, STATS, as_matrix,
+                       loss_output, schedule_lr)
+import netfile
 
 # === Sygnały kontroli przepływu ===
 
@@ -26,15 +29,44 @@ class Environment:
     def __init__(self, parent=None):
         self.vars = {}
         self.parent = parent
+        # środowiska plików z use "x.kuda" (bez aliasu): ich zmienne są
+        # wspólne z tym zakresem, nie skopiowane — nowszy use pierwszy
+        self.merged = []
+
+    def scope_of(self, name):
+        """Słownik, który trzyma name w tym zakresie lub w dołączonych plikach (bez rodzica)."""
+        if name in self.vars:
+            return self.vars
+        for m in self.merged:
+            found = m.scope_of(name)
+            if found is not None:
+                return found
+        return None
+
+    def names(self):
+        """Nazwy tego zakresu razem z dołączonymi przez use (bez rodzica)."""
+        out = set(self.vars)
+        for m in self.merged:
+            out |= m.names()
+        return out
 
     def get(self, name):
         if name in self.vars:
             return self.vars[name]
+        if self.merged:
+            found = self.scope_of(name)
+            if found is not None:
+                return found[name]
         if self.parent:
             return self.parent.get(name)
         raise RuntimeError(f"Undefined variable: '{name}'")
 
     def set(self, name, value):
+        if self.merged:
+            found = self.scope_of(name)
+            if found is not None:
+                found[name] = value
+                return
         self.vars[name] = value
 
     def assign(self, name, value):
@@ -42,6 +74,11 @@ class Environment:
         if name in self.vars:
             self.vars[name] = value
             return True
+        if self.merged:
+            found = self.scope_of(name)
+            if found is not None:
+                found[name] = value
+                return True
         if self.parent:
             return self.parent.assign(name, value)
         return False
@@ -58,9 +95,9 @@ class KudaNet:
     def __init__(self, name, params):
         self.name = name
         self.params = params  # dict: key -> wartość
-        self.weights = []     # lista list wag
-        self.biases = []      # lista list biasów
+        self.engine = None    # NetEngine: wagi, aktywacje, forward
         self.trained = False
+        self.last_stats = dict.fromkeys(STATS, 0)   # net.stats(): ostatni trening
 
     def get_attr(self, name):
         if name == 'train':
@@ -69,12 +106,133 @@ class KudaNet:
             return BoundNetMethod(self, 'predict')
         if name == 'loss':
             return BoundNetMethod(self, 'loss')
+        if name == 'predict_batch':
+            return BoundNetMethod(self, 'predict_batch')
         if name == 'write':
             return BoundNetMethod(self, 'write')
         if name == 'load':
             return BoundNetMethod(self, 'load')
+        if name == 'stats':
+            return BoundNetMethod(self, 'stats')
+        if name == 'quantize':
+            return BoundNetMethod(self, 'quantize')
         raise AttributeError(f"Net '{self.name}' has no attribute '{name}'")
 
+    def use_engine(self, engine):
+        self.engine   = engine
+        self.layers   = engine.layers
+        self.act_name = engine.act_name
+        self.out_name = engine.out_name
+        self.trained  = True
+
+    def call(self, method, args):
+        """net.<method>(args) — wspólne dla obu ścieżek wywołania w eval_call."""
+        if method == 'predict':
+            return self.predict(args[0] if args else [])
+        if method == 'predict_batch':
+            return self.predict_batch(args[0] if args else [])
+        if method == 'write':
+            return self.write(args[0] if args else f"{self.name}_weights.json")
+        if method == 'load':
+            return self.load(args[0] if args else f"{self.name}_weights.json")
+        if method == 'stats':
+            return self.stats(args[0] if args else None)
+        if method == 'quantize':
+            return self.quantize(*args[:2])
+        # train: trening już wykonany w exec_net; loss: nic
+        return None
+
+    def _check_trained(self):
+        if not self.trained:
+            raise RuntimeError_(f"Net '{self.name}' nie jest wytrenowana!")
+
+    def predict(self, inputs):
+        self._check_trained()
+        if not isinstance(inputs, list): inputs = [inputs]
+        result = self.engine.predict(inputs)
+        return result[0] if len(result) == 1 else result
+
+    def predict_batch(self, rows):
+        """Outputs of every row, flat: n_outputs values per row (as in C)."""
+        self._check_trained()
+        return self.engine.infer(as_matrix(rows, self.engine.layers[0], self.engine.real)).ravel().tolist()
+
+    def stats(self, key=None):
+        """Numbers of the last training run: a list in STATS order, or one of them by key."""
+        if key is None:
+            return [self.last_stats[k] for k in STATS]
+        if key not in self.last_stats:
+            raise RuntimeError_(f"net.stats: nieznany klucz '{key}' (dostępne: {', '.join(STATS)})")
+        return self.last_stats[key]
+
+    def quantize(self, rows=None, targets=None):
+        """
+        int8 weights for predict / predict_batch. With rows and targets
+        (flat, n_outputs values per row) compares float and int8 outputs:
+        prints mse, accuracy and the largest difference, returns the
+        accuracy change (int8 - float).
+        """
+        self._check_trained()
+        n_w = sum(w.size for w in self.engine.W)
+        self.engine.quantize()
+        print(f"net.quantize: {self.name}: int8, wagi {n_w * self.engine.W[0].itemsize} -> {n_w} B")
+        if rows is None or targets is None:
+            return 0.0
+        X = as_matrix(rows, self.engine.layers[0], self.engine.real)
+        Q, self.engine.Q = self.engine.Q, None
+        pf = self.engine.infer(X).ravel()
+        self.engine.Q = Q
+        pq = self.engine.infer(X).ravel()
+        t = np.asarray([v for r in targets for v in (r if isinstance(r, list) else [r])], dtype=np.float64)
+        n = min(len(pf), len(t))
+        pf, pq, t = pf[:n].astype(np.float64), pq[:n].astype(np.float64), t[:n]
+        # zaokrąglenie jak (int)round() w C: połówki od zera
+        rnd = lambda v: np.trunc(v + np.copysign(0.5, v))
+        cf, cq = int(np.sum(rnd(pf) == rnd(t))), int(np.sum(rnd(pq) == rnd(t)))
+        d = n or 1
+        md = float(np.max(np.abs(pf - pq))) if n else 0.0
+        print(f"  {n} values | float: mse {np.sum((pf - t) ** 2) / d:.6f} acc {100.0 * cf / d:.2f}% | "
+              f"int8: mse {np.sum((pq - t) ** 2) / d:.6f} acc {100.0 * cq / d:.2f}% | max diff {md:.6f}")
+        return (cq - cf) / d
+
+    def write(self, path):
+        """path.json albo path.kw (binarnie) — format wg rozszerzenia, zob. netfile.py."""
+        self._check_trained()
+        netfile.save(path, {'net': self.name, **self.engine.data()})
+        print(f"Wagi zapisane do {path}")
+
+    def load(self, path):
+        try:
+            data = netfile.load(path)
+        except FileNotFoundError:
+            print(f"Blad: nie mozna otworzyc {path}")
+            return None
+        except ValueError as e:
+            print(f"Blad: {e}")
+            return None
+        self.load_data(data)
+        print(f"Wagi wczytane z {path}")
+
+    def load_data(self, data):
+        """Wagi (i stan ~opt) z JSON-a zapisanego przez net.write()."""
+        if self.engine is not None:
+            # stan ~opt z pliku (albo świeży) pasujący do wczytanych wag
+            o = self.engine.opt
+            opt = Optimizer(o.name, o.beta1, o.beta2, o.eps)
+            dtype = self.engine.dtype
+        else:
+            opt = Optimizer(data['opt'] if data.get('opt') in OPTIMIZERS else 'sgd')
+            dtype = data['dtype'] if data.get('dtype') in DTYPES else 'f64'
+        act_name = data.get('act', getattr(self, 'act_name', 'tanh'))
+        engine = NetEngine.from_flat(data.get('layers', getattr(self, 'layers', [])),
+                                     data.get('W', []), data.get('B', []),
+                                     act_name, data.get('act_out', getattr(self, 'out_name', act_name)),
+                                     opt, dtype)
+        engine.restore_opt(data)
+        if self.engine is not None and self.engine.Q is not None:
+            engine.quantize()   # po quantize() predict dalej w int8 — z nowych wag
+        self.use_engine(engine)
+
     def __repr__(self):
         return f'<net {self.name}>'
 
@@ -153,17 +311,18 @@ class _KudaNamespace:
     Namespace object created by: use "file.kuda" as ns
     Allows accessing exported symbols as ns.func(), ns.VAR, etc.
     """
-    def __init__(self, name, vars_dict):
+    def __init__(self, name, env):
         self._name = name
-        self._vars = vars_dict
+        self._env = env   # środowisko modułu (Interpreter.modules)
 
     def get_attr(self, attr):
-        if attr in self._vars:
-            return self._vars[attr]
+        found = self._env.scope_of(attr)
+        if found is not None:
+            return found[attr]
         raise AttributeError(f"Namespace '{self._name}' has no attribute '{attr}'")
 
     def __repr__(self):
-        keys = list(self._vars.keys())
+        keys = sorted(self._env.names())
         return f"<namespace {self._name}: {keys}>"
 
 
@@ -171,6 +330,8 @@ class Interpreter:
     def __init__(self):
         self.global_env = Environment()
         self.current_line = 0
+        self.modules = {}    # znormalizowana ścieżka -> środowisko wykonanego pliku (jak sys.modules)
+        self._loading = []   # pliki w trakcie wykonywania — wykrywanie cyklicznych use
         self._setup_builtins()
 
     def _setup_builtins(self):
@@ -310,8 +471,18 @@ class Interpreter:
         env.set('mat_sigmoid_deriv', lambda args: args[0] * (1 - args[0]))
         env.set('mat_T', lambda args: args[0].T)
 
-    def run(self, ast):
-        self.exec_block(ast.statements, self.global_env)
+    def run(self, ast, path=None):
+        # path: uruchamiany plik — use "x.kuda" liczy się względem niego
+        if path is None:
+            self.exec_block(ast.statements, self.global_env)
+            return
+        import os
+        self._current_file = os.path.abspath(path)
+        self._loading.append(os.path.normcase(os.path.realpath(path)))
+        try:
+            self.exec_block(ast.statements, self.global_env)
+        finally:
+            self._loading.pop()
 
     def exec_block(self, statements, env):
         for stmt in statements:
@@ -418,6 +589,36 @@ class Interpreter:
         # Wyrażenia jako instrukcje (np. wywołania funkcji)
         self.eval(node, env)
 
+    def _load_module(self, path):
+        """
+        Wykonuje plik .kuda tylko raz i zwraca jego środowisko. Kolejne use tego
+        samego pliku (w pętli, w funkcji, import rombowy) dostają to samo.
+        """
+        import os
+        key = os.path.normcase(os.path.realpath(path))
+        if key in self.modules:
+            return self.modules[key]
+        if key in self._loading:
+            cycle = self._loading[self._loading.index(key):] + [key]
+            chain = ' -> '.join(os.path.basename(p) for p in cycle)
+            raise RuntimeError_(f"use: circular import: {chain}", self.current_line)
+        from astcache import parse_file
+        try:
+            ast = parse_file(path)
+        except Exception as e:
+            raise RuntimeError_(f"use: blad parsowania '{path}': {e}", self.current_line)
+        mod_env = Environment(parent=self.global_env)
+        old_file = getattr(self, '_current_file', None)
+        self._current_file = path
+        self._loading.append(key)
+        try:
+            self.exec_block(ast.statements, mod_env)
+        finally:
+            self._loading.pop()
+            self._current_file = old_file
+        self.modules[key] = mod_env
+        return mod_env
+
     def exec_use(self, node, env):
         # File import: use "file.kuda" or use @"path" or use "file.kuda" as ns
         if node.filepath is not None:
@@ -433,28 +634,18 @@ class Interpreter:
             path = os.path.normpath(path)
             if not os.path.exists(path):
                 raise RuntimeError_(f"use: plik nie istnieje: '{path}'", self.current_line)
-            from lexer import Lexer as _Lexer
-            from parser import Parser as _Parser
-            with open(path, 'r', encoding='utf-8') as f:
-                source = f.read()
-            try:
-                ast = _Parser(_Lexer(source).tokenize()).parse()
-            except Exception as e:
-                raise RuntimeError_(f"use: blad parsowania '{path}': {e}", self.current_line)
-            old_file = getattr(self, '_current_file', None)
-            self._current_file = path
+            module = self._load_module(path)
             if node.alias:
                 # Namespace mode: use "math.kuda" as math
-                ns_env = Environment(parent=self.global_env)
-                for stmt in ast.statements:
-                    self.exec(stmt, ns_env)
-                self._current_file = old_file
-                env.set(node.alias, _KudaNamespace(node.alias, ns_env.vars))
+                env.set(node.alias, _KudaNamespace(node.alias, module))
             else:
-                # Normal mode: dump everything into current env
-                for stmt in ast.statements:
-                    self.exec(stmt, env)
-                self._current_file = old_file
+                # Normal mode: the module's names become visible here, and
+                # writes on either side (count += 1 in its funs) are shared
+                for name in module.names():
+                    env.vars.pop(name, None)
+                if module in env.merged:
+                    env.merged.remove(module)
+                env.merged.insert(0, module)
             return
 
         # Python module import: use numpy or use numpy as np
@@ -561,15 +752,18 @@ class Interpreter:
                 continue
 
     def exec_net(self, node, env):
-        import math, random as _random
+        import math, os, signal as _signal, json as _json, time as _time, random as _random
         # Ewaluuj parametry
         params = {}
         for key, val_node in node.params.items():
             try:
                 params[key] = self.eval(val_node, env)
             except Exception:
-                # Może być 'auto' lub inna specjalna wartość
-                params[key] = None
+                # Może być 'auto' lub inna specjalna wartość; ~opt = adam, ~dtype = f32, ~loss = bce,
+                # ~schedule = cosine to gołe nazwy
+                params[key] = (val_node.name if key in ('opt', 'dtype', 'loss', 'schedule')
+                               and isinstance(val_node, IdentNode)
+                               else None)
 
         net = KudaNet(node.name, params)
 
@@ -610,15 +804,20 @@ class Interpreter:
         epochs    = int(params.get('epochs', 1000))
         act_name  = params.get('act', 'tanh')
         out_name  = params.get('act_out', act_name)
-        loss_name = params.get('loss', 'mse')
         init_name = params.get('init', 'xav')
-        pack_size = params.get('pack', None)
+        pack      = max(1, int(params.get('pack') or 1))
+        opt_name  = params.get('opt') or 'sgd'
         log_every = int(params.get('log', 100))
         # ~verbose = False silences training output
         verbose = params.get('verbose', True)
         if verbose is False or verbose == 0:
             log_every = 0
         stop_loss = float(params.get('stop', -1.0))
+        metrics_path = params.get('metrics')   # ~metrics = "train.jsonl": jedna linia JSON na epokę
+        # ~checkpoint = "run.kw": stan treningu co ~checkpoint_every epok, wznowienie przy starcie
+        ckpt = params.get('checkpoint') if isinstance(params.get('checkpoint'), str) else None
+        ckpt_every = max(1, int(params.get('checkpoint_every') or 100))
+        warm = params.get('from') if isinstance(params.get('from'), str) else None   # ~from = "w.json"
 
         # ~act = tanh evaluates to a Python lambda in interpreter env
         # — resolve callable back to string name for storage/serialization
@@ -635,190 +834,172 @@ class Interpreter:
                 except Exception: pass
             return default
         act_name  = _resolve_name(act_name,  _ACT_NAMES,  'tanh')
-        out_name  = _resolve_name(out_name,  _ACT_NAMES,  act_name)
+        out_name  = _resolve_name(out_name,  _ACT_NAMES | {'softmax'}, act_name)
+        try:
+            # ~loss = bce / crossent: wyjście sigmoid / softmax, gradient a - y
+            loss_name, out = loss_output(params.get('loss'), out_name if 'act_out' in params else None)
+        except ValueError as e:
+            raise RuntimeError_(f"net: {e}")
+        out_name = out or out_name
         init_name = _resolve_name(init_name, _INIT_NAMES, 'xav')
-
-        # Funkcje aktywacji
-        def get_act(name):
-            if name == 'tanh':     return math.tanh, lambda x: 1.0 - x*x
-            if name == 'sigmoid':  return (lambda x: 1/(1+math.exp(-x))), lambda x: x*(1-x)
-            if name == 'relu':     return (lambda x: max(0.0,x)), lambda x: 1.0 if x>0 else 0.0
-            if name == 'leaky':    return (lambda x: x if x>0 else 0.01*x), lambda x: 1.0 if x>0 else 0.01
-            if name == 'linear':   return (lambda x: x), lambda x: 1.0
-            return math.tanh, lambda x: 1.0 - x*x
-
-        act_f, act_d = get_act(act_name)
-        out_f, out_d = get_act(out_name)
-
-        # Inicjalizacja wag
-        def init_weights(n_in, n_out, method):
-            if method == 'he':
-                std = math.sqrt(2.0/n_in)
-            else:  # xav
-                std = math.sqrt(2.0/(n_in+n_out))
-            return [_random.gauss(0, std) for _ in range(n_in*n_out)]
-
-        net.layers   = layers
-        net.act_name = act_name
-        net.out_name = out_name
-        net.weights = []
-        net.biases  = []
-        for i in range(len(layers)-1):
-            net.weights.append(init_weights(layers[i], layers[i+1], init_name))
-            net.biases.append([0.0]*layers[i+1])
-
-        # Forward pass
-        def forward(inputs):
-            a = inputs[:]
-            activations = [a]
-            for li in range(len(net.weights)):
-                n_in  = layers[li]
-                n_out = layers[li+1]
-                w = net.weights[li]
-                b = net.biases[li]
-                is_last = (li == len(net.weights)-1)
-                f = out_f if is_last else act_f
-                new_a = []
-                for j in range(n_out):
-                    z = b[j]
-                    for k in range(n_in):
-                        z += a[k] * w[j*n_in+k]
-                    new_a.append(f(z))
-                a = new_a
-                activations.append(a)
-            return activations
-
-        # Backward pass
-        def backward(activations, target):
-            n_layers = len(layers)
-            deltas = [None] * (n_layers-1)
-            # Output layer delta
-            li = n_layers-2
-            is_last = True
-            f_d = out_d
-            out_a = activations[-1]
-            deltas[li] = [(out_a[j]-target[j]) * f_d(out_a[j]) for j in range(len(out_a))]
-            # Hidden layers
-            for li in range(n_layers-3, -1, -1):
-                n_in  = layers[li+1]
-                n_out_next = layers[li+2]
-                w_next = net.weights[li+1]
-                a = activations[li+1]
-                d_next = deltas[li+1]
-                d = []
-                for j in range(n_in):
-                    err = sum(d_next[k]*w_next[k*n_in+j] for k in range(n_out_next))
-                    d.append(err * act_d(a[j]))
-                deltas[li] = d
-            return deltas
-
-        # Update weights
-        def update(activations, deltas):
-            for li in range(len(net.weights)):
-                n_in  = layers[li]
-                n_out = layers[li+1]
-                d = deltas[li]
-                a_in = activations[li]
-                for j in range(n_out):
-                    net.biases[li][j]  -= lr * d[j]
-                    for k in range(n_in):
-                        net.weights[li][j*n_in+k] -= lr * d[j] * a_in[k]
+        if _resolve_name(opt_name, set(OPTIMIZERS), None) is None:
+            raise RuntimeError_(f"net: nieznany ~opt '{opt_name}' (dostępne: {', '.join(OPTIMIZERS)})")
+        opt = Optimizer(opt_name, params.get('beta1', 0.9), params.get('beta2'),
+                        params.get('eps', 1e-8))
+        dtype = params.get('dtype') or 'f64'
+        if dtype not in DTYPES:
+            raise RuntimeError_(f"net: nieznany ~dtype '{dtype}' (dostępne: {', '.join(DTYPES)})")
+        # ~schedule: lr liczone raz na epokę; ~patience: plateau straty tnie lr (plateau) albo kończy trening
+        schedule = None
+        if 'schedule' in params:
+            # ~schedule = exp to wbudowana funkcja exp — nazwa po tożsamości, jak ~act
+            schedule = _resolve_name(params['schedule'], set(SCHEDULES), None)
+            if schedule is None:
+                raise RuntimeError_(f"net: nieznany ~schedule (dostępne: {', '.join(SCHEDULES)})")
+        decay    = float(params.get('decay') or SCHEDULES.get(schedule) or 1.0)
+        warmup   = int(params.get('warmup') or 0)
+        every    = max(1, int(params.get('decay_every') or epochs // 4))
+        patience = int(params.get('patience') or (10 if schedule == 'plateau' else 0))
+
+        # Silnik NumPy: wagi jako macierze, forward/backward na całych paczkach
+        engine = NetEngine.initialized(layers, act_name, out_name, init_name, opt, dtype, loss_name)
+        net.opt_name = opt_name
+
+        def load_weights(path, load):
+            """Silnik z wagami (i stanem ~opt) z pliku — zamiast losowych."""
+            try:
+                data = load(path)
+            except OSError:
+                raise RuntimeError_(f"net {node.name}: nie mozna otworzyc '{path}'")
+            except ValueError as e:
+                raise RuntimeError_(f"net {node.name}: {e}")
+            if [int(n) for n in data.get('layers', [])] != layers:
+                raise RuntimeError_(f"net {node.name}: '{path}' ma warstwy {data.get('layers')}, net {layers}")
+            e = NetEngine.from_flat(layers, data['W'], data['B'], act_name, out_name, opt, dtype, loss_name)
+            e.restore_opt(data)
+            return e, data
+
+        start = 0
+        ckpt_last = (0.0, 0.0, lr)
+        if ckpt and os.path.exists(ckpt):
+            engine, data = load_weights(ckpt, netfile.load_checkpoint)
+            start = min(int(data['epoch']), epochs)
+            # stats() z ostatniej epoki, także gdy trening jest już skończony i nic nie biegnie
+            ckpt_last = (data['loss'], data['grad_norm'], data['lr'])
+            if data.get('rng'):
+                _random.setstate(data['rng'])   # ta sama kolejność próbek co bez przerwy
+            if log_every > 0:
+                print(f"net {node.name}: wznowiono z {ckpt}, epoka {start}")
+        elif warm:
+            engine, _ = load_weights(warm, netfile.load)
+
+        X = as_matrix([inp for inp, _ in dataset], layers[0], engine.real)
+        Y = as_matrix([tgt for _, tgt in dataset], layers[-1], engine.real)
+
+        metrics = (open(metrics_path, 'a' if start else 'w')
+                   if isinstance(metrics_path, str) and metrics_path else None)
+        engine.track_norm = metrics is not None
+        done = start
+        avg_loss, grad_norm, last_lr = ckpt_last
+
+        # Ctrl-C z ~checkpoint: epoka dobiega końca, zapis, wyjście; drugi Ctrl-C przerywa od razu
+        interrupted = []
+        def on_sigint(signum, frame):
+            interrupted.append(signum)
+            _signal.signal(_signal.SIGINT, _signal.default_int_handler)
+        old_sigint = None
+        if ckpt:
+            try:
+                old_sigint = _signal.signal(_signal.SIGINT, on_sigint)
+            except ValueError:
+                pass   # nie w głównym wątku
+        def save_ckpt(epoch):
+            netfile.save_checkpoint(ckpt, {'net': node.name, **engine.data()}, epoch, _random.getstate(),
+                                    (avg_loss, grad_norm, last_lr))
 
         # Trening
-        data_list = dataset[:]
-        for epoch in range(epochs):
-            _random.shuffle(data_list)
-            batches = [data_list]
-            if pack_size:
-                ps = int(pack_size)
-                batches = [data_list[i:i+ps] for i in range(0, len(data_list), ps)]
-
-            total_loss = 0.0
-            for batch in batches:
-                for inputs, target in batch:
-                    acts = forward(inputs)
-                    out_a = acts[-1]
-                    total_loss += sum((o-t)**2 for o,t in zip(out_a,target)) / len(target)
-                    deltas = backward(acts, target)
-                    update(acts, deltas)
-
-            avg_loss = total_loss / len(data_list)
-            if log_every > 0 and epoch % log_every == 0:
-                print(f"Epoch {epoch} | Loss: {round(avg_loss, 6)}")
-            if stop_loss > 0 and avg_loss < stop_loss:
-                if log_every > 0:
-                    print(f"Early stop epoch {epoch} | Loss: {round(avg_loss, 6)}")
-                break
-
-        net.trained = True
-        net._forward = forward
-        net._layers  = layers
+        order = list(range(len(dataset)))
+        lr0 = lr
+        base, best, wait = lr0, math.inf, 0   # base: ~lr po cięciach plateau
+        t_start = _time.perf_counter()
+        # try/finally: ~metrics zamknięty (bufor zapisany) i SIGINT przywrócony także
+        # po wyjątku w treningu i po SystemExit(130) z Ctrl-C
+        try:
+            for epoch in range(start, epochs):
+                t_epoch = _time.perf_counter()
+                lr = last_lr = schedule_lr(schedule, base, epoch, epochs, decay, warmup, every)
+                # kolejność od nowa co epokę: zależy tylko od stanu RNG (zapisanego w ~checkpoint)
+                order.sort()
+                _random.shuffle(order)
+                Xe, Ye = X[order], Y[order]
+
+                # ~pack = N: jeden uśredniony krok na paczkę N próbek, bez — krok na próbkę
+                total_loss = norm_sum = 0.0
+                for i in range(0, len(order), pack):
+                    total_loss += engine.step(Xe[i:i+pack], Ye[i:i+pack], lr)
+                    norm_sum += engine.grad_norm
+
+                avg_loss = total_loss / len(order)
+                done = epoch + 1
+                if metrics:
+                    dt = _time.perf_counter() - t_epoch
+                    grad_norm = norm_sum / -(-len(order) // pack)
+                    metrics.write(_json.dumps({'epoch': epoch, 'time': dt,
+                                               'samples_per_sec': len(order) / dt if dt > 0 else 0.0,
+                                               'loss': avg_loss, 'grad_norm': grad_norm, 'lr': lr}) + '\n')
+                if log_every > 0 and epoch % log_every == 0:
+                    print(f"Epoch {epoch} | Loss: {round(avg_loss, 6)}")
+                if stop_loss > 0 and avg_loss < stop_loss:
+                    if log_every > 0:
+                        print(f"Early stop epoch {epoch} | Loss: {round(avg_loss, 6)}")
+                    break
+                if patience:
+                    if avg_loss < best * (1.0 - 1e-4):
+                        best, wait = avg_loss, 0
+                    else:
+                        wait += 1
+                    if wait >= patience:
+                        wait = 0
+                        if schedule == 'plateau' and base * decay >= lr0 * 1e-3:
+                            base *= decay
+                        else:
+                            if log_every > 0:
+                                print(f"Plateau stop epoch {epoch} | Loss: {round(avg_loss, 6)}")
+                            break
+                if ckpt and (interrupted or done % ckpt_every == 0):
+                    save_ckpt(done)
+                if interrupted:
+                    print(f"net {node.name}: przerwano po epoce {epoch}, checkpoint zapisany do {ckpt}")
+                    raise SystemExit(130)
+            if ckpt and done > start:
+                save_ckpt(epochs)   # trening skończony (także przez ~stop): kolejne uruchomienie go pomija
+        finally:
+            if metrics:
+                metrics.close()
+            if old_sigint is not None:
+                _signal.signal(_signal.SIGINT, old_sigint)
+        elapsed = _time.perf_counter() - t_start
+        net.last_stats = dict(zip(STATS, (done, elapsed,
+                                          (done - start) * len(order) / elapsed if elapsed > 0 else 0.0,
+                                          avg_loss, grad_norm, last_lr)))
+
+        net.use_engine(engine)
 
         # Zarejestruj net w env
         env.set(node.name, net)
 
     def exec_net_load(self, node, env):
-        import json as _json, math as _math
         path = self.eval(node.path_node, env)
 
         try:
-            with open(path) as _f:
-                data = _json.load(_f)
+            data = netfile.load(path)
         except FileNotFoundError:
             raise RuntimeError_(f"net.load: nie mozna otworzyc '{path}'")
-
-        layers   = data['layers']
-        W_flat   = data['W']
-        B_flat   = data['B']
-        act_name = data.get('act', 'tanh')
-        out_name = data.get('act_out', act_name)
-
-        # Rebuild weights/biases as lists of lists
-        weights = []; biases = []
-        idx_w = 0; idx_b = 0
-        for i in range(len(layers) - 1):
-            n_in, n_out = layers[i], layers[i+1]
-            weights.append(W_flat[idx_w:idx_w + n_in*n_out]); idx_w += n_in*n_out
-            biases.append(B_flat[idx_b:idx_b + n_out]);        idx_b += n_out
-
-        def _get_act(aname):
-            if aname == 'tanh':    return _math.tanh
-            if aname == 'sigmoid': return lambda x: 1/(1+_math.exp(-x))
-            if aname == 'relu':    return lambda x: max(0.0, x)
-            if aname == 'leaky':   return lambda x: x if x>0 else 0.01*x
-            if aname == 'linear':  return lambda x: x
-            return _math.tanh
-
-        act_f = _get_act(act_name)
-        out_f = _get_act(out_name)
-
-        def _make_forward(w_ref, b_ref, af, of, ls):
-            def _fwd(inputs):
-                a = inputs[:]
-                activations = [a]
-                for li in range(len(w_ref)):
-                    n_in  = ls[li]; n_out = ls[li+1]
-                    w = w_ref[li]; b = b_ref[li]
-                    is_last = (li == len(w_ref)-1)
-                    f = of if is_last else af
-                    new_a = []
-                    for j in range(n_out):
-                        z = b[j]
-                        for k in range(n_in): z += a[k] * w[j*n_in+k]
-                        new_a.append(f(z))
-                    a = new_a; activations.append(a)
-                return activations
-            return _fwd
+        except ValueError as e:
+            raise RuntimeError_(f"net.load: {e}")
 
         net = KudaNet(node.name, {})
-        net.weights  = weights
-        net.biases   = biases
-        net.layers   = layers
-        net.act_name = act_name
-        net.out_name = out_name
-        net.trained  = True
-        net._forward = _make_forward(net.weights, net.biases, act_f, out_f, layers)
-        net._layers  = layers
+        net.load_data(data)
 
         env.set(node.name, net)
         print(f"Wagi wczytane z {path}")
@@ -895,12 +1076,10 @@ class Interpreter:
                     if not py_match and not msg_match:
                         continue
                 matched = True
+                # zmienne przypisane w fail są widoczne dalej (jak w C)
                 if var_name:
-                    clause_env = Environment(env)
-                    clause_env.set(var_name, clean_msg)
-                    self.exec_block(body, clause_env)
-                else:
-                    self.exec_block(body, env)
+                    env.set(var_name, clean_msg)
+                self.exec_block(body, env)
                 break
             if not matched:
                 raise
@@ -909,7 +1088,7 @@ class Interpreter:
 
     def eval(self, node, env):
         # Track current line for error messages
-        if hasattr(node, 'line') and node.line:
+        if node.line:
             self.current_line = node.line
 
         if isinstance(node, AnonFunNode):
@@ -983,7 +1162,7 @@ class Interpreter:
 
     def eval_binop(self, node, env):
         op = node.op
-        line = getattr(node, 'line', 0) or self.current_line
+        line = node.line or self.current_line
 
         # Leniwi operatorzy logiczni
         if op == 'and':
@@ -1001,7 +1180,10 @@ class Interpreter:
             if op == '/':
                 if right == 0: raise RuntimeError_(f"Division by zero", line)
                 return left / right
-            if op == '%': return left % right
+            if op == '%':
+                # jak kuda_mod w C: ZeroDivision, nie TypeError
+                if right == 0: raise RuntimeError_(f"Division by zero", line)
+                return left % right
             if op == '==': return left == right
             if op == '!=': return left != right
             if op == '<': return left < right
@@ -1075,96 +1257,7 @@ class Interpreter:
             if isinstance(obj, KudaNet):
                 method = obj.get_attr(method_name)
                 if isinstance(method, BoundNetMethod):
-                    net = method.net
-                    if method.method == 'predict':
-                        if not net.trained:
-                            raise RuntimeError_(f"Net '{net.name}' nie jest wytrenowana!")
-                        inputs = args[0] if args else []
-                        if not isinstance(inputs, list): inputs = [inputs]
-                        acts = net._forward(inputs)
-                        result = acts[-1]
-                        return result[0] if len(result) == 1 else result
-                    if method.method == 'write':
-                        import json as _json
-                        path = args[0] if args else f"{net.name}_weights.json"
-                        layers = getattr(net, 'layers', [])
-                        W_flat = [w for layer in net.weights for w in layer]
-                        B_flat = [b for layer in net.biases  for b in layer]
-                        data = {
-                            'net':    net.name,
-                            'layers': layers,
-                            'act':    getattr(net, 'act_name', 'tanh'),
-                            'act_out':getattr(net, 'out_name', 'tanh'),
-                            'W':      W_flat,
-                            'B':      B_flat,
-                        }
-                        with open(path, 'w') as _f:
-                            _json.dump(data, _f, indent=2)
-                        print(f"Wagi zapisane do {path}")
-                        return None
-                    if method.method == 'load':
-                        import json as _json
-                        path = args[0] if args else f"{net.name}_weights.json"
-                        try:
-                            with open(path) as _f:
-                                data = _json.load(_f)
-                        except FileNotFoundError:
-                            print(f"Blad: nie mozna otworzyc {path}")
-                            return None
-                        layers = data.get('layers', getattr(net, 'layers', []))
-                        W_flat = data.get('W', [])
-                        B_flat = data.get('B', [])
-                        net.weights = []
-                        net.biases  = []
-                        idx_w = 0
-                        idx_b = 0
-                        for i in range(len(layers) - 1):
-                            n_in, n_out = layers[i], layers[i+1]
-                            net.weights.append(W_flat[idx_w:idx_w + n_in*n_out])
-                            idx_w += n_in * n_out
-                            net.biases.append(B_flat[idx_b:idx_b + n_out])
-                            idx_b += n_out
-                        net.layers   = layers
-                        net.act_name = data.get('act',     getattr(net, 'act_name', 'tanh'))
-                        net.out_name = data.get('act_out', getattr(net, 'out_name', 'tanh'))
-                        net.trained  = True
-                        # Rebuild _forward with correct activations
-                        import math as _math
-                        def _get_act(aname):
-                            if aname == 'tanh':    return _math.tanh
-                            if aname == 'sigmoid': return lambda x: 1/(1+_math.exp(-x))
-                            if aname == 'relu':    return lambda x: max(0.0, x)
-                            if aname == 'leaky':   return lambda x: x if x>0 else 0.01*x
-                            if aname == 'linear':  return lambda x: x
-                            return _math.tanh
-                        _act_f = _get_act(net.act_name)
-                        _out_f = _get_act(net.out_name)
-                        _layers = layers[:]
-                        def _make_forward(n, w_ref, b_ref, af, of, ls):
-                            def _fwd(inputs):
-                                a = inputs[:]
-                                activations = [a]
-                                for li in range(len(w_ref)):
-                                    n_in  = ls[li]
-                                    n_out = ls[li+1]
-                                    w = w_ref[li]
-                                    b = b_ref[li]
-                                    is_last = (li == len(w_ref)-1)
-                                    f = of if is_last else af
-                                    new_a = []
-                                    for j in range(n_out):
-                                        z = b[j]
-                                        for k in range(n_in):
-                                            z += a[k] * w[j*n_in+k]
-                                        new_a.append(f(z))
-                                    a = new_a
-                                    activations.append(a)
-                                return activations
-                            return _fwd
-                        net._forward = _make_forward(net.name, net.weights, net.biases, _act_f, _out_f, _layers)
-                        print(f"Wagi wczytane z {path}")
-                        return None
-                    return None
+                    return method.net.call(method.method, args)
                 return method
 
             # Python module wrapper (from python_bridge.py)
@@ -1192,96 +1285,7 @@ class Interpreter:
 
         # Metoda sieci neuronowej
         if isinstance(func, BoundNetMethod):
-            net = func.net
-            if func.method == 'train':
-                # trening już wykonany w exec_net, tu nic nie robimy
-                return None
-            if func.method == 'predict':
-                if not net.trained:
-                    raise RuntimeError_(f"Net '{net.name}' nie jest wytrenowana!")
-                inputs = args[0] if args else []
-                if not isinstance(inputs, list): inputs = [inputs]
-                acts = net._forward(inputs)
-                result = acts[-1]
-                return result[0] if len(result) == 1 else result
-            if func.method == 'write':
-                import json as _json
-                path = args[0] if args else f"{net.name}_weights.json"
-                layers = getattr(net, 'layers', [])
-                W_flat = [w for layer in net.weights for w in layer]
-                B_flat = [b for layer in net.biases  for b in layer]
-                data = {
-                    'net':     net.name,
-                    'layers':  layers,
-                    'act':     getattr(net, 'act_name', 'tanh'),
-                    'act_out': getattr(net, 'out_name', 'tanh'),
-                    'W':       W_flat,
-                    'B':       B_flat,
-                }
-                with open(path, 'w') as _f:
-                    _json.dump(data, _f, indent=2)
-                print(f"Wagi zapisane do {path}")
-                return None
-            if func.method == 'load':
-                import json as _json, math as _math
-                path = args[0] if args else f"{net.name}_weights.json"
-                try:
-                    with open(path) as _f:
-                        data = _json.load(_f)
-                except FileNotFoundError:
-                    print(f"Blad: nie mozna otworzyc {path}")
-                    return None
-                layers = data.get('layers', getattr(net, 'layers', []))
-                W_flat = data.get('W', [])
-                B_flat = data.get('B', [])
-                net.weights = []
-                net.biases  = []
-                idx_w = 0; idx_b = 0
-                for i in range(len(layers) - 1):
-                    n_in, n_out = layers[i], layers[i+1]
-                    net.weights.append(W_flat[idx_w:idx_w + n_in*n_out])
-                    idx_w += n_in * n_out
-                    net.biases.append(B_flat[idx_b:idx_b + n_out])
-                    idx_b += n_out
-                net.layers   = layers
-                net.act_name = data.get('act',     getattr(net, 'act_name', 'tanh'))
-                net.out_name = data.get('act_out', getattr(net, 'out_name', 'tanh'))
-                net.trained  = True
-                def _get_act(aname):
-                    if aname == 'tanh':    return _math.tanh
-                    if aname == 'sigmoid': return lambda x: 1/(1+_math.exp(-x))
-                    if aname == 'relu':    return lambda x: max(0.0, x)
-                    if aname == 'leaky':   return lambda x: x if x>0 else 0.01*x
-                    if aname == 'linear':  return lambda x: x
-                    return _math.tanh
-                _act_f = _get_act(net.act_name)
-                _out_f = _get_act(net.out_name)
-                _lys = layers[:]
-                def _make_forward(w_ref, b_ref, af, of, ls):
-                    def _fwd(inputs):
-                        a = inputs[:]
-                        activations = [a]
-                        for li in range(len(w_ref)):
-                            n_in  = ls[li]
-                            n_out = ls[li+1]
-                            w = w_ref[li]; b = b_ref[li]
-                            is_last = (li == len(w_ref)-1)
-                            f = of if is_last else af
-                            new_a = []
-                            for j in range(n_out):
-                                z = b[j]
-                                for k in range(n_in): z += a[k] * w[j*n_in+k]
-                                new_a.append(f(z))
-                            a = new_a
-                            activations.append(a)
-                        return activations
-                    return _fwd
-                net._forward = _make_forward(net.weights, net.biases, _act_f, _out_f, _lys)
-                print(f"Wagi wczytane z {path}")
-                return None
-            if func.method == 'loss':
-                return None
-            return None
+            return func.net.call(func.method, args)
 
         # Funkcja Kuda
         if isinstance(func, KudaFunction):
@@ -1354,13 +1358,17 @@ class KudaGenerator:
         self.args   = args
         self.interp = interp
         self._iter  = self._run()
+        self._done  = False
 
     def _run(self):
         """Tworzy środowisko i startuje wykonanie ciała funkcji."""
         call_env = Environment(self.func.env)
         for i, param in enumerate(self.func.params):
             call_env.set(param, self.args[i] if i < len(self.args) else None)
-        yield from self._stmts(self.func.body, call_env)
+        try:
+            yield from self._stmts(self.func.body, call_env)
+        except GiveSignal:
+            return
 
     # ------------------------------------------------------------------
     # Mini-interpreter — obsługuje każdy węzeł AST który może zawierać yield
@@ -1378,9 +1386,9 @@ class KudaGenerator:
             yield self.interp.eval(node.value, env)
             return
 
-        # give / return — zakończ generator
+        # give / return — zakończ generator (także z wnętrza pętli)
         if isinstance(node, GiveNode):
-            return
+            raise GiveSignal(None)
 
         # break/continue — propaguj jako wyjątek
         if isinstance(node, BreakNode):
@@ -1461,7 +1469,11 @@ class KudaGenerator:
         return self
 
     def __next__(self):
-        return next(self._iter)
+        try:
+            return next(self._iter)
+        except StopIteration:
+            self._done = True
+            raise
 
     def get_attr(self, name):
         if name == 'collect':
@@ -1469,7 +1481,10 @@ class KudaGenerator:
             return lambda args: list(self._run())
         if name == 'next':
             # .next() — następna wartość lub None
-            return lambda args: next(self._iter, None)
+            return lambda args: next(self, None)
+        if name == 'done':
+            # .done() — True gdy next() wyszedł już za ostatnią wartość
+            return lambda args: self._done
         raise AttributeError(f"generator has no attribute '{name}'")
 
     def __repr__(self):
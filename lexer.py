@@ -1,4 +1,5 @@
 import re
+from collections import namedtuple
 
 # Typy tokenów
 TT_NUMBER    = 'NUMBER'
@@ -56,11 +57,9 @@ KEYWORDS = {
     'check', 'is',
 }
 
-class Token:
-    def __init__(self, type_, value, line=0):
-        self.type = type_
-        self.value = value
-        self.line = line
+# Token to krotka (type, value, line) — bez __dict__, dostęp po nazwie jak wcześniej
+class Token(namedtuple('Token', 'type value line', defaults=(0,))):
+    __slots__ = ()
 
     def __repr__(self):
         return f'Token({self.type}, {repr(self.value)}, line={self.line})'
@@ -71,6 +70,43 @@ class LexerError(Exception):
         super().__init__(f'[Kuda LexerError] Line {line}: {msg}')
 
 
+# Symbole: najpierw dwuznakowe, potem jednoznakowe
+SYMBOLS = {
+    '==': TT_EQ,      '!=': TT_NEQ,      '<=': TT_LTE,    '>=': TT_GTE,
+    '+=': TT_PLUS_EQ, '-=': TT_MINUS_EQ, '*=': TT_MUL_EQ, '/=': TT_DIV_EQ,
+    '=': TT_ASSIGN, '<': TT_LT, '>': TT_GT,
+    '+': TT_PLUS, '-': TT_MINUS, '*': TT_MUL, '/': TT_DIV, '%': TT_MOD,
+    '(': TT_LPAREN, ')': TT_RPAREN, '[': TT_LBRACKET, ']': TT_RBRACKET,
+    '{': TT_LBRACE, '}': TT_RBRACE,
+    ':': TT_COLON, ',': TT_COMMA, '.': TT_DOT, '~': TT_TILDE, '@': TT_AT,
+}
+OPENERS = frozenset('([{')
+CLOSERS = frozenset(')]}')
+
+# Jeden skan całego źródła: białe znaki przed tokenem pomijamy w tym samym
+# dopasowaniu, każda grupa to jedna klasa tokenu. Nowa linia łapie od razu
+# wcięcie następnej linii, więc INDENT/DEDENT liczymy raz na linię; `blank`
+# to nowa linia, po której jest pusta linia, komentarz albo koniec pliku.
+_TOKEN_RE = re.compile(r"""
+    [ \t\r]*
+    (?:
+        (?P<number>  \d[\d.]* | \.\d[\d.]* )
+      | (?P<ident>   [^\W\d]\w* )
+      | (?P<symbol>  [=!<>+\-*/]= | [=<>+\-*/%()\[\]{}:,.~@] )
+      | (?P<blank>   \n[ \t]*(?=[\n\#]|\Z) )
+      | (?P<nl>      \n[ \t]* )
+      | (?P<string>  "[^"\\]*(?:\\.[^"\\]*)*" | '[^'\\]*(?:\\.[^'\\]*)*' )
+      | (?P<comment> \#[^\n]* )
+      | (?P<bad>     ["'].* | . )
+      | \Z
+    )
+""", re.VERBOSE | re.DOTALL)
+
+
+def _unescape(value):
+    return value.replace('\\n', '\n').replace('\\t', '\t').replace('\\"', '"').replace("\\'", "'")
+
+
 class Lexer:
     def __init__(self, source):
         self.source = source
@@ -80,215 +116,96 @@ class Lexer:
         self.indent_stack = [0]
         self.paren_depth = 0  # licznik otwartych ( [ {
 
-    def current(self):
-        if self.pos < len(self.source):
-            return self.source[self.pos]
-        return None
-
-    def peek(self, offset=1):
-        p = self.pos + offset
-        if p < len(self.source):
-            return self.source[p]
-        return None
-
-    def advance(self):
-        ch = self.source[self.pos]
-        self.pos += 1
-        if ch == '\n':
-            self.line += 1
-        return ch
-
     def tokenize(self):
-        while self.pos < len(self.source):
-            self._next_token()
-
-        # Zamknij wszystkie otwarte wcięcia
-        while len(self.indent_stack) > 1:
-            self.indent_stack.pop()
+        self._scan(self.source, self.pos)
+        self.pos = len(self.source)
+        return self.finish()
+
+    def feed(self, text):
+        """
+        Tokenizuje kolejny fragment źródła (REPL, linia po linii). Linia,
+        wcięcia i nawiasy przechodzą między wywołaniami; po LexerError
+        stan jest taki jak przed wywołaniem.
+        """
+        saved = (len(self.tokens), list(self.indent_stack), self.line, self.paren_depth)
+        try:
+            self._scan(text, 0)
+        except LexerError:
+            n, self.indent_stack[:], self.line, self.paren_depth = saved
+            del self.tokens[n:]
+            raise
+
+    def finish(self):
+        """Zamyka otwarte wcięcia i dopisuje EOF."""
+        indent_stack = self.indent_stack
+        while len(indent_stack) > 1:
+            indent_stack.pop()
             self.tokens.append(Token(TT_DEDENT, None, self.line))
-
         self.tokens.append(Token(TT_EOF, None, self.line))
         return self.tokens
 
-    def _next_token(self):
-        ch = self.current()
-
-        # Komentarz
-        if ch == '#':
-            while self.current() and self.current() != '\n':
-                self.advance()
-            return
-
-        # Nowa linia + wcięcia
-        if ch == '\n':
-            self.advance()
-            # Wewnątrz nawiasów/list ignorujemy newline i wcięcia
-            if self.paren_depth > 0:
-                self._skip_whitespace_and_newlines()
-                return
-            self.tokens.append(Token(TT_NEWLINE, '\n', self.line))
-            self._handle_indent()
-            return
-
-        # Białe znaki (nie nowa linia)
-        if ch in ' \t\r':
-            self.advance()
-            return
-
-        # Liczby
-        if ch.isdigit() or (ch == '.' and self.peek() and self.peek().isdigit()):
-            self._read_number()
-            return
-
-        # Stringi
-        if ch in ('"', "'"):
-            self._read_string(ch)
-            return
-
-        # Identyfikatory i słowa kluczowe
-        if ch.isalpha() or ch == '_':
-            self._read_ident()
-            return
-
-        # Operatory i symbole
-        self._read_symbol()
-
-    def _skip_whitespace_and_newlines(self):
-        """Pomija białe znaki i newline wewnątrz nawiasów."""
-        while self.pos < len(self.source) and self.source[self.pos] in ' \t\r\n':
-            if self.source[self.pos] == '\n':
-                self.line += 1
-            self.pos += 1
-
-    def _handle_indent(self):
-        # Policz spacje na początku linii
-        spaces = 0
-        while self.pos < len(self.source) and self.source[self.pos] in ' \t':
-            if self.source[self.pos] == '\t':
-                spaces += 4
-            else:
-                spaces += 1
-            self.pos += 1
-
-        # Pomiń puste linie i komentarze — ale zachowaj pozycję
-        if self.pos < len(self.source) and self.source[self.pos] in ('\n', '#'):
-            return
-
-        # Pomiń też linie złożone tylko z białych znaków
-        if self.pos >= len(self.source):
-            return
-
-        current_indent = self.indent_stack[-1]
-
-        if spaces > current_indent:
-            self.indent_stack.append(spaces)
-            self.tokens.append(Token(TT_INDENT, spaces, self.line))
-        elif spaces < current_indent:
-            while self.indent_stack[-1] > spaces:
-                self.indent_stack.pop()
-                self.tokens.append(Token(TT_DEDENT, spaces, self.line))
-
-    def _read_number(self):
-        start = self.pos
-        is_float = False
-        while self.current() and (self.current().isdigit() or self.current() == '.'):
-            if self.current() == '.':
-                is_float = True
-            self.advance()
-        val = self.source[start:self.pos]
-        value = float(val) if is_float else int(val)
-        self.tokens.append(Token(TT_NUMBER, value, self.line))
-
-    def _read_string(self, quote):
-        self.advance()  # pomiń otwierający cudzysłów
-        start = self.pos
-        while self.current() and self.current() != quote:
-            if self.current() == '\\':
-                self.advance()
-            self.advance()
-        value = self.source[start:self.pos]
-        self.advance()  # pomiń zamykający cudzysłów
-        # Obsługa escape sequences
-        value = value.replace('\\n', '\n').replace('\\t', '\t').replace('\\"', '"').replace("\\'", "'")
-        self.tokens.append(Token(TT_STRING, value, self.line))
-
-    def _read_ident(self):
-        start = self.pos
-        while self.current() and (self.current().isalnum() or self.current() == '_'):
-            self.advance()
-        value = self.source[start:self.pos]
-        if value == 'True':
-            self.tokens.append(Token(TT_BOOL, True, self.line))
-        elif value == 'False':
-            self.tokens.append(Token(TT_BOOL, False, self.line))
-        else:
-            self.tokens.append(Token(value if value in KEYWORDS else TT_IDENT, value, self.line))
-
-    def _read_symbol(self):
-        ch = self.advance()
-        line = self.line
-
-        two = ch + (self.current() or '')
-
-        if two == '==':
-            self.advance(); self.tokens.append(Token(TT_EQ, '==', line))
-        elif two == '!=':
-            self.advance(); self.tokens.append(Token(TT_NEQ, '!=', line))
-        elif two == '<=':
-            self.advance(); self.tokens.append(Token(TT_LTE, '<=', line))
-        elif two == '>=':
-            self.advance(); self.tokens.append(Token(TT_GTE, '>=', line))
-        elif two == '+=':
-            self.advance(); self.tokens.append(Token(TT_PLUS_EQ, '+=', line))
-        elif two == '-=':
-            self.advance(); self.tokens.append(Token(TT_MINUS_EQ, '-=', line))
-        elif two == '*=':
-            self.advance(); self.tokens.append(Token(TT_MUL_EQ, '*=', line))
-        elif two == '/=':
-            self.advance(); self.tokens.append(Token(TT_DIV_EQ, '/=', line))
-        elif ch == '=':
-            self.tokens.append(Token(TT_ASSIGN, '=', line))
-        elif ch == '<':
-            self.tokens.append(Token(TT_LT, '<', line))
-        elif ch == '>':
-            self.tokens.append(Token(TT_GT, '>', line))
-        elif ch == '+':
-            self.tokens.append(Token(TT_PLUS, '+', line))
-        elif ch == '-':
-            self.tokens.append(Token(TT_MINUS, '-', line))
-        elif ch == '*':
-            self.tokens.append(Token(TT_MUL, '*', line))
-        elif ch == '/':
-            self.tokens.append(Token(TT_DIV, '/', line))
-        elif ch == '%':
-            self.tokens.append(Token(TT_MOD, '%', line))
-        elif ch == '(':
-            self.paren_depth += 1
-            self.tokens.append(Token(TT_LPAREN, '(', line))
-        elif ch == ')':
-            self.paren_depth -= 1
-            self.tokens.append(Token(TT_RPAREN, ')', line))
-        elif ch == '[':
-            self.paren_depth += 1
-            self.tokens.append(Token(TT_LBRACKET, '[', line))
-        elif ch == ']':
-            self.paren_depth -= 1
-            self.tokens.append(Token(TT_RBRACKET, ']', line))
-        elif ch == '{':
-            self.paren_depth += 1
-            self.tokens.append(Token(TT_LBRACE, '{', line))
-        elif ch == '}':
-            self.paren_depth -= 1
-            self.tokens.append(Token(TT_RBRACE, '}', line))
-        elif ch == ':':
-            self.tokens.append(Token(TT_COLON, ':', line))
-        elif ch == ',':
-            self.tokens.append(Token(TT_COMMA, ',', line))
-        elif ch == '.':
-            self.tokens.append(Token(TT_DOT, '.', line))
-        elif ch == '~':
-            self.tokens.append(Token(TT_TILDE, '~', line))
-        elif ch == '@':
-            self.tokens.append(Token(TT_AT, '@', line))
-        else:
-            raise LexerError(f"Unknown character: '{ch}'", line)
\ No newline at end of file
+    def _scan(self, text, pos):
+        tokens = self.tokens
+        add = tokens.append
+        new = tuple.__new__
+        keywords = KEYWORDS
+        symbols = SYMBOLS
+        indent_stack = self.indent_stack
+        line, depth = self.line, self.paren_depth
+
+        for number, ident, symbol, blank, nl, string, _, bad in _TOKEN_RE.findall(text, pos):
+            if ident:
+                if ident in keywords:
+                    if ident == 'True':
+                        add(new(Token, (TT_BOOL, True, line)))
+                    elif ident == 'False':
+                        add(new(Token, (TT_BOOL, False, line)))
+                    else:
+                        add(new(Token, (ident, ident, line)))
+                elif ident[0] == '_' or ident[0].isalpha():
+                    add(new(Token, (TT_IDENT, ident, line)))
+                else:
+                    raise LexerError(f"Unknown character: '{ident[0]}'", line)
+
+            elif symbol:
+                if symbol in OPENERS:
+                    depth += 1
+                elif symbol in CLOSERS:
+                    depth -= 1
+                add(new(Token, (symbols[symbol], symbol, line)))
+
+            elif nl:
+                line += 1
+                # Wewnątrz nawiasów/list ignorujemy newline i wcięcia
+                if depth > 0:
+                    continue
+                add(new(Token, (TT_NEWLINE, '\n', line)))
+                spaces = len(nl) - 1 + 3 * nl.count('\t')
+                current_indent = indent_stack[-1]
+                if spaces > current_indent:
+                    indent_stack.append(spaces)
+                    add(new(Token, (TT_INDENT, spaces, line)))
+                elif spaces < current_indent:
+                    while indent_stack[-1] > spaces:
+                        indent_stack.pop()
+                        add(new(Token, (TT_DEDENT, spaces, line)))
+
+            elif blank:
+                # Puste linie i komentarze nie zmieniają wcięcia
+                line += 1
+                if depth <= 0:
+                    add(new(Token, (TT_NEWLINE, '\n', line)))
+
+            elif number:
+                add(new(Token, (TT_NUMBER, float(number) if '.' in number else int(number), line)))
+
+            elif string:  # numer linii to linia zamykającego cudzysłowu
+                line += string.count('\n')
+                add(new(Token, (TT_STRING, _unescape(string[1:-1]), line)))
+
+            elif bad:
+                if bad[0] in ('"', "'"):
+                    raise LexerError('Unterminated string', line + bad.count('\n'))
+                raise LexerError(f"Unknown character: '{bad}'", line)
+
+        self.line, self.paren_depth = line, depth
@@ -10,6 +10,7 @@ sys.path.insert(0, KUDA_DIR)
 from lexer import Lexer, LexerError
 from parser import Parser, ParseError
 from interpreter import Interpreter, RuntimeError_
+from astcache import parse_file, parse_source
 
 VERSION = "0.2.10"
 
@@ -19,9 +20,12 @@ Kuda v0.2.10 - Fast ML language that compiles to C
 Usage:
   kuda <file.kuda>            Run file (compiles to C, super fast!)
   kuda py <file.kuda>         Run with Python libraries (numpy, etc.)
-  kuda build <file.kuda>      Build a standalone binary
+  kuda build <file.kuda>      Build a standalone binary (--f32: float matrices,
+                              --quantize: net.load() nets predict in int8)
   kuda interp <file.kuda>     Interpreter mode (for debugging)
-  kuda repl                   Interactive REPL
+  kuda check <file.kuda>      Check syntax (--backend: C/interpreter support report)
+  kuda convert <in> <out>     Convert net weights between .json and binary .kw
+  kuda repl                   Interactive REPL (:time / :prof to measure)
   kuda version                Show version
   kuda help                   Show this help
 
@@ -33,19 +37,16 @@ Examples:
   kuda repl                   # Interactive console
 """
 
-def parse_source(source):
-    lexer = Lexer(source)
-    tokens = lexer.tokenize()
-    parser = Parser(tokens)
-    return parser.parse()
-
-def run_interpreted(path):
-    with open(path, 'r', encoding='utf-8') as f:
-        source = f.read()
+def run_interpreted(path, ast=None, c_funcs=None):
     interpreter = Interpreter()
+    # mixed mode: functions already compiled to C are plain builtins here
+    for name, fn in (c_funcs or {}).items():
+        fn.bind(interpreter)
+        interpreter.global_env.set(name, fn)
     try:
-        ast = parse_source(source)
-        interpreter.run(ast)
+        if ast is None:
+            ast = parse_file(path)
+        interpreter.run(ast, path)
     except LexerError as e:
         print(str(e)); sys.exit(1)
     except ParseError as e:
@@ -57,22 +58,26 @@ def run_interpreted(path):
         prefix = f"[Kuda] Line {line}: " if line else "[Kuda] Error: "
         print(f"{prefix}{e}"); sys.exit(1)
 
-def compile_to_binary(path, output=None, silent=False):
+def compile_to_binary(path, output=None, silent=False, f32=False, quantize=False, generated=None):
+    # generated = (CGenerator, kod C) gdy program już przeszedł przez codegen (backends.analyze)
     from codegen import CGenerator, CompileError
 
-    with open(path, 'r', encoding='utf-8') as f:
-        source = f.read()
-
-    try:
-        ast = parse_source(source)
-    except (LexerError, ParseError) as e:
-        print(str(e)); sys.exit(1)
+    if generated is not None:
+        gen, c_code = generated
+    else:
+        try:
+            ast = parse_file(path)
+        except (LexerError, ParseError) as e:
+            print(str(e)); sys.exit(1)
 
-    try:
-        gen = CGenerator()
-        c_code = gen.generate(ast, source_file=os.path.abspath(path))
-    except Exception as e:
-        print(f"[Kuda CompileError] {e}"); sys.exit(1)
+        try:
+            gen = CGenerator()
+            gen.quantize_loaded = quantize
+            c_code = gen.generate(ast, source_file=os.path.abspath(path))
+        except CompileError as e:
+            print(str(e)); sys.exit(1)
+        except Exception as e:
+            print(f"[Kuda CompileError] {e}"); sys.exit(1)
 
     c_file = tempfile.NamedTemporaryFile(suffix='.c', delete=False, mode='w', encoding='utf-8')
     c_file.write(c_code)
@@ -82,6 +87,9 @@ def compile_to_binary(path, output=None, silent=False):
         output = os.path.splitext(path)[0]
 
     cmd = ['gcc', '-O2', '-o', output, c_file.name]
+    if f32:
+        # Matrix w runtime jako float (kuda_real), zob. _runtime() w codegen.py
+        cmd.append('-DKUDA_F32')
     # Add extra .c files from extern "file.c" statements
     src_dir = os.path.dirname(os.path.abspath(path))
     for cf in gen.extra_c_files:
@@ -99,59 +107,39 @@ def compile_to_binary(path, output=None, silent=False):
 
     return output
 
-def run_fast(path):
-    # Sprawdź czy używa DataBuilder — jeśli tak, od razu interpreter
+def run_fast(path, f32=False):
+    # Wybór backendu z góry: statyczna analiza AST (backends.py) zamiast
+    # kompilacji i fallbacku po błędzie gcc. Gdy gcc mimo to odrzuci kod,
+    # który analiza przepuściła, program idzie do trybu mieszanego
     try:
-        with open(path) as _f: _src = _f.read()
-        from lexer import Lexer
-        from parser import Parser
-        _tokens = Lexer(_src).tokenize()
-        _ast = Parser(_tokens).parse()
-        from codegen import CGenerator
-        _cg = CGenerator()
-        # Fallback do interpretera tylko jeśli używa DataBuilder bez net
-        from parser import NetNode, YieldNode, TryNode
-        _has_net = any(isinstance(s, NetNode) for s in _ast.statements)
-        if _cg._uses_data_builder(_ast) and not _has_net:
-            run_interpreted(path)
-            return
-        # Fallback do interpretera jeśli kod używa yield lub try/fail
-        def _ast_has_node(stmts, node_type):
-            for s in stmts:
-                if isinstance(s, node_type):
-                    return True
-                for attr in ('body', 'else_body', 'statements', 'try_body', 'fail_body'):
-                    sub = getattr(s, attr, None)
-                    if isinstance(sub, list) and _ast_has_node(sub, node_type):
-                        return True
-                if hasattr(s, 'cases'):
-                    for _, body in s.cases:
-                        if _ast_has_node(body, node_type):
-                            return True
-                if hasattr(s, 'fail_clauses'):
-                    for _, _, body in s.fail_clauses:
-                        if _ast_has_node(body, node_type):
-                            return True
-            return False
-        if _ast_has_node(_ast.statements, YieldNode):
-            run_interpreted(path)
-            return
-        if _ast_has_node(_ast.statements, TryNode):
-            run_interpreted(path)
-            return
-    except Exception:
-        pass
+        ast = parse_file(path)
+    except (LexerError, ParseError) as e:
+        print(str(e)); sys.exit(1)
+    from backends import analyze, INTERP_BACKEND
+    try:
+        report = analyze(ast, os.path.abspath(path))
+    except Exception as e:
+        print(f"[Kuda CompileError] {e}"); sys.exit(1)
+    if report.backend != 'c':
+        run_mixed(path)
+        return
 
     tmp_bin = tempfile.NamedTemporaryFile(delete=False, suffix='')
     tmp_bin.close()
 
-    binary = compile_to_binary(path, output=tmp_bin.name, silent=False)
+    # extern / biblioteka C: interpreter tego nie uruchomi, błąd gcc zostaje błędem
+    needs_c = bool(report.blocks(INTERP_BACKEND))
+    binary = compile_to_binary(path, output=tmp_bin.name, silent=not needs_c, f32=f32,
+                               generated=(report.generator, report.c_code))
 
     if binary is None:
         try: os.unlink(tmp_bin.name)
         except: pass
-        print("[Kuda] Falling back to interpreter...")
-        run_interpreted(path)
+        if needs_c:
+            sys.exit(1)
+        # luka w analizie, nie błąd programu: interpreter poradzi sobie z resztą
+        print("[Kuda] note: gcc rejected the generated C, running in mixed mode", file=sys.stderr)
+        run_mixed(path)
         return
 
     result = subprocess.run([binary])
@@ -159,6 +147,33 @@ def run_fast(path):
     except: pass
     sys.exit(result.returncode)
 
+def run_mixed(path):
+    """Compile the functions C can handle into a shared library, interpret the rest."""
+    from mixed import load_mixed
+    try:
+        ast = parse_file(path)
+        mixed = load_mixed(ast, os.path.abspath(path))
+    except Exception:
+        mixed = None
+    if mixed is None:
+        run_interpreted(path)
+        return
+    ast.statements, c_funcs = mixed
+    run_interpreted(path, ast, c_funcs)
+
+def check_backend(path):
+    """kuda check --backend: print what each backend supports, without compiling."""
+    from backends import analyze
+    try:
+        ast = parse_file(path)
+    except (LexerError, ParseError) as e:
+        print(str(e)); sys.exit(1)
+    try:
+        report = analyze(ast, os.path.abspath(path))
+    except Exception as e:
+        print(f"[Kuda CompileError] {e}"); sys.exit(1)
+    print(report.format(path))
+
 def run_python_mode(path):
     from python_bridge import PythonBridge
     bridge = PythonBridge()
@@ -173,74 +188,15 @@ def check_file(path):
         sys.exit(1)
 
 def run_repl():
-    from lexer import Lexer, LexerError
-    from parser import Parser, ParseError
-    from interpreter import Interpreter, RuntimeError_
-
-    interp = Interpreter()
-    print(f"Kuda v{VERSION} REPL — type 'exit' or Ctrl+C to quit")
-
-    buf = []  # bufor na wieloliniowe bloki (fun, if, each itp.)
-
-    while True:
-        try:
-            prompt = '... ' if buf else '>>> '
-            try:
-                line = input(prompt)
-            except EOFError:
-                print()
-                break
-
-            if line.strip() in ('exit', 'quit'):
-                break
-
-            buf.append(line)
-            source = '\n'.join(buf)
-
-            # Sprawdź czy blok jest niekompletny (ostatnia niepusta linia kończy się ':')
-            stripped = line.rstrip()
-            if stripped.endswith(':') or (buf and stripped == ''):
-                # Jeśli pusta linia i mamy bufor — próbuj wykonać
-                if stripped == '' and len(buf) > 1:
-                    pass  # spróbujemy wykonać poniżej
-                else:
-                    continue  # czekaj na więcej linii
-
-            # Spróbuj sparsować i wykonać
-            try:
-                tokens = Lexer(source).tokenize()
-                ast    = Parser(tokens).parse()
-                interp.run(ast)
-                buf = []  # sukces — wyczyść bufor
-            except ParseError as e:
-                msg = str(e)
-                # Niekompletny blok — czekaj na więcej linii
-                if 'INDENT' in msg or 'EOF' in msg or 'expected' in msg.lower():
-                    continue
-                print(msg)
-                buf = []
-            except LexerError as e:
-                print(str(e))
-                buf = []
-            except RuntimeError_ as e:
-                print(str(e))
-                buf = []
-            except Exception as e:
-                line_no = interp.current_line
-                prefix  = f'[Kuda] Line {line_no}: ' if line_no else '[Kuda] '
-                print(f'{prefix}{e}')
-                buf = []
-
-        except KeyboardInterrupt:
-            print()
-            if buf:
-                buf = []  # anuluj bufor, nie wychodzi z REPL
-            else:
-                break
+    from repl import Repl
+    Repl(VERSION).run()
 
 
 def main():
     args = sys.argv[1:]
+    # --f32: Matrix values as float in compiled programs (build / run)
+    f32 = '--f32' in args
+    args = [a for a in args if a != '--f32']
 
     if not args or args[0] in ('help', '--help', '-h'):
         print(HELP); return
@@ -259,12 +215,44 @@ def main():
         check_file(args[1])
         run_python_mode(args[1]); return
 
-    # kuda build <file.kuda>
+    # kuda check [--backend] <file.kuda>
+    if args[0] == 'check':
+        rest = [a for a in args[1:] if a != '--backend']
+        if not rest:
+            print("[Kuda] Missing file. Usage: kuda check --backend <file.kuda>"); sys.exit(1)
+        check_file(rest[0])
+        if '--backend' in args:
+            check_backend(rest[0])
+        else:
+            try:
+                parse_file(rest[0])
+            except (LexerError, ParseError) as e:
+                print(str(e)); sys.exit(1)
+            print(f"[Kuda] {rest[0]}: OK")
+        return
+
+    # kuda convert <in.json|in.kw> <out.kw|out.json>
+    if args[0] == 'convert':
+        if len(args) < 3:
+            print("[Kuda] Missing file. Usage: kuda convert <in.json> <out.kw>"); sys.exit(1)
+        import netfile
+        try:
+            netfile.convert(args[1], args[2])
+        except FileNotFoundError:
+            print(f"[Kuda] File not found: '{args[1]}'"); sys.exit(1)
+        except (ValueError, KeyError) as e:
+            print(f"[Kuda] Cannot convert '{args[1]}': {e}"); sys.exit(1)
+        print(f"[Kuda] Converted: {args[1]} -> {args[2]}")
+        return
+
+    # kuda build [--quantize] <file.kuda>
     if args[0] == 'build':
+        quantize = '--quantize' in args
+        args = [a for a in args if a != '--quantize']
         if len(args) < 2:
             print("[Kuda] Missing file. Usage: kuda build <file.kuda>"); sys.exit(1)
         check_file(args[1])
-        out = compile_to_binary(args[1])
+        out = compile_to_binary(args[1], f32=f32, quantize=quantize)
         if out:
             print(f"[Kuda] Built: {out}")
         return
@@ -281,12 +269,12 @@ def main():
         if len(args) < 2:
             print("[Kuda] Missing file. Usage: kuda <file.kuda>"); sys.exit(1)
         check_file(args[1])
-        run_fast(args[1]); return
+        run_fast(args[1], f32); return
 
     # kuda <file.kuda> - default simplest usage
     if args[0].endswith('.kuda'):
         check_file(args[0])
-        run_fast(args[0]); return
+        run_fast(args[0], f32); return
 
     print(f"[Kuda] Unknown command: '{args[0]}'. Run 'kuda help'.")
     sys.exit(1)
@@ -0,0 +1,597 @@
+"""
+mixed.py — Kuda mixed mode.
+
+When a program cannot be compiled to C as a whole (a generator shape the C
+backend does not lower, DataBuilder used outside a net, a C compile error),
+run_fast no longer hands everything to the interpreter. The top-level
+functions that can be compiled are built into a shared library and the
+interpreter calls them through ctypes; everything else stays interpreted.
+
+A function is compiled when it
+  - is not a generator and does not use `data`,
+  - reads and writes no top-level variable, model or net (those live in
+    the interpreter),
+  - only calls builtins and other compiled functions,
+  - takes and returns numbers, strings or flat lists,
+  - gets arguments of a proven type at every call: literals, arithmetic,
+    builtins with a known result and variables whose every assignment has
+    the same type. A function passed around as a value is never compiled.
+
+Top-level statements share the interpreter's variables, nets and models, so
+they are not split one by one. A run of top-level statements is compiled as
+one group (a function without parameters) only when it has a loop, touches
+no variable used anywhere else in the program and calls only builtins and
+compiled functions. The interpreter runs the rest and calls into the groups.
+
+Marshaling at the boundary:
+    number, bool <-> double   (True/False as 1/0)
+    string       <-> char*    (UTF-8, returned strings are copied)
+    flat list    <-> KList*   of doubles
+
+A call whose arguments do not fit this scheme (a string where a number was
+expected, a list of strings) runs the interpreted definition instead.
+
+Each call frees what it allocated: the KLists built for list arguments
+(kuda_list_free) and the returned list or string once it is copied into
+Python (kuda_list_free / kuda_lib_free). Compiled functions return strings
+as a fresh copy (kuda_lib_own), so the returned pointer is always ours.
+"""
+
+import ctypes
+import os
+import subprocess
+import sys
+import tempfile
+
+from parser import (AssignNode, AugAssignNode, IndexAssignNode, FunNode, AnonFunNode,
+                    IdentNode, CallNode, ModelNode, NetNode, NetLoadNode, UseNode,
+                    ExternNode, EachNode, EachUnpackNode, ListCompNode, RepeatNode,
+                    TilNode, IfNode, CheckNode, TryNode, OutNode, GiveNode, YieldNode,
+                    DictNode, TupleNode, NumberNode, BoolNode, StringNode, ListNode,
+                    UnaryOpNode, BinOpNode, IndexNode, ProgramNode, walk)
+from interpreter import RuntimeError_, KudaFunction
+
+MARSHALED = ('double', 'str', 'list')
+
+# builtins with a known result type (the rest: unknown)
+NUM_FUNCS = {'len', 'int', 'float', 'abs', 'round', 'sum', 'rand', 'rand_float',
+             'rand_normal', 'prw', 'pot', 'log', 'exp', 'dwn', 'up', 'sigmoid',
+             'sigmoid_d', 'tanh', 'tanh_d', 'relu', 'relu_d', 'leaky', 'leaky_d',
+             'dot', 'argmax', 'argmin', 'clip', 'mean', 'norm', 'acc', 'crent',
+             'fd', 'cnt'}
+STR_FUNCS = {'str', 'type', 'input', 'caps', 'small', 'trim', 'swap', 'merge', 'read'}
+LIST_FUNCS = {'range', 'softmax', 'xav', 'he'}
+COMPARE = ('==', '!=', '<', '>', '<=', '>=')
+
+OPAQUE = object()    # zasięg lambdy, metody modelu albo zagnieżdżonej funkcji
+PENDING = object()   # typ zmiennej, który właśnie liczymy (przypisanie x = x + 1)
+
+# what a statement group may contain
+GROUP_STMTS = (AssignNode, AugAssignNode, IndexAssignNode, OutNode, CallNode,
+               EachNode, RepeatNode, TilNode, IfNode, CheckNode, TryNode)
+LOOPS = (EachNode, RepeatNode, TilNode)
+NOT_IN_GROUP = (DictNode, TupleNode, AnonFunNode, EachUnpackNode, YieldNode,
+                GiveNode, FunNode, ModelNode, NetNode, NetLoadNode, UseNode, ExternNode)
+
+
+class KList(ctypes.Structure):
+    _fields_ = [('data', ctypes.POINTER(ctypes.c_double)),
+                ('len', ctypes.c_int),
+                ('cap', ctypes.c_int)]
+
+
+def _scoped(statements):
+    """
+    (node, scope) for every node of the program: scope is the top-level
+    FunNode the node is in, None at top level, OPAQUE in models, lambdas
+    and nested functions.
+    """
+    stack = [(s, None) for s in reversed(statements)]
+    while stack:
+        n, scope = stack.pop()
+        yield n, scope
+        inner = scope
+        if isinstance(n, FunNode):
+            inner = n if scope is None else OPAQUE
+        elif isinstance(n, (AnonFunNode, ModelNode)):
+            inner = OPAQUE
+        stack.extend((c, inner) for c in reversed(n.children()))
+
+
+def bound_names(node):
+    """Names a statement binds: assignments, loop variables, fail variables."""
+    out = set()
+    for n in walk(node):
+        if isinstance(n, (AssignNode, AugAssignNode)) and isinstance(n.name, str):
+            out.add(n.name)
+        elif isinstance(n, (EachNode, ListCompNode)):
+            out.add(n.var)
+        elif isinstance(n, EachUnpackNode):
+            out.update(n.vars)
+        elif isinstance(n, TryNode):
+            out.update(var for _, var, _ in n.fail_clauses if var)
+    return out
+
+
+def free_names(f):
+    """
+    Names a function reads or writes outside itself. Assignment inside a
+    function is local, but `x += 1` on a name it never assigns changes
+    the global one (Environment.set_or_assign).
+    """
+    local = set(f.params)
+    for n in walk(f):
+        if isinstance(n, AssignNode) and isinstance(n.name, str):
+            local.add(n.name)
+        elif isinstance(n, (EachNode, ListCompNode)):
+            local.add(n.var)
+        elif isinstance(n, EachUnpackNode):
+            local.update(n.vars)
+        elif isinstance(n, TryNode):
+            local.update(var for _, var, _ in n.fail_clauses if var)
+        elif isinstance(n, (FunNode, AnonFunNode)):
+            local.update(n.params)
+    used = {n.name for n in walk(f) if isinstance(n, IdentNode)}
+    used |= {n.name for n in walk(f) if isinstance(n, AugAssignNode)}
+    return used - local
+
+
+def top_level_names(ast):
+    """Everything the interpreter keeps in the global environment."""
+    out = set()
+    for s in ast.statements:
+        if isinstance(s, (FunNode, ModelNode, NetNode, NetLoadNode)):
+            out.add(s.name)
+        elif isinstance(s, UseNode):
+            if s.alias: out.add(s.alias)
+        elif isinstance(s, ExternNode):
+            if s.name: out.add(s.name)
+        else:
+            out |= bound_names(s)
+    return out
+
+
+class _Types:
+    """
+    Static types of expressions where they are certain: 'double', 'str',
+    'list' (of numbers) or None. proven: {function: parameter types} of
+    the functions still considered for compiling.
+    """
+
+    def __init__(self, ast, proven, ret):
+        self.proven = proven
+        self.ret = ret
+        self.funs = {s.name for s in ast.statements if isinstance(s, FunNode)}
+        self.src = {}      # scope -> {name: [(rodzaj, wyrażenie)]}
+        self.busy = set()
+        augs = []
+        for n, scope in _scoped(ast.statements):
+            if scope is OPAQUE:
+                continue
+            if isinstance(n, AssignNode) and isinstance(n.name, str):
+                self._add(scope, n.name, ('=', n.value))
+            elif isinstance(n, (EachNode, ListCompNode)):
+                self._add(scope, n.var, ('each', n.iterable))
+            elif isinstance(n, EachUnpackNode):
+                for v in n.vars: self._add(scope, v, ('?', None))
+            elif isinstance(n, TryNode):
+                for _, var, _ in n.fail_clauses:
+                    if var: self._add(scope, var, ('str', None))
+            elif isinstance(n, AugAssignNode):
+                augs.append((n, scope))
+        for n, scope in augs:
+            # += na nazwie, której funkcja nie przypisuje, zmienia globalną
+            if scope is not None and n.name not in scope.params and n.name not in self.src.get(scope, {}):
+                scope = None
+            self._add(scope, n.name, ('aug', n))
+
+    def _add(self, scope, name, source):
+        self.src.setdefault(scope, {}).setdefault(name, []).append(source)
+
+    def var(self, name, scope):
+        if scope is OPAQUE:
+            return None
+        if scope is not None:
+            if name in scope.params:
+                types = self.proven.get(scope.name)
+                return types[scope.params.index(name)] if types else None
+            if name in self.src.get(scope, {}):
+                return self._union(name, scope)
+        if name in self.funs or name not in self.src.get(None, {}):
+            return None
+        return self._union(name, None)
+
+    def _union(self, name, scope):
+        key = (name, id(scope))
+        if key in self.busy:
+            return PENDING
+        self.busy.add(key)
+        try:
+            types = {self._source(kind, e, scope) for kind, e in self.src[scope][name]}
+        finally:
+            self.busy.discard(key)
+        types.discard(PENDING)
+        return types.pop() if len(types) == 1 else None
+
+    def _source(self, kind, e, scope):
+        if kind == '=':
+            return self.of(e, scope)
+        if kind == 'each':
+            t = self.of(e, scope)
+            return 'double' if t == 'list' else 'str' if t == 'str' else None
+        if kind == 'aug':
+            t = self.of(e.value, scope)
+            return t if e.op == '+' or t is PENDING else ('double' if t == 'double' else None)
+        if kind == 'str':
+            return 'str'
+        return None
+
+    def of(self, e, scope):
+        if isinstance(e, (NumberNode, BoolNode)):
+            return 'double'
+        if isinstance(e, StringNode):
+            return 'str'
+        if isinstance(e, IdentNode):
+            return self.var(e.name, scope)
+        if isinstance(e, ListNode):
+            ok = all(self.of(x, scope) in ('double', PENDING) for x in e.elements)
+            return 'list' if ok else None
+        if isinstance(e, UnaryOpNode):
+            if e.op == 'not': return 'double'
+            return 'double' if self.of(e.operand, scope) in ('double', PENDING) else None
+        if isinstance(e, BinOpNode):
+            if e.op in COMPARE:
+                return 'double'
+            l, r = self.of(e.left, scope), self.of(e.right, scope)
+            if l is PENDING: l = r
+            if r is PENDING: r = l
+            if l != r or l is None:
+                return None
+            if e.op == '+':
+                return l
+            return l if l in ('double', PENDING) else None
+        if isinstance(e, IndexNode):
+            t = self.of(e.obj, scope)
+            return 'double' if t == 'list' else 'str' if t == 'str' else None
+        if isinstance(e, CallNode) and isinstance(e.func, IdentNode):
+            name = e.func.name
+            if name in self.funs:
+                return self.ret.get(name, 'double') if name in self.proven else None
+            if name in NUM_FUNCS:  return 'double'
+            if name in STR_FUNCS:  return 'str'
+            if name in LIST_FUNCS: return 'list'
+        return None
+
+
+def _param_types(cg, f):
+    """Parameter types codegen inferred from the call sites ('double' where none)."""
+    types = cg.func_param_types.get(f.name, [])
+    return [types[i] if i < len(types) else 'double' for i in range(len(f.params))]
+
+
+def partition(ast, cg):
+    """
+    Split the top-level functions into compiled and interpreted.
+    Returns (names to compile, {name: reason it stays interpreted}).
+    """
+    funs = {s.name: s for s in ast.statements if isinstance(s, FunNode)}
+    globals_ = top_level_names(ast) - set(funs)
+
+    reasons = {}
+    calls = {}
+    for name, f in funs.items():
+        outer = free_names(f)
+        calls[name] = {n.func.name for n in walk(f)
+                       if isinstance(n, CallNode) and isinstance(n.func, IdentNode)
+                       and n.func.name in funs and n.func.name != name}
+        if cg._has_yield(f.body):
+            reasons[name] = 'generator'
+        elif 'data' in outer:
+            reasons[name] = 'uses DataBuilder'
+        elif outer & globals_:
+            reasons[name] = f"uses global '{sorted(outer & globals_)[0]}'"
+        elif cg.func_return_types.get(name, 'double') not in MARSHALED:
+            reasons[name] = 'return type cannot cross into the interpreter'
+        elif any(t not in MARSHALED for t in _param_types(cg, f)):
+            reasons[name] = 'parameter type cannot cross into the interpreter'
+
+    # every call of a compiled function, and the ones used as values
+    sites = {}
+    callees = set()
+    for n, scope in _scoped(ast.statements):
+        if isinstance(n, CallNode) and isinstance(n.func, IdentNode) and n.func.name in funs:
+            sites.setdefault(n.func.name, []).append((n, scope))
+            callees.add(id(n.func))
+    values = {n.name for n, _ in _scoped(ast.statements)
+              if isinstance(n, IdentNode) and n.name in funs and id(n) not in callees}
+
+    proven = {n: _param_types(cg, f) for n, f in funs.items() if n not in reasons}
+    types = _Types(ast, proven, cg.func_return_types)
+
+    def unproven(name):
+        if name in values:
+            return True
+        for call, scope in sites.get(name, []):
+            if len(call.args) != len(funs[name].params):
+                return True
+            if any(types.of(a, scope) != t for a, t in zip(call.args, proven[name])):
+                return True
+        return False
+
+    # a function calling an interpreted one stays interpreted too; without
+    # it, the types of its results and parameters are no longer certain
+    changed = True
+    while changed:
+        changed = False
+        for name in list(proven):
+            bad = [c for c in calls[name] if c in reasons]
+            if bad:
+                reasons[name] = f"calls interpreted function '{bad[0]}'"
+            elif unproven(name):
+                reasons[name] = 'parameter types not proven at every call'
+            else:
+                continue
+            del proven[name]
+            changed = True
+    return [n for n in funs if n not in reasons], reasons
+
+
+def statement_groups(ast, names):
+    """
+    Runs of top-level statements compiled as one function without
+    parameters (names: the compiled functions they may call).
+    Returns [(first index, end index, FunNode)].
+    """
+    stmts = ast.statements
+    funs = {s.name for s in stmts if isinstance(s, FunNode)}
+    bound = top_level_names(ast)
+    uses = [_touches(s) for s in stmts]
+
+    def groupable(s):
+        if not isinstance(s, GROUP_STMTS):
+            return False
+        for n in walk(s):
+            if isinstance(n, NOT_IN_GROUP):
+                return False
+            if isinstance(n, AssignNode) and not isinstance(n.name, str):
+                return False
+            if isinstance(n, IdentNode) and n.name == 'data':
+                return False
+            # stdin: bufor Pythona i bufor C nie wiedzą o sobie
+            if isinstance(n, CallNode) and isinstance(n.func, IdentNode):
+                if n.func.name == 'input' or (n.func.name in bound and n.func.name not in names):
+                    return False
+        return True
+
+    groups = []
+    i = 0
+    while i < len(stmts):
+        if not groupable(stmts[i]):
+            i += 1
+            continue
+        j = i
+        while j < len(stmts) and groupable(stmts[j]):
+            j += 1
+        outside = set()
+        for k, u in enumerate(uses):
+            if not i <= k < j: outside |= u
+        # cut the run where no variable reaches past the cut
+        last = {}
+        for k in range(i, j):
+            for name in uses[k]: last[name] = k
+        start, reach, segments = i, i, []
+        for k in range(i, j):
+            reach = max([k, reach] + [last[name] for name in uses[k]])
+            if reach == k:
+                segments.append((start, k + 1))
+                start = k + 1
+        # one group per segment: a segment C rejects stays interpreted alone
+        groups.extend((a, b) for a, b in segments
+                      if not set().union(*uses[a:b]) & (outside | funs)
+                      and any(isinstance(n, LOOPS) for s in stmts[a:b] for n in walk(s)))
+        i = j
+    return [(a, b, FunNode(f'kuda_stmts_{stmts[a].line}', [], stmts[a:b], stmts[a].line))
+            for a, b in groups]
+
+
+def _touches(s):
+    """Variable names a top-level statement reads or writes (not the functions it calls)."""
+    if isinstance(s, FunNode):
+        return free_names(s)
+    called = {id(n.func) for n in walk(s) if isinstance(n, CallNode)}
+    out = {n.name for n in walk(s) if isinstance(n, IdentNode) and id(n) not in called}
+    out |= bound_names(s)
+    if isinstance(s, (ModelNode, NetNode, NetLoadNode)):
+        out.add(s.name)
+    elif isinstance(s, UseNode) and s.alias:
+        out.add(s.alias)
+    return out
+
+
+def _with_groups(statements, groups):
+    """The statements with every group replaced by a call to it."""
+    out, k = [], 0
+    for a, b, fun in sorted(groups, key=lambda g: g[0]):
+        out.extend(statements[k:a])
+        out.append(CallNode(IdentNode(fun.name, fun.line), [], fun.line))
+        k = b
+    return out + statements[k:]
+
+
+class CFunction:
+    """A compiled Kuda function, callable like an interpreter builtin: f(args)."""
+
+    def __init__(self, lib, name, param_types, ret_type, node=None):
+        self.lib = lib
+        self.name = name
+        self.param_types = param_types
+        self.ret_type = ret_type
+        self.node = node          # FunNode: the interpreted definition
+        self.interpreter = None
+        self.fallback = None
+        c_name = 'kuda_main' if name == 'main' else name
+        self.fn = getattr(lib, c_name)
+        self.fn.argtypes = [self._ctype(t) for t in param_types]
+        # a returned string stays a raw pointer: copied first, then freed
+        self.fn.restype = ctypes.c_void_p if ret_type == 'str' else self._ctype(ret_type)
+
+    @staticmethod
+    def _ctype(t):
+        if t == 'str':  return ctypes.c_char_p
+        if t == 'list': return ctypes.POINTER(KList)
+        return ctypes.c_double
+
+    def bind(self, interpreter):
+        """Arguments that do not fit the marshaling run this interpreter's definition."""
+        self.interpreter = interpreter
+        if self.node is not None:
+            self.fallback = KudaFunction(self.node.name, self.node.params, self.node.body,
+                                         interpreter.global_env)
+
+    @staticmethod
+    def _fits(value, t):
+        # bool przechodzi jako liczba 1/0
+        if t == 'str':
+            return isinstance(value, str)
+        if t == 'list':
+            return isinstance(value, list) and all(isinstance(v, (int, float)) for v in value)
+        return isinstance(value, (int, float))
+
+    def _to_c(self, value, t):
+        if t == 'str':
+            return value.encode('utf-8')
+        if t == 'list':
+            l = self.lib.kuda_list_new()
+            for v in value:
+                self.lib.kuda_list_add(l, float(v))
+            return l
+        return float(value)
+
+    def _from_c(self, value, lists):
+        """Copy a result into Python and free its C memory (lists: the argument KLists)."""
+        if self.ret_type == 'str':
+            if not value: return ''
+            text = ctypes.string_at(value).decode('utf-8', errors='replace')
+            self.lib.kuda_lib_free(value)
+            return text
+        if self.ret_type == 'list':
+            if not value: return []
+            l = value.contents
+            out = [l.data[i] for i in range(l.len)]
+            # `give xs` returns the argument itself — freed with the arguments
+            if not any(ctypes.addressof(a.contents) == ctypes.addressof(l) for a in lists):
+                self.lib.kuda_list_free(value)
+            return out
+        return value
+
+    def __call__(self, args):
+        if len(args) != len(self.param_types) or not all(map(self._fits, args, self.param_types)):
+            if self.fallback is not None:
+                return self.interpreter._call_function(self.fallback, args)
+            if len(args) != len(self.param_types):
+                raise RuntimeError_(f"{self.name}() takes {len(self.param_types)} arguments, got {len(args)}")
+            raise RuntimeError_(f"{self.name}: arguments {args!r} do not fit {self.param_types}")
+        c_args, lists = [], []
+        try:
+            for a, t in zip(args, self.param_types):
+                c_args.append(self._to_c(a, t))
+                if t == 'list':
+                    lists.append(c_args[-1])
+            # both sides buffer stdout — flush around the call to keep out() in order
+            sys.stdout.flush()
+            result = self.fn(*c_args)
+            self.lib.kuda_lib_flush()
+            return self._from_c(result, lists)
+        finally:
+            for l in lists:
+                self.lib.kuda_list_free(l)
+
+    def __repr__(self):
+        return f'<kuda fun {self.name} (C)>'
+
+
+def build_library(ast, names, source_file):
+    """Compile the given functions into a shared library. Returns (path, CGenerator) or None."""
+    from codegen import CGenerator
+    gen = CGenerator()
+    try:
+        # generate() inlines use "file.kuda" into ast.statements — keep the caller's tree intact
+        c_code = gen.generate(ProgramNode(list(ast.statements)), source_file=source_file, library=set(names))
+    except Exception:
+        return None
+    c_file = tempfile.NamedTemporaryFile(suffix='.c', delete=False, mode='w', encoding='utf-8')
+    c_file.write(c_code)
+    c_file.close()
+    so_path = c_file.name[:-2] + '.so'
+    cmd = ['gcc', '-O2', '-shared', '-fPIC', '-Werror=implicit-function-declaration',
+           '-o', so_path, c_file.name]
+    src_dir = os.path.dirname(os.path.abspath(source_file))
+    for cf in gen.extra_c_files:
+        cmd.append(cf if os.path.isabs(cf) else os.path.join(src_dir, cf))
+    cmd += ['-lm'] + gen.link_flags
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    os.unlink(c_file.name)
+    if result.returncode != 0:
+        return None
+    return so_path, gen
+
+
+def load_mixed(ast, source_file):
+    """
+    Build the compiled part of a program. Returns (statements left for the
+    interpreter, {name: CFunction}) — or None when nothing can be compiled.
+    """
+    from codegen import CGenerator
+    probe = CGenerator()
+    try:
+        probe.generate(ProgramNode(list(ast.statements)), source_file=source_file, library=set())
+    except Exception:
+        return None
+    names, _ = partition(ast, probe)
+    groups = statement_groups(ast, names)
+    prog = ProgramNode(_with_groups(ast.statements, groups) + [g for _, _, g in groups])
+    todo = names + [g.name for _, _, g in groups]
+    built = build_library(prog, todo, source_file) if todo else None
+    if todo and built is None:
+        # leave the functions that break the build interpreted
+        ok = []
+        for n in todo:
+            one = build_library(prog, _with_callees(prog, n, todo), source_file)
+            if one:
+                os.unlink(one[0])
+                ok.append(n)
+        todo = [n for n in ok if set(_with_callees(prog, n, todo)) <= set(ok)]
+        built = build_library(prog, todo, source_file) if todo else None
+    if not built:
+        return None
+
+    so_path, gen = built
+    lib = ctypes.CDLL(so_path)
+    os.unlink(so_path)
+    lib.kuda_list_new.restype = ctypes.POINTER(KList)
+    lib.kuda_list_add.argtypes = [ctypes.POINTER(KList), ctypes.c_double]
+    lib.kuda_list_free.argtypes = [ctypes.POINTER(KList)]
+    lib.kuda_lib_free.argtypes = [ctypes.c_void_p]
+    lib.kuda_lib_init()
+    funcs = {}
+    for s in prog.statements:
+        if isinstance(s, FunNode) and s.name in todo:
+            funcs[s.name] = CFunction(lib, s.name, _param_types(gen, s),
+                                      gen.func_return_types.get(s.name, 'double'), s)
+    rest = _with_groups(ast.statements, [g for g in groups if g[2].name in funcs])
+    rest = [s for s in rest if not (isinstance(s, FunNode) and s.name in funcs)]
+    return rest, funcs
+
+
+def _with_callees(ast, name, names):
+    """name plus the compiled functions it calls, directly or not."""
+    funs = {s.name: s for s in ast.statements if isinstance(s, FunNode)}
+    out, todo = [], [name]
+    while todo:
+        n = todo.pop()
+        if n in out: continue
+        out.append(n)
+        todo.extend(c.func.name for c in walk(funs[n])
+                    if isinstance(c, CallNode) and isinstance(c.func, IdentNode)
+                    and c.func.name in names)
+    return out
@@ -6,14 +6,31 @@ Handles NetNode -> C code generation, separated from main codegen.
 import math
 import random as _random
 
+import numpy as np
 
-def gen_net_c(node, interp_eval_fn):
+from netengine import DTYPES, OPTIMIZERS, SCHEDULES, loss_output
+from netfile import ACTS, OPTS, is_kw
+from parser import IdentNode
+
+# Datasets with more values than this (inputs + targets) are not written as
+# array literals but into a binary file that the assembler links in (.incbin).
+INLINE_DATA_MAX = 16384
+
+
+def gen_net_c(node, interp_eval_fn, data_fill=None, blob_path=None, quantize=False):
     """
     Generate C code for a net block.
 
     Args:
         node: NetNode from parser
         interp_eval_fn: function(val_node) -> Python value, from interpreter
+        data_fill: optional dict for a dataset built at runtime instead of
+            baked into the source — n_samples, n_inputs, n_outputs and
+            fill (C statements writing {name}_data_in / {name}_data_tgt)
+        blob_path: where to write a dataset above INLINE_DATA_MAX as raw
+            float64; None keeps every dataset inline
+        quantize: emit the int8 path (gen_quantize_c), only when the
+            program calls net.quantize()
 
     Returns:
         (lines: list[str], info: dict)
@@ -22,10 +39,14 @@ def gen_net_c(node, interp_eval_fn):
     # Step 1: evaluate params
     params = {}
     for key, val_node in node.params.items():
+        if key == 'data' and data_fill:
+            continue
         try:
             params[key] = interp_eval_fn(val_node)
         except Exception:
-            params[key] = None
+            # ~opt = adamw, ~dtype = f32, ~loss = bce, ~schedule = cosine: keep the bare name
+            params[key] = (val_node.name if key in ('opt', 'dtype', 'loss', 'schedule')
+                           and isinstance(val_node, IdentNode) else None)
 
     # Step 2: get dataset
     raw_data = params.get('data') or []
@@ -42,6 +63,9 @@ def gen_net_c(node, interp_eval_fn):
 
     n_inputs  = len(dataset[0][0]) if dataset else 1
     n_outputs = len(dataset[0][1]) if dataset else 1
+    if data_fill:
+        n_inputs  = data_fill['n_inputs']
+        n_outputs = data_fill['n_outputs']
 
     # Step 3: resolve layers
     layers_raw = params.get('layers', [n_inputs, 8, n_outputs])
@@ -53,10 +77,10 @@ def gen_net_c(node, interp_eval_fn):
             layers.append(int(l))
     # Only auto-fix layer[0] if we actually have dataset info
     # If dataset is empty (runtime inputs), trust the explicit layers value
-    if dataset and layers[0] != n_inputs:
+    if (dataset or data_fill) and layers[0] != n_inputs:
         layers[0] = n_inputs
     # Update n_inputs/n_outputs from layers when dataset unavailable
-    if not dataset:
+    if not dataset and not data_fill:
         n_inputs  = layers[0]
         n_outputs = layers[-1]
 
@@ -64,14 +88,47 @@ def gen_net_c(node, interp_eval_fn):
     lr        = float(params.get('lr', 0.01))
     epochs    = int(params.get('epochs', 1000))
     act_name  = params.get('act', 'tanh')
-    out_name  = params.get('act_out', act_name)
+    try:
+        # ~loss = bce / crossent: sigmoid / softmax output, output delta a - y
+        loss, out_name = loss_output(params.get('loss'), params.get('act_out'))
+    except ValueError as e:
+        raise ValueError(f"net {node.name}: {e}")
+    out_name  = out_name or act_name
     init_name = params.get('init', 'xav')
+    pack      = int(params.get('pack') or 0)
+    opt_name  = params.get('opt') or 'sgd'
+    if opt_name not in OPTIMIZERS:
+        raise ValueError(f"net {node.name}: unknown ~opt '{opt_name}' (use {', '.join(OPTIMIZERS)})")
+    beta1     = float(params.get('beta1', 0.9))
+    beta2     = float(params.get('beta2') or (0.9 if opt_name == 'rmsprop' else 0.999))
+    eps       = float(params.get('eps', 1e-8))
+    threads   = int(params.get('threads') or 0)      # 0: KUDA_THREADS at run time
+    hogwild   = bool(params.get('hogwild'))
     log_every = int(params.get('log', 100))
     # ~verbose = False silences training output (overrides ~log)
     verbose = params.get('verbose', True)
     if verbose is False or verbose == 0:
         log_every = 0
     stop_loss = float(params.get('stop', -1.0))
+    metrics   = params.get('metrics') if isinstance(params.get('metrics'), str) else None
+    # ~checkpoint = "run.kw": resume from it, save every ~checkpoint_every epochs and on Ctrl-C
+    ckpt      = params.get('checkpoint') if isinstance(params.get('checkpoint'), str) else None
+    ckpt_every = max(1, int(params.get('checkpoint_every') or 100))
+    warm      = params.get('from') if isinstance(params.get('from'), str) else None
+    # ~schedule: lr once per epoch at the top of the epoch loop, nothing per sample
+    schedule  = params.get('schedule')
+    if schedule is not None and schedule not in SCHEDULES:
+        raise ValueError(f"net {node.name}: unknown ~schedule '{schedule}' (use {', '.join(SCHEDULES)})")
+    decay     = float(params.get('decay') or SCHEDULES.get(schedule) or 1.0)
+    warmup    = int(params.get('warmup') or 0)
+    every     = max(1, int(params.get('decay_every') or epochs // 4))
+    patience  = int(params.get('patience') or (10 if schedule == 'plateau' else 0))
+    dtype     = params.get('dtype') or 'f64'
+    if dtype not in DTYPES:
+        raise ValueError(f"net {node.name}: unknown ~dtype '{dtype}' (use {', '.join(DTYPES)})")
+    # ~dtype = f32: weights, optimizer state, activations and deltas as float
+    # (tanhf, expf); the dataset, loss sums and predict() I/O stay double
+    R = 'float' if dtype == 'f32' else 'double'
 
     name     = node.name
     n_layers = len(layers)
@@ -90,7 +147,7 @@ def gen_net_c(node, interp_eval_fn):
     flat_b = [b for layer in all_biases  for b in layer]
 
     # Step 6: flatten dataset
-    n_samples = len(dataset)
+    n_samples = data_fill['n_samples'] if data_fill else len(dataset)
     inp_flat  = [x for inp, _ in dataset for x in inp]
     tgt_flat  = [x for _, tgt in dataset for x in tgt]
 
@@ -114,6 +171,14 @@ def gen_net_c(node, interp_eval_fn):
     af_d = act_d_c.get(act_name, 'kuda_tanh_d')
     of   = act_c.get(out_name,  af)
     of_d = act_d_c.get(out_name, af_d)
+    # softmax: linear outputs, then one pass over the whole layer (gen_softmax_c)
+    soft = out_name == 'softmax'
+    if soft:
+        of = 'kuda_linear_act'
+    if loss != 'mse':
+        of_d = 'kuda_linear_d'
+    if R == 'float':
+        af, af_d, of, of_d = (f + 'f' for f in (af, af_d, of, of_d))
 
     NAME = name.upper()
     max_layer = max(layers)
@@ -121,63 +186,89 @@ def gen_net_c(node, interp_eval_fn):
     layer_str = ', '.join(str(l) for l in layers)
     w_str   = ', '.join(f'{w:.10f}' for w in flat_w)
     b_str   = ', '.join(f'{b:.10f}' for b in flat_b)
-    inp_str = ', '.join(f'{x:.6f}'  for x in inp_flat)
-    tgt_str = ', '.join(f'{x:.6f}'  for x in tgt_flat)
+    blob = blob_path and not data_fill and len(inp_flat) + len(tgt_flat) > INLINE_DATA_MAX
+    if blob:
+        np.asarray(inp_flat + tgt_flat, dtype='<f8').tofile(blob_path)
+        inp_str = tgt_str = ''
+    else:
+        inp_str = ', '.join(f'{float(x)!r}' for x in inp_flat)
+        tgt_str = ', '.join(f'{float(x)!r}' for x in tgt_flat)
 
     L = []  # output lines
 
     L.append(f'/* === Net: {name} === */')
     L.append(f'static int    {name}_layers[]   = {{{layer_str}}};')
     L.append(f'static int    {name}_n_layers   = {n_layers};')
-    L.append(f'static double {name}_W[]        = {{{w_str}}};')
-    L.append(f'static double {name}_B[]        = {{{b_str}}};')
-    L.append(f'static double {name}_data_in[]  = {{{inp_str}}};')
-    L.append(f'static double {name}_data_tgt[] = {{{tgt_str}}};')
+    L.append(f'static {R:6} {name}_W[]        = {{{w_str}}};')
+    L.append(f'static {R:6} {name}_B[]        = {{{b_str}}};')
+    # ~opt: stan optymalizatora obok wag (m — prędkość / 1. moment, v — 2. moment)
+    for key in OPTIMIZERS[opt_name]:
+        L.append(f'static {R:6} {name}_{key}W[{len(flat_w)}];')
+        L.append(f'static {R:6} {name}_{key}B[{len(flat_b)}];')
+    if opt_name != 'sgd':
+        L.append(f'static long   {name}_opt_t      = 0;')
+    if data_fill:
+        L.append(f'static double* {name}_data_in  = NULL;')
+        L.append(f'static double* {name}_data_tgt = NULL;')
+    elif blob:
+        L.extend(gen_data_blob_c(name, blob_path, len(inp_flat)))
+    else:
+        L.append(f'static double {name}_data_in[]  = {{{inp_str}}};')
+        L.append(f'static double {name}_data_tgt[] = {{{tgt_str}}};')
     L.append(f'static int    {name}_n_samples  = {n_samples};')
     L.append(f'static int    {name}_n_inputs   = {n_inputs};')
     L.append(f'static int    {name}_n_outputs  = {n_outputs};')
+    L.append(f'static double {name}_stats[6]; /* net.stats(), order: netengine.STATS */')
+    if metrics:
+        L.append(f'static double {name}_gnorm = 0.0; /* ~metrics: sum of step gradient norms */')
+        L.append(f'static long   {name}_gsteps = 0;')
     L.append('')
 
-    # per-net activation wrappers
-    L.append(f'static double {name}_act_fn(double x, int is_last) {{')
-    if af == of:
-        L.append(f'    (void)is_last; return {af}(x);')
-    else:
-        L.append(f'    return is_last ? {of}(x) : {af}(x);')
-    L.append('}')
-
-    L.append(f'static double {name}_act_d_fn(double x, int is_last) {{')
-    if af_d == of_d:
-        L.append(f'    (void)is_last; return {af_d}(x);')
-    else:
-        L.append(f'    return is_last ? {of_d}(x) : {af_d}(x);')
-    L.append('}')
-    L.append('')
+    if data_fill:
+        # DataBuilder dataset generated on first training, not stored in the source
+        L.append(f'static void {name}_data_init(void) {{')
+        L.append(f'    if({name}_data_in) return;')
+        L.append(f'    {name}_data_in  = malloc(sizeof(double) * {n_samples} * {n_inputs});')
+        L.append(f'    {name}_data_tgt = malloc(sizeof(double) * {n_samples} * {n_outputs});')
+        for line in data_fill['fill']:
+            L.append(f'    {line}')
+        L.append(f'}}')
+        L.append('')
 
     L.append(f'#define {NAME}_MAX_LAYER {max_layer}')
     L.append(f'#define {NAME}_N_LAYERS  {n_layers}')
     L.append('')
 
+    # Layer sizes are fixed here, so every loop below is emitted per layer with
+    # constant bounds and W / B offsets (no offset sums, no is_last dispatch).
+    plan = _layer_plan(layers)
+    fns  = (af, af_d, of, of_d)
+
     # forward pass
-    L.append(f'static void {name}_forward(double* input, double acts[][{NAME}_MAX_LAYER]) {{')
-    L.append(f'    for(int j=0; j<{name}_layers[0]; j++) acts[0][j] = input[j];')
-    L.append(f'    int w_off=0, b_off=0;')
-    L.append(f'    for(int li=0; li<{name}_n_layers-1; li++) {{')
-    L.append(f'        int ni={name}_layers[li], no={name}_layers[li+1];')
-    L.append(f'        int is_last = (li == {name}_n_layers-2);')
-    L.append(f'        for(int j=0; j<no; j++) {{')
-    L.append(f'            double z = {name}_B[b_off+j];')
-    L.append(f'            for(int k=0; k<ni; k++) z += acts[li][k] * {name}_W[w_off + j*ni + k];')
-    L.append(f'            acts[li+1][j] = {name}_act_fn(z, is_last);')
-    L.append(f'        }}')
-    L.append(f'        w_off += ni*no; b_off += no;')
-    L.append(f'    }}')
+    L.append(f'static void {name}_forward(double* input, {R} acts[][{NAME}_MAX_LAYER]) {{')
+    L.append(f'    for(int j=0; j<{layers[0]}; j++) acts[0][j] = input[j];')
+    for li, cur, nxt, wo, bo in plan:
+        f = of if li == n_layers - 2 else af
+        L.append(f'    /* layer {li}: {cur} -> {nxt}, W[{wo}..], B[{bo}..] */')
+        L.append(f'    for(int j=0; j<{nxt}; j++) {{')
+        L.append(f'        const {R}* w = {name}_W + {wo} + j*{cur};')
+        L.append(f'        {R} z = {name}_B[{bo}+j];')
+        L.append(f'        for(int k=0; k<{cur}; k++) z += acts[{li}][k] * w[k];')
+        L.append(f'        acts[{li+1}][j] = {f}(z);')
+        L.append(f'    }}')
+    if soft:
+        L.extend(gen_softmax_c(f'acts[{n_layers-1}][{{j}}]', layers[-1], R, 4))
     L.append(f'}}')
     L.append('')
 
+    if quantize:
+        L.extend(gen_quantize_c(name, layers, fns, R, soft))
+
     # predict — fills output array, returns first value for single-output compat
     L.append(f'static void {name}_predict_all(double* input, double* out_arr) {{')
-    L.append(f'    double acts[{NAME}_N_LAYERS][{NAME}_MAX_LAYER];')
+    if quantize:
+        L.append(f'    if({name}_q_on) {{ {name}_forward_q(input, out_arr); return; }}')
+    L.append(f'    {R} acts[{NAME}_N_LAYERS][{NAME}_MAX_LAYER];')
     L.append(f'    {name}_forward(input, acts);')
     L.append(f'    int last = {name}_n_layers-1;')
     L.append(f'    for(int j=0; j<{name}_layers[last]; j++) out_arr[j] = acts[last][j];')
@@ -189,52 +280,95 @@ def gen_net_c(node, interp_eval_fn):
     L.append(f'}}')
     L.append('')
 
-    # train
+    L.extend(gen_threads_c(name, threads))
+    L.extend(gen_predict_batch_c(name, NAME, layers, fns, R, soft, quantize))
+
+    # train — ~pack, ~hogwild and every ~opt other than sgd go through the batched step
+    batched = pack > 1 or opt_name != 'sgd' or hogwild
+    if batched:
+        pack = max(pack, 1)
+        update = _gen_opt_update(name, opt_name, len(flat_w), len(flat_b), beta1, beta2, eps, R)
+        if metrics:
+            update = _gen_grad_norm(name, len(flat_w), len(flat_b)) + update
+        L.extend(_gen_pack_step(name, NAME, min(pack, n_samples) if n_samples else pack,
+                                len(flat_w), len(flat_b), update, threads, hogwild, plan, fns, R,
+                                soft, loss))
+    if ckpt or warm:
+        L.extend(gen_checkpoint_c(name, layers, act_name, out_name, opt_name, R, ckpt, warm))
     L.append(f'static void {name}_train() {{')
+    if data_fill:
+        L.append(f'    {name}_data_init();')
     L.append(f'    const int epochs    = {epochs};')
-    L.append(f'    const double lr     = {lr};')
+    if schedule or warmup or patience:
+        L.append(f'    const double lr0    = {lr};')
+        L.append(f'    double lr = lr0, base = lr0; /* base: ~lr after plateau cuts */')
+    else:
+        L.append(f'    const double lr     = {lr};')
+    if patience:
+        L.append(f'    double best = HUGE_VAL; int wait = 0;')
     L.append(f'    const double stop   = {stop_loss};')
     L.append(f'    const int log_every = {log_every};')
     L.append(f'    const int n  = {name}_n_samples;')
     L.append(f'    const int ni = {name}_n_inputs;')
     L.append(f'    const int no = {name}_n_outputs;')
-    L.append(f'    double acts  [{NAME}_N_LAYERS][{NAME}_MAX_LAYER];')
-    L.append(f'    double deltas[{NAME}_N_LAYERS][{NAME}_MAX_LAYER];')
-    L.append(f'    for(int ep=0; ep<epochs; ep++) {{')
+    L.append(f'    {R} acts  [{NAME}_N_LAYERS][{NAME}_MAX_LAYER];')
+    L.append(f'    {R} deltas[{NAME}_N_LAYERS][{NAME}_MAX_LAYER];')
+    if batched:
+        L.append(f'    (void)ni; (void)no; (void)acts; (void)deltas;')
+        L.append(f'    const int nt = {name}_threads();')
+    L.append(f'    {name}_stats[5] = lr;')
+    ep0 = '0'
+    if ckpt:
+        ep0 = 'ep0'
+        L.append(f'    int ep0 = {name}_ckpt_load();')
+        L.append(f'    if(ep0 > epochs) ep0 = epochs;')
+        if warm:
+            L.append(f'    if(ep0 == 0) {name}_from();')
+        if log_every > 0:
+            L.append(f'    if(ep0 > 0) printf("net {name}: wznowiono z %s, epoka %d\\n", "{_c_str(ckpt)}", ep0);')
+        L.append(f'    {name}_stats[0] = ep0;')
+        L.append(f'    signal(SIGINT, {name}_on_sigint);')
+    elif warm:
+        L.append(f'    {name}_from();')
+    if metrics:
+        path = _c_str(metrics)
+        L.append(f'    /* ~metrics: one JSON line per epoch, through a 64 KB stdio buffer */')
+        mode = 'ep0 ? "a" : "w"' if ckpt else '"w"'   # wznowiony trening dopisuje
+        L.append(f'    FILE* mf = fopen("{path}", {mode});')
+        L.append(f'    if(mf) setvbuf(mf, NULL, _IOFBF, 1 << 16);')
+        L.append(f'    else printf("net {name}: nie mozna otworzyc ~metrics %s\\n", "{path}");')
+    L.append(f'    const double t_start = kuda_wall();')
+    L.append(f'    for(int ep={ep0}; ep<epochs; ep++) {{')
+    if schedule or warmup or patience:
+        L.append(f'        lr = {_schedule_c(schedule, decay, warmup, every, epochs)};')
     L.append(f'        double total_loss = 0.0;')
-    L.append(f'        for(int s=0; s<n; s++) {{')
-    L.append(f'            double* inp = {name}_data_in  + s*ni;')
-    L.append(f'            double* tgt = {name}_data_tgt + s*no;')
-    L.append(f'            {name}_forward(inp, acts);')
-    L.append(f'            int last = {name}_n_layers-1;')
-    L.append(f'            for(int j=0; j<{name}_layers[last]; j++)')
-    L.append(f'                deltas[last][j] = (acts[last][j]-tgt[j]) * {name}_act_d_fn(acts[last][j],1);')
-    L.append(f'            for(int j=0; j<no; j++)')
-    L.append(f'                total_loss += (acts[last][j]-tgt[j])*(acts[last][j]-tgt[j]);')
-    L.append(f'            /* hidden deltas — compute weight offset for layer li->li+1 on the fly */')
-    L.append(f'            for(int li={name}_n_layers-2; li>0; li--) {{')
-    L.append(f'                int cur={name}_layers[li], nxt={name}_layers[li+1];')
-    L.append(f'                int wo=0;')
-    L.append(f'                for(int _l=0; _l<li; _l++) wo += {name}_layers[_l]*{name}_layers[_l+1];')
-    L.append(f'                for(int j=0; j<cur; j++) {{')
-    L.append(f'                    double err=0;')
-    L.append(f'                    for(int k=0; k<nxt; k++) err += deltas[li+1][k] * {name}_W[wo + k*cur + j];')
-    L.append(f'                    deltas[li][j] = err * {name}_act_d_fn(acts[li][j], 0);')
-    L.append(f'                }}')
-    L.append(f'            }}')
-    L.append(f'            /* weight update */')
-    L.append(f'            int w_off=0, b_off=0;')
-    L.append(f'            for(int li=0; li<{name}_n_layers-1; li++) {{')
-    L.append(f'                int cur={name}_layers[li], nxt={name}_layers[li+1];')
-    L.append(f'                for(int j=0; j<nxt; j++) {{')
-    L.append(f'                    {name}_B[b_off+j] -= lr * deltas[li+1][j];')
-    L.append(f'                    for(int k=0; k<cur; k++)')
-    L.append(f'                        {name}_W[w_off + j*cur + k] -= lr * deltas[li+1][j] * acts[li][k];')
-    L.append(f'                }}')
-    L.append(f'                w_off += cur*nxt; b_off += nxt;')
-    L.append(f'            }}')
-    L.append(f'        }}')
+    if metrics:
+        L.append(f'        const double t_ep = kuda_wall();')
+        L.append(f'        {name}_gnorm = 0.0; {name}_gsteps = 0;')
+    if hogwild:
+        L.append(f'        total_loss = {name}_hogwild_epoch(n, lr, nt);')
+    elif batched:
+        # ~pack: jeden uśredniony krok na paczkę
+        L.append(f'        for(int s=0; s<n; s+={NAME}_PACK) {{')
+        L.append(f'            int bs = n - s < {NAME}_PACK ? n - s : {NAME}_PACK;')
+        L.append(f'            total_loss += nt > 1 ? {name}_pack_step_mt(s, bs, lr, nt)')
+        L.append(f'                                 : {name}_pack_step(s, bs, lr);')
+        L.append(f'        }}')
+    else:
+        L.extend(_gen_sample_step(name, plan, fns, R, metrics, loss))
     L.append(f'        double avg_loss = total_loss / n;')
+    L.append(f'        {name}_stats[0] = ep + 1;')
+    L.append(f'        {name}_stats[3] = avg_loss;')
+    if metrics:
+        L.append(f'        {name}_stats[4] = {name}_gsteps ? {name}_gnorm / {name}_gsteps : 0.0;')
+    L.append(f'        {name}_stats[5] = lr;')
+    if metrics:
+        L.append(f'        if(mf) {{')
+        L.append(f'            double dt = kuda_wall() - t_ep;')
+        L.append(f'            fprintf(mf, "{{\\"epoch\\": %d, \\"time\\": %.9g, \\"samples_per_sec\\": %.9g, '
+                 f'\\"loss\\": %.17g, \\"grad_norm\\": %.17g, \\"lr\\": %.15g}}\\n",')
+        L.append(f'                    ep, dt, dt > 0 ? n / dt : 0.0, avg_loss, {name}_stats[4], lr);')
+        L.append(f'        }}')
     if log_every > 0:
         L.append(f'        if(ep % {log_every} == 0)')
         L.append(f'            printf("Epoch %d | Loss: %.6f\\n", ep, avg_loss);')
@@ -243,7 +377,39 @@ def gen_net_c(node, interp_eval_fn):
         L.append(f'            printf("Early stop epoch %d | Loss: %.6f\\n", ep, avg_loss);')
     L.append(f'            break;')
     L.append(f'        }}')
+    if patience:
+        # plateau: ~patience epochs without a better loss cut lr, or end training
+        L.append(f'        if(avg_loss < best * (1.0 - 1e-4)) {{ best = avg_loss; wait = 0; }}')
+        L.append(f'        else wait++;')
+        L.append(f'        if(wait >= {patience}) {{')
+        L.append(f'            wait = 0;')
+        if schedule == 'plateau':
+            L.append(f'            if(base * {decay!r} >= lr0 * 1e-3) base *= {decay!r};')
+            L.append(f'            else {{')
+        else:
+            L.append(f'            {{')
+        if log_every > 0:
+            L.append(f'                printf("Plateau stop epoch %d | Loss: %.6f\\n", ep, avg_loss);')
+        L.append(f'                break;')
+        L.append(f'            }}')
+        L.append(f'        }}')
+    if ckpt:
+        L.append(f'        if({name}_sigint || (ep+1) % {ckpt_every} == 0) {name}_ckpt_save(ep+1);')
+        L.append(f'        if({name}_sigint) {{')
+        L.append(f'            printf("net {name}: przerwano po epoce %d, checkpoint zapisany do %s\\n", ep, "{_c_str(ckpt)}");')
+        if metrics:
+            L.append(f'            if(mf) fclose(mf);')
+        L.append(f'            exit(130);')
+        L.append(f'        }}')
     L.append(f'    }}')
+    if ckpt:
+        # trening skończony (także przez ~stop): kolejne uruchomienie go pomija
+        L.append(f'    if({name}_stats[0] > ep0) {name}_ckpt_save(epochs);')
+        L.append(f'    signal(SIGINT, SIG_DFL);')
+    L.append(f'    {name}_stats[1] = kuda_wall() - t_start;')
+    L.append(f'    {name}_stats[2] = {name}_stats[1] > 0 ? ({name}_stats[0] - {ep0}) * n / {name}_stats[1] : 0.0;')
+    if metrics:
+        L.append(f'    if(mf) fclose(mf);')
     L.append(f'}}')
     L.append('')
 
@@ -251,5 +417,612 @@ def gen_net_c(node, interp_eval_fn):
         'layers':   layers,
         'n_inputs': n_inputs,
         'n_outputs': n_outputs,
+        'opt':      opt_name,
+        'act':      act_name,
+        'act_out':  out_name,
+        'loss':     loss,
+        'dtype':    dtype,
+        'threads':  True,
+        'signals':  bool(ckpt),
+        'quantize': quantize,
     }
-    return L, info
\ No newline at end of file
+    return L, info
+
+
+def _schedule_c(schedule, decay, warmup, every, epochs):
+    """C expression of netengine.schedule_lr for epoch ep, from base."""
+    t = f'(ep - {warmup})' if warmup else 'ep'
+    if schedule == 'step':
+        expr = f'base * pow({decay!r}, {t} / {every})'
+    elif schedule == 'exp':
+        expr = f'base * pow({decay!r}, {t})'
+    elif schedule == 'cosine':
+        expr = f'base * 0.5 * (1.0 + cos(3.14159265358979323846 * {t} / {max(1, epochs - warmup)}))'
+    else:
+        expr = 'base'
+    if warmup:
+        expr = f'ep < {warmup} ? base * (ep + 1) / {warmup} : {expr}'
+    return expr
+
+
+def _c_str(text):
+    """text as the inside of a C string literal."""
+    return text.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def gen_checkpoint_c(name, layers, act, act_out, opt, R, ckpt, warm):
+    """
+    ~checkpoint / ~from support for {name}_train. W, B and the ~opt state
+    move as whole arrays through the .kw runtime ({name}_io_a / _io_n).
+    {name}_ckpt_save writes the checkpoint to path.tmp with the epochs
+    done and the last epoch's loss, grad_norm and lr ({name}_stats) in the
+    tail (netfile.py) and renames it over the old one; {name}_ckpt_load
+    puts those back into {name}_stats and returns the epochs (0: no
+    checkpoint yet).
+    {name}_from reads net.write() weights, JSON or .kw. Training here
+    draws no random numbers, so the checkpoint's RNG state is empty.
+    """
+    keys = [k + p for k in OPTIMIZERS[opt] for p in 'WB']
+    n_w = sum(a * b for a, b in zip(layers, layers[1:]))
+    n_b = sum(layers[1:])
+    arrs = [f'{name}_W', f'{name}_B'] + [f'{name}_{k}' for k in keys]
+    lens = [n_w, n_b] + [n_w if k[1] == 'W' else n_b for k in keys]
+    na, nl, ds = len(arrs), len(layers), 4 if R == 'float' else 8
+    opt_i = OPTS.index(opt)
+    acts = ', '.join(str(ACTS.index(a) if a in ACTS else 0) for a in (act, act_out))
+    opt_t = (f'{name}_opt_t', f'&{name}_opt_t') if opt != 'sgd' else ('0', 'NULL')
+    L = []
+    L.append(f'static void* {name}_io_a[] = {{{", ".join(arrs)}}};')
+    L.append(f'static int   {name}_io_n[] = {{{", ".join(str(n) for n in lens)}}};')
+    if ckpt:
+        q = _c_str(ckpt)
+        L.append(f'/* ~checkpoint: first Ctrl-C finishes the epoch, saves and exits; a second one kills */')
+        L.append(f'static volatile sig_atomic_t {name}_sigint = 0;')
+        L.append(f'static void {name}_on_sigint(int sig) {{ (void)sig; {name}_sigint = 1; signal(SIGINT, SIG_DFL); }}')
+        L.append(f'static void {name}_ckpt_save(int64_t epoch) {{')
+        L.append(f'    unsigned char tail[48]; double g = NAN; uint32_t nr = 0;')
+        L.append(f'    memcpy(tail, "KUCP", 4); memcpy(tail + 4, &epoch, 8);')
+        L.append(f'    memcpy(tail + 12, {name}_stats + 3, 24); /* loss, grad_norm, lr */')
+        L.append(f'    memcpy(tail + 36, &g, 8); memcpy(tail + 44, &nr, 4);')
+        L.append(f'    if(!kuda_kw_write("{q}.tmp", {name}_layers, {nl}, {acts}, {opt_i}, {opt_t[0]}, {ds},')
+        L.append(f'                      {name}_io_a, {name}_io_n, {na}, tail, 48) || rename("{q}.tmp", "{q}") != 0)')
+        L.append(f'        printf("net {name}: nie mozna zapisac checkpointu %s\\n", "{q}");')
+        L.append(f'}}')
+        L.append(f'static int {name}_ckpt_load(void) {{')
+        L.append(f'    unsigned char tail[48]; int64_t epoch;')
+        L.append(f'    int r = kuda_kw_read("{q}", {name}_layers, {nl}, {opt_i}, {opt_t[1]}, {ds},')
+        L.append(f'                         {name}_io_a, {name}_io_n, {na}, tail, 48);')
+        L.append(f'    if(r < 0) return 0;')
+        L.append(f'    if(r == 0 || memcmp(tail, "KUCP", 4)) {{')
+        L.append(f'        printf("net {name}: %s nie jest checkpointem tego netu\\n", "{q}");')
+        L.append(f'        exit(1);')
+        L.append(f'    }}')
+        L.append(f'    memcpy(&epoch, tail + 4, 8);')
+        L.append(f'    memcpy({name}_stats + 3, tail + 12, 24); /* stats() even if no epoch is left */')
+        L.append(f'    return (int)epoch;')
+        L.append(f'}}')
+    if warm:
+        q = _c_str(warm)
+        L.append(f'/* ~from: net.write() weights (and ~opt state, if it is the same ~opt) instead of random ones */')
+        L.append(f'static void {name}_from(void) {{')
+        if is_kw(warm):
+            L.append(f'    int r = kuda_kw_read("{q}", {name}_layers, {nl}, {opt_i}, {opt_t[1]}, {ds},')
+            L.append(f'                         {name}_io_a, {name}_io_n, {na}, NULL, 0);')
+            L.append(f'    if(r < 0) printf("net {name}: nie mozna otworzyc %s\\n", "{q}");')
+            L.append(f'    if(r <= 0) exit(1);')
+        else:
+            json_keys = ', '.join(f'"{k}"' for k in ['W', 'B'] + keys)
+            L.append(f'    FILE* f = fopen("{q}", "r");')
+            L.append(f'    if(!f) {{ printf("net {name}: nie mozna otworzyc %s\\n", "{q}"); exit(1); }}')
+            L.append(f'    double ly[{nl}]; int bad = kuda_json_doubles(f, "layers", ly, {nl}) != {nl};')
+            L.append(f'    for(int i=0; i<{nl} && !bad; i++) bad = (int)ly[i] != {name}_layers[i];')
+            L.append(f'    if(bad) {{ printf("net {name}: %s: inne rozmiary warstw\\n", "{q}"); exit(1); }}')
+            L.append(f'    char opt[16] = "";')
+            L.append(f'    kuda_json_str(f, "opt", opt, sizeof opt);')
+            L.append(f'    const char* keys[] = {{{json_keys}}};')
+            L.append(f'    int na = strcmp(opt, "{opt}") ? 2 : {na};')
+            L.append(f'    double* v = malloc(sizeof(double) * {max(n_w, n_b)});')
+            L.append(f'    for(int i=0; i<na; i++) {{')
+            L.append(f'        if(kuda_json_doubles(f, keys[i], v, {name}_io_n[i]) != {name}_io_n[i]) {{')
+            L.append(f'            printf("net {name}: %s: brak \\"%s\\"\\n", "{q}", keys[i]);')
+            L.append(f'            exit(1);')
+            L.append(f'        }}')
+            L.append(f'        for(int k=0; k<{name}_io_n[i]; k++) (({R}*){name}_io_a[i])[k] = ({R})v[k];')
+            L.append(f'    }}')
+            if opt != 'sgd':
+                L.append(f'    if(na > 2 && kuda_json_doubles(f, "opt_t", v, 1) == 1) {name}_opt_t = (long)v[0];')
+            L.append(f'    free(v);')
+            L.append(f'    fclose(f);')
+        L.append(f'}}')
+    L.append('')
+    return L
+
+
+def gen_data_blob_c(name, path, n_in_values):
+    """
+    {name}_data_in / {name}_data_tgt pointing into the file at path (raw
+    float64: inputs, then targets), which the assembler embeds in the binary.
+    gcc never parses the samples, so build time does not grow with them.
+    """
+    def quote(text):
+        return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+    sym = f'kuda_{name}_data_blob'
+    # ścieżka w cudzysłowie dla asemblera, a cała dyrektywa w literale C
+    inc = quote(f'.incbin {quote(path)}')[1:-1]
+    return [
+        f'/* {name}: dataset in {path}, linked in with .incbin */',
+        '#ifdef __APPLE__',
+        f'__asm__(".const_data\\n.globl _{sym}\\n.p2align 3\\n_{sym}:\\n{inc}\\n.text");',
+        '#else',
+        f'__asm__(".pushsection .rodata\\n.globl {sym}\\n.balign 8\\n{sym}:\\n{inc}\\n.popsection");',
+        '#endif',
+        f'extern const double {sym}[];',
+        f'static double* {name}_data_in  = (double*){sym};',
+        f'static double* {name}_data_tgt = (double*){sym} + {n_in_values};',
+    ]
+
+
+def gen_threads_c(name, threads=0):
+    """{name}_threads(): ~threads, or KUDA_THREADS read at run time (default 1)."""
+    return [
+        '#ifdef _OPENMP',
+        '#include <omp.h>',
+        '#endif',
+        f'static int {name}_threads(void) {{',
+        f'    int nt = {threads};',
+        f'    if(nt <= 0) {{ const char* e = getenv("KUDA_THREADS"); nt = e ? atoi(e) : 1; }}',
+        f'    return nt < 1 ? 1 : nt;',
+        f'}}',
+        '',
+    ]
+
+
+def gen_quantize_c(name, layers, fns, R='double', soft=False):
+    """
+    net.quantize(): {name}_quantize_w() makes int8 copies of the weights,
+    one scale per layer (max |w| -> 127), and turns {name}_q_on on.
+    {name}_forward_q is the forward pass over them: each layer's input is
+    quantized with its own scale, the dot products run int8 x int8 into
+    an int32, and one multiply by both scales brings z back to float for
+    the bias and the activation. soft: softmax over the output layer.
+    """
+    af, _, of, _ = fns
+    if R != 'float':
+        af, of = af + 'f', of + 'f'
+    plan = _layer_plan(layers)
+    n_w, widest = sum(cur * nxt for _, cur, nxt, _, _ in plan), max(layers)
+    L = []
+    L.append(f'/* net.quantize(): int8 weights, one scale per layer */')
+    L.append(f'static int8_t {name}_Wq[{n_w}];')
+    L.append(f'static float  {name}_Wq_s[{len(plan)}];')
+    L.append(f'static int    {name}_q_on = 0;')
+    L.append(f'static void {name}_quantize_w(void) {{')
+    for li, cur, nxt, wo, bo in plan:
+        end = wo + cur * nxt
+        L.append(f'    {{ /* layer {li}: W[{wo}..{end}) */')
+        L.append(f'        float m = 0.0f;')
+        L.append(f'        for(int i={wo}; i<{end}; i++) m = fmaxf(m, fabsf((float){name}_W[i]));')
+        L.append(f'        const float s = m > 0.0f ? m / 127.0f : 1.0f;')
+        L.append(f'        {name}_Wq_s[{li}] = s;')
+        L.append(f'        for(int i={wo}; i<{end}; i++) {name}_Wq[i] = (int8_t)lrintf((float){name}_W[i] / s);')
+        L.append(f'    }}')
+    L.append(f'    {name}_q_on = 1;')
+    L.append(f'}}')
+    L.append(f'static void {name}_forward_q(const double* input, double* out) {{')
+    L.append(f'    float a[{widest}], o[{widest}];')
+    L.append(f'    int8_t aq[{widest}];')
+    L.append(f'    for(int k=0; k<{layers[0]}; k++) a[k] = (float)input[k];')
+    for li, cur, nxt, wo, bo in plan:
+        f = of if li == len(plan) - 1 else af
+        L.append(f'    {{ /* layer {li}: {cur} -> {nxt} */')
+        L.append(f'        float m = 0.0f;')
+        L.append(f'        for(int k=0; k<{cur}; k++) m = fmaxf(m, fabsf(a[k]));')
+        L.append(f'        const float sa = m > 0.0f ? m / 127.0f : 1.0f, sc = sa * {name}_Wq_s[{li}];')
+        L.append(f'        for(int k=0; k<{cur}; k++) aq[k] = (int8_t)lrintf(a[k] / sa);')
+        L.append(f'        for(int j=0; j<{nxt}; j++) {{')
+        L.append(f'            const int8_t* w = {name}_Wq + {wo} + j*{cur};')
+        L.append(f'            int32_t acc = 0;')
+        L.append(f'            for(int k=0; k<{cur}; k++) acc += w[k] * aq[k];')
+        L.append(f'            o[j] = {f}(acc * sc + (float){name}_B[{bo}+j]);')
+        L.append(f'        }}')
+        if soft and li == len(plan) - 1:
+            L.extend(gen_softmax_c('o[{j}]', nxt, 'float', 8))
+        L.append(f'        memcpy(a, o, sizeof(float) * {nxt});')
+        L.append(f'    }}')
+    L.append(f'    for(int j=0; j<{layers[-1]}; j++) out[j] = a[j];')
+    L.append(f'}}')
+    L.append('')
+    return L
+
+
+def gen_predict_batch_c(name, NAME, layers, fns, R='double', soft=False, quantize=False):
+    """
+    {name}_predict_batch(rows): forward pass over a list of rows (nested
+    KLists, as ~inputs), BLOCK rows at a time as matrix products, with
+    two ping-pong buffers instead of every layer's activations. Each z
+    still sums its terms in the order {name}_forward does, so results
+    match predict() exactly. Blocks are
+    spread over {name}_threads() OpenMP threads. Returns one flat list,
+    n_outputs values per row. R: C type of the weights and buffers;
+    soft: softmax over the output layer of every row.
+    With quantize, after net.quantize() rows go through {name}_forward_q instead.
+    """
+    af, _, of, _ = fns
+    plan = _layer_plan(layers)
+    n_in, n_out, widest = layers[0], layers[-1], max(layers)
+    block = max(8, min(64, 8192 // widest)) // 4 * 4
+    L = []
+    L.append(f'#define {NAME}_BLOCK {block}')
+    L.append(f'/* x, buf: feature-major (value k of row s at [k*BLOCK + s]); every output is summed for 4 rows')
+    L.append(f'   at once in registers. Loops cover the whole block, rows past bs are zero and dropped. */')
+    L.append(f'static void {name}_forward_block(const {R}* x, int bs, double* out, {R}* buf) {{')
+    L.append(f'    {R}* ping = buf;')
+    L.append(f'    {R}* pong = buf + {NAME}_BLOCK * {widest};')
+    L.append(f'    const {R}* in = x;')
+    for li, cur, nxt, wo, bo in plan:
+        f = of if li == len(plan) - 1 else af
+        dst = 'ping' if li % 2 == 0 else 'pong'
+        L.append(f'    for(int j=0; j<{nxt}; j++) {{ /* layer {li}: {cur} -> {nxt} */')
+        L.append(f'        const {R}* w = {name}_W + {wo} + j*{cur};')
+        L.append(f'        {R}* z = {dst} + j*{NAME}_BLOCK;')
+        L.append(f'        for(int s=0; s<{NAME}_BLOCK; s+=4) {{ /* 4 rows in registers */')
+        L.append(f'            {R} c0 = {name}_B[{bo}+j], c1 = c0, c2 = c0, c3 = c0;')
+        L.append(f'            const {R}* a = in + s;')
+        L.append(f'            for(int k=0; k<{cur}; k++, a+={NAME}_BLOCK) {{')
+        L.append(f'                const {R} wk = w[k];')
+        L.append(f'                c0 += a[0]*wk; c1 += a[1]*wk; c2 += a[2]*wk; c3 += a[3]*wk;')
+        L.append(f'            }}')
+        L.append(f'            z[s] = c0; z[s+1] = c1; z[s+2] = c2; z[s+3] = c3;')
+        L.append(f'        }}')
+        L.append(f'        for(int s=0; s<bs; s++) z[s] = {f}(z[s]);')
+        L.append(f'    }}')
+        L.append(f'    in = {dst};')
+    if soft:
+        L.append(f'    for(int s=0; s<bs; s++) {{ /* softmax, row s */')
+        L.append(f'        {R}* v = {"ping" if len(plan) % 2 else "pong"} + s;')
+        L.extend(gen_softmax_c(f'v[{{j}}*{NAME}_BLOCK]', n_out, R, 8))
+        L.append(f'    }}')
+    L.append(f'    for(int s=0; s<bs; s++)')
+    L.append(f'        for(int j=0; j<{n_out}; j++) out[s*{n_out}+j] = in[j*{NAME}_BLOCK + s];')
+    L.append(f'}}')
+    L.append(f'static KList* {name}_predict_batch(KList* rows) {{')
+    L.append(f'    int n = rows->len;')
+    L.append(f'    KList* r = kuda_list_new();')
+    L.append(f'    if(n * {n_out} > r->cap) {{ r->cap = n * {n_out}; r->data = realloc(r->data, sizeof(double) * r->cap); }}')
+    L.append(f'    r->len = n * {n_out};')
+    L.append(f'    int nt = {name}_threads();')
+    if quantize:
+        L.append(f'    if({name}_q_on) {{ /* net.quantize(): int8, row by row */')
+        L.append(f'        #pragma omp parallel for num_threads(nt) schedule(static) if(n >= 4*{NAME}_BLOCK)')
+        L.append(f'        for(int s=0; s<n; s++) {{')
+        L.append(f'            KList* row = kuda_list_grab_ptr(rows, s);')
+        L.append(f'            double x[{n_in}];')
+        L.append(f'            for(int k=0; k<{n_in}; k++) x[k] = row && k < row->len ? row->data[k] : 0.0;')
+        L.append(f'            {name}_forward_q(x, r->data + (size_t)s * {n_out});')
+        L.append(f'        }}')
+        L.append(f'        return r;')
+        L.append(f'    }}')
+    L.append(f'    #pragma omp parallel for num_threads(nt) schedule(static) if(n >= 4*{NAME}_BLOCK)')
+    L.append(f'    for(int b0=0; b0<n; b0+={NAME}_BLOCK) {{')
+    L.append(f'        {R} x[{NAME}_BLOCK * {n_in}], buf[2 * {NAME}_BLOCK * {widest}];')
+    L.append(f'        memset(x, 0, sizeof x);')
+    L.append(f'        int bs = n - b0 < {NAME}_BLOCK ? n - b0 : {NAME}_BLOCK;')
+    L.append(f'        for(int s=0; s<bs; s++) {{')
+    L.append(f'            KList* row = kuda_list_grab_ptr(rows, b0+s);')
+    L.append(f'            for(int k=0; k<{n_in}; k++) x[k*{NAME}_BLOCK+s] = row && k < row->len ? row->data[k] : 0.0;')
+    L.append(f'        }}')
+    L.append(f'        {name}_forward_block(x, bs, r->data + (size_t)b0 * {n_out}, buf);')
+    L.append(f'    }}')
+    L.append(f'    return r;')
+    L.append(f'}}')
+    L.append('')
+    return L
+
+
+def _layer_plan(layers):
+    """(li, cur, nxt, w_off, b_off) of every layer li -> li+1."""
+    plan, wo, bo = [], 0, 0
+    for li, (cur, nxt) in enumerate(zip(layers, layers[1:])):
+        plan.append((li, cur, nxt, wo, bo))
+        wo += cur * nxt
+        bo += nxt
+    return plan
+
+
+def gen_softmax_c(at, n, R, indent):
+    """
+    Softmax over the n values at.format(j=...) in place, max subtracted
+    first so exp() cannot overflow.
+    """
+    pad, ex = ' ' * indent, 'expf' if R == 'float' else 'exp'
+    v = at.format(j='j')
+    return [
+        f'{pad}{{ /* softmax */',
+        f'{pad}    {R} m = {at.format(j=0)}, sum = 0.0;',
+        f'{pad}    for(int j=1; j<{n}; j++) if({v} > m) m = {v};',
+        f'{pad}    for(int j=0; j<{n}; j++) {{ {v} = {ex}({v} - m); sum += {v}; }}',
+        f'{pad}    for(int j=0; j<{n}; j++) {v} /= sum;',
+        f'{pad}}}',
+    ]
+
+
+def _loss_c(loss, a, t):
+    """C expression: ~loss of one output a with target t (log clamped, as netengine.LOSSES)."""
+    if loss == 'bce':
+        return f'-({t}*log(fmax({a}, 1e-12)) + (1.0-{t})*log(fmax(1.0-{a}, 1e-12)))'
+    if loss == 'crossent':
+        return f'-{t}*log(fmax({a}, 1e-12))'
+    return f'({a}-{t})*({a}-{t})'
+
+
+def _gen_hidden_deltas(name, li, cur, nxt, wo, act_d, d, dn, a, indent, R):
+    """
+    D[li] = (D[li+1] . W[li]) * f'(A[li]) as a walk over the rows of W, so the
+    weights are read contiguously instead of with stride cur.
+    """
+    pad = ' ' * indent
+    return [
+        f'{pad}for(int j=0; j<{cur}; j++) {d}[j] = 0.0;',
+        f'{pad}for(int k=0; k<{nxt}; k++) {{',
+        f'{pad}    const {R} dk = {dn}[k], *w = {name}_W + {wo} + k*{cur};',
+        f'{pad}    for(int j=0; j<{cur}; j++) {d}[j] += dk * w[j];',
+        f'{pad}}}',
+        f'{pad}for(int j=0; j<{cur}; j++) {d}[j] *= {act_d}({a}[j]);',
+    ]
+
+
+def _gen_sample_step(name, plan, fns, R, metrics=None, loss='mse'):
+    """Body of the per-sample SGD loop (no ~pack): update after every sample."""
+    af, af_d, of, of_d = fns
+    last, n_last = len(plan), plan[-1][2]
+    L = []
+    L.append(f'        for(int s=0; s<n; s++) {{')
+    L.append(f'            double* inp = {name}_data_in  + s*ni;')
+    L.append(f'            double* tgt = {name}_data_tgt + s*no;')
+    L.append(f'            {name}_forward(inp, acts);')
+    L.append(f'            for(int j=0; j<{n_last}; j++)')
+    L.append(f'                deltas[{last}][j] = (acts[{last}][j]-tgt[j]) * {of_d}(acts[{last}][j]);')
+    L.append(f'            for(int j=0; j<no; j++)')
+    L.append(f'                total_loss += {_loss_c(loss, f"acts[{last}][j]", "tgt[j]")};')
+    for li, cur, nxt, wo, bo in reversed(plan[1:]):
+        L.append(f'            /* hidden deltas, layer {li} */')
+        L.extend(_gen_hidden_deltas(name, li, cur, nxt, wo, af_d,
+                                    f'deltas[{li}]', f'deltas[{li+1}]', f'acts[{li}]', 12, R))
+    if metrics:
+        # |d a^T|^2 = |d|^2 |a|^2: norma gradientu bez budowania go
+        L.append(f'            double g2 = 0.0;')
+        for li, cur, nxt, wo, bo in plan:
+            L.append(f'            {{ double dd = 0.0, aa = 1.0; /* layer {li}, 1.0: bias */')
+            L.append(f'              for(int j=0; j<{nxt}; j++) dd += deltas[{li+1}][j] * deltas[{li+1}][j];')
+            L.append(f'              for(int k=0; k<{cur}; k++) aa += acts[{li}][k] * acts[{li}][k];')
+            L.append(f'              g2 += dd * aa; }}')
+        L.append(f'            {name}_gnorm += sqrt(g2); {name}_gsteps++;')
+    for li, cur, nxt, wo, bo in plan:
+        L.append(f'            /* weight update, layer {li} */')
+        L.append(f'            for(int j=0; j<{nxt}; j++) {{')
+        L.append(f'                {R}* w = {name}_W + {wo} + j*{cur};')
+        L.append(f'                const {R} g = lr * deltas[{li+1}][j];')
+        L.append(f'                {name}_B[{bo}+j] -= g;')
+        L.append(f'                for(int k=0; k<{cur}; k++) w[k] -= g * acts[{li}][k];')
+        L.append(f'            }}')
+    L.append(f'        }}')
+    return L
+
+
+def _gen_pack_step(name, NAME, pack, n_w, n_b, update, threads, hogwild, plan, fns, R,
+                   soft=False, loss='mse'):
+    """
+    ~pack = N: mini-batch step. The batch is laid out row by row (one
+    sample per row) for every layer, so forward, backward and the gradient
+    are matrix-matrix products; gradients are summed over the batch and
+    applied once by the ~opt update lines.
+
+    {name}_pack_grad works on caller-owned scratch (activations, deltas)
+    and gradient buffers, so ~threads workers each get their own: with
+    OpenMP a pack is split into one shard per thread, the per-thread
+    gradients are summed, and one update is applied. ~hogwild instead
+    gives every thread its own share of the epoch and lets it update the
+    shared weights without locks. Built without -fopenmp the pragmas are
+    ignored and training runs on one thread.
+    """
+    L = []
+    L.append(f'#define {NAME}_PACK {pack}')
+    L.append(f'#define {NAME}_SCRATCH ({NAME}_N_LAYERS * {NAME}_PACK * {NAME}_MAX_LAYER)')
+    L.append(f'#define {NAME}_TBUF (2 * {NAME}_SCRATCH + {n_w} + {n_b}) /* pa, pd, gW, gB of one thread */')
+    if not hogwild:
+        L.append(f'static {R} {name}_pa[{NAME}_SCRATCH]; /* activations */')
+        L.append(f'static {R} {name}_pd[{NAME}_SCRATCH]; /* deltas */')
+        L.append(f'static {R} {name}_gW[{n_w}];')
+        L.append(f'static {R} {name}_gB[{n_b}];')
+    L.append('')
+    af, af_d, of, of_d = fns
+    last, n_in, n_last = len(plan), plan[0][1], plan[-1][2]
+    L.append(f'/* summed gradient of samples s0 .. s0+bs-1 into gW / gB; returns their loss */')
+    L.append(f'static double {name}_pack_grad(int s0, int bs, {R}* pa, {R}* pd, {R}* gW, {R}* gB) {{')
+    L.append(f'    const int ni = {name}_n_inputs, no = {name}_n_outputs;')
+    L.append(f'    const int st = {NAME}_PACK * {NAME}_MAX_LAYER; /* rows of one layer */')
+    L.append(f'    double loss = 0.0;')
+    L.append(f'    for(int s=0; s<bs; s++)')
+    L.append(f'        for(int k=0; k<{n_in}; k++) pa[s*{n_in}+k] = {name}_data_in[(s0+s)*ni+k];')
+    L.append(f'    /* forward: A[li+1] = f(A[li] . W^T + B) */')
+    for li, cur, nxt, wo, bo in plan:
+        f = of if li == last - 1 else af
+        L.append(f'    for(int s=0; s<bs; s++) {{ /* layer {li}: {cur} -> {nxt} */')
+        L.append(f'        const {R}* a = pa + {li}*st + s*{cur};')
+        L.append(f'        {R}* o = pa + {li+1}*st + s*{nxt};')
+        L.append(f'        for(int j=0; j<{nxt}; j++) {{')
+        L.append(f'            const {R}* w = {name}_W + {wo} + j*{cur};')
+        L.append(f'            {R} z = {name}_B[{bo}+j];')
+        L.append(f'            for(int k=0; k<{cur}; k++) z += a[k] * w[k];')
+        L.append(f'            o[j] = {f}(z);')
+        L.append(f'        }}')
+        if soft and li == last - 1:
+            L.extend(gen_softmax_c('o[{j}]', nxt, R, 8))
+        L.append(f'    }}')
+    L.append(f'    /* output deltas and loss */')
+    L.append(f'    for(int s=0; s<bs; s++) {{')
+    L.append(f'        const double* tgt = {name}_data_tgt + (s0+s)*no;')
+    L.append(f'        for(int j=0; j<{n_last}; j++) {{')
+    L.append(f'            {R} a = pa[{last}*st + s*{n_last}+j], e = a - tgt[j];')
+    L.append(f'            pd[{last}*st + s*{n_last}+j] = e * {of_d}(a);')
+    L.append(f'            if(j < no) loss += {_loss_c(loss, "a", "tgt[j]")};')
+    L.append(f'        }}')
+    L.append(f'    }}')
+    for li, cur, nxt, wo, bo in reversed(plan[1:]):
+        L.append(f'    for(int s=0; s<bs; s++) {{ /* hidden deltas, layer {li} */')
+        L.append(f'        {R}* d = pd + {li}*st + s*{cur};')
+        L.append(f'        const {R}* dn = pd + {li+1}*st + s*{nxt};')
+        L.append(f'        const {R}* a = pa + {li}*st + s*{cur};')
+        L.extend(_gen_hidden_deltas(name, li, cur, nxt, wo, af_d, 'd', 'dn', 'a', 8, R))
+        L.append(f'    }}')
+    L.append(f'    /* gradient: G[li] = D[li+1]^T . A[li] */')
+    L.append(f'    memset(gW, 0, sizeof({R}) * {n_w});')
+    L.append(f'    memset(gB, 0, sizeof({R}) * {n_b});')
+    for li, cur, nxt, wo, bo in plan:
+        L.append(f'    for(int s=0; s<bs; s++) {{ /* layer {li} */')
+        L.append(f'        const {R}* a = pa + {li}*st + s*{cur};')
+        L.append(f'        const {R}* d = pd + {li+1}*st + s*{nxt};')
+        L.append(f'        for(int j=0; j<{nxt}; j++) {{')
+        L.append(f'            {R}* g = gW + {wo} + j*{cur};')
+        L.append(f'            gB[{bo}+j] += d[j];')
+        L.append(f'            for(int k=0; k<{cur}; k++) g[k] += d[j] * a[k];')
+        L.append(f'        }}')
+        L.append(f'    }}')
+    L.append(f'    return loss;')
+    L.append(f'}}')
+    L.append('')
+    L.append(f'/* one averaged update from the summed gradient of bs samples */')
+    L.append(f'static void {name}_pack_apply(const {R}* gW, const {R}* gB, int bs, {R} lr) {{')
+    L.extend(update)
+    L.append(f'}}')
+    L.append('')
+    if not hogwild:
+        L.append(f'static double {name}_pack_step(int s0, int bs, double lr) {{')
+        L.append(f'    double loss = {name}_pack_grad(s0, bs, {name}_pa, {name}_pd, {name}_gW, {name}_gB);')
+        L.append(f'    {name}_pack_apply({name}_gW, {name}_gB, bs, lr);')
+        L.append(f'    return loss;')
+        L.append(f'}}')
+        L.append('')
+
+    L.append(f'static {R}* {name}_tbuf = NULL; /* {NAME}_TBUF values per thread */')
+    L.append(f'static int     {name}_tbuf_n = 0;')
+    L.append(f'static {R}* {name}_thread_bufs(int nt) {{')
+    L.append(f'    if(nt > {name}_tbuf_n) {{')
+    L.append(f'        free({name}_tbuf);')
+    L.append(f'        {name}_tbuf = malloc(sizeof({R}) * {NAME}_TBUF * nt);')
+    L.append(f'        {name}_tbuf_n = nt;')
+    L.append(f'    }}')
+    L.append(f'    return {name}_tbuf;')
+    L.append(f'}}')
+    L.append('')
+    if hogwild:
+        L.append(f'/* ~hogwild: every thread trains on its share of the epoch, updating the shared weights lock-free */')
+        L.append(f'static double {name}_hogwild_epoch(int n, double lr, int nt) {{')
+        L.append(f'    {R}* buf = {name}_thread_bufs(nt);')
+        L.append(f'    double loss = 0.0;')
+        L.append(f'    #pragma omp parallel num_threads(nt) reduction(+:loss)')
+        L.append(f'    {{')
+        L.append(f'        int t = 0, nth = 1;')
+        L.append(f'#ifdef _OPENMP')
+        L.append(f'        t = omp_get_thread_num(); nth = omp_get_num_threads();')
+        L.append(f'#endif')
+        L.append(f'        {R}* b = buf + (size_t)t * {NAME}_TBUF;')
+        L.append(f'        {R} *gW = b + 2*{NAME}_SCRATCH, *gB = gW + {n_w};')
+        L.append(f'        int lo = (int)((long)n * t / nth), hi = (int)((long)n * (t+1) / nth);')
+        L.append(f'        for(int s=lo; s<hi; s+={NAME}_PACK) {{')
+        L.append(f'            int bs = hi - s < {NAME}_PACK ? hi - s : {NAME}_PACK;')
+        L.append(f'            loss += {name}_pack_grad(s, bs, b, b + {NAME}_SCRATCH, gW, gB);')
+        L.append(f'            {name}_pack_apply(gW, gB, bs, lr);')
+        L.append(f'        }}')
+        L.append(f'    }}')
+        L.append(f'    return loss;')
+        L.append(f'}}')
+    else:
+        L.append(f'/* ~threads: shard the pack, one gradient per thread, summed before one update */')
+        L.append(f'static double {name}_pack_step_mt(int s0, int bs, double lr, int nt) {{')
+        L.append(f'    {R}* buf = {name}_thread_bufs(nt);')
+        L.append(f'    double loss = 0.0;')
+        L.append(f'    int team = 1;')
+        L.append(f'    #pragma omp parallel num_threads(nt) reduction(+:loss) if(bs >= 2*nt)')
+        L.append(f'    {{')
+        L.append(f'        int t = 0, nth = 1;')
+        L.append(f'#ifdef _OPENMP')
+        L.append(f'        t = omp_get_thread_num(); nth = omp_get_num_threads();')
+        L.append(f'#endif')
+        L.append(f'        #pragma omp single')
+        L.append(f'        team = nth;')
+        L.append(f'        {R}* b = buf + (size_t)t * {NAME}_TBUF;')
+        L.append(f'        int lo = bs * t / nth, hi = bs * (t+1) / nth;')
+        L.append(f'        loss += {name}_pack_grad(s0 + lo, hi - lo, b, b + {NAME}_SCRATCH,')
+        L.append(f'                                 b + 2*{NAME}_SCRATCH, b + 2*{NAME}_SCRATCH + {n_w});')
+        L.append(f'        #pragma omp barrier')
+        L.append(f'        /* reduction: thread gradients summed in thread order */')
+        L.append(f'        #pragma omp for')
+        L.append(f'        for(int i=0; i<{n_w}+{n_b}; i++) {{')
+        L.append(f'            {R} g = 0.0;')
+        L.append(f'            for(int k=0; k<team; k++) g += buf[(size_t)k * {NAME}_TBUF + 2*{NAME}_SCRATCH + i];')
+        L.append(f'            if(i < {n_w}) {name}_gW[i] = g; else {name}_gB[i - {n_w}] = g;')
+        L.append(f'        }}')
+        L.append(f'    }}')
+        L.append(f'    {name}_pack_apply({name}_gW, {name}_gB, bs, lr);')
+        L.append(f'    return loss;')
+        L.append(f'}}')
+    L.append('')
+    return L
+
+
+def _gen_grad_norm(name, n_w, n_b):
+    """~metrics lines for {name}_pack_apply: adds the norm of the averaged gradient to {name}_gnorm."""
+    return [
+        f'    double g2 = 0.0;',
+        f'    for(int i=0; i<{n_w}; i++) g2 += gW[i] * gW[i];',
+        f'    for(int i=0; i<{n_b}; i++) g2 += gB[i] * gB[i];',
+        f'    #pragma omp atomic',
+        f'    {name}_gnorm += sqrt(g2) / bs;',
+        f'    #pragma omp atomic',
+        f'    {name}_gsteps++;',
+    ]
+
+
+def _gen_opt_update(name, opt, n_w, n_b, beta1, beta2, eps, R='double'):
+    """
+    Body of {name}_pack_apply: apply the summed gradient gW / gB of bs
+    samples with ~opt (same rules as netengine.Optimizer), keeping the
+    state in {name}_mW / _vW / ... Constants and sqrt follow R, so a
+    float net does its update in float.
+    """
+    f = 'f' if R == 'float' else ''
+    L = []
+    if opt == 'sgd':
+        L.append(f'    const {R} scale = lr / bs;')
+        L.append(f'    for(int i=0; i<{n_w}; i++) {name}_W[i] -= scale * gW[i];')
+        L.append(f'    for(int i=0; i<{n_b}; i++) {name}_B[i] -= scale * gB[i];')
+        return L
+    b1, b2, eps, one = repr(beta1) + f, repr(beta2) + f, repr(eps) + f, '1.0' + f
+    L.append(f'    /* ~opt = {opt} */')
+    L.append(f'    const {R} inv = {one} / bs;')
+    L.append(f'    {name}_opt_t++;')
+    if opt == 'adam':
+        L.append(f'    const {R} c1 = 1.0 - pow({beta1!r}, (double){name}_opt_t);')
+        L.append(f'    const {R} c2 = 1.0 - pow({beta2!r}, (double){name}_opt_t);')
+    for p, n in (('W', n_w), ('B', n_b)):
+        P, G = f'{name}_{p}', f'g{p}'
+        M, V = f'{name}_m{p}', f'{name}_v{p}'
+        L.append(f'    for(int i=0; i<{n}; i++) {{')
+        L.append(f'        {R} g = {G}[i] * inv;')
+        if opt == 'momentum':
+            L.append(f'        {M}[i] = {b1} * {M}[i] + g;')
+            L.append(f'        {P}[i] -= lr * {M}[i];')
+        elif opt == 'nesterov':
+            L.append(f'        {M}[i] = {b1} * {M}[i] + g;')
+            L.append(f'        {P}[i] -= lr * (g + {b1} * {M}[i]);')
+        elif opt == 'rmsprop':
+            L.append(f'        {V}[i] = {b2} * {V}[i] + ({one} - {b2}) * g * g;')
+            L.append(f'        {P}[i] -= lr * g / (sqrt{f}({V}[i]) + {eps});')
+        else:  # adam
+            L.append(f'        {M}[i] = {b1} * {M}[i] + ({one} - {b1}) * g;')
+            L.append(f'        {V}[i] = {b2} * {V}[i] + ({one} - {b2}) * g * g;')
+            L.append(f'        {P}[i] -= lr * ({M}[i] / c1) / (sqrt{f}({V}[i] / c2) + {eps});')
+        L.append(f'    }}')
+    return L
@@ -0,0 +1,412 @@
+"""
+netengine.py — NumPy engine for interpreter-mode nets.
+
+Weights live as 2-D float64 arrays (float32 with ~dtype = f32), W[l]
+with shape (n_out, n_in), so
+row j of W[l] is the slice j*n_in:(j+1)*n_in of the flat list that
+net.write() stores. Forward and backward passes work on a whole batch at
+once: X has one sample per row, every layer is one matrix product, and
+the activations act on whole arrays.
+"""
+
+import math
+import random
+
+import numpy as np
+
+
+def _sigmoid(z):
+    with np.errstate(over='ignore'):
+        return 1.0 / (1.0 + np.exp(-z))
+
+
+def _softmax(z):
+    # z - max: exp nie przepełnia się przy dużych z
+    e = np.exp(z - np.max(z, axis=-1, keepdims=True))
+    return e / np.sum(e, axis=-1, keepdims=True)
+
+
+# name -> (f(z), f'(a)); pochodna liczona z wyjścia a = f(z), jak w pętli skalarnej
+ACTIVATIONS = {
+    'tanh':    (np.tanh,                               lambda a: 1.0 - a * a),
+    'sigmoid': (_sigmoid,                              lambda a: a * (1.0 - a)),
+    'relu':    (lambda z: np.maximum(z, 0.0),          lambda a: (a > 0).astype(a.dtype)),
+    'leaky':   (lambda z: np.where(z > 0, z, 0.01 * z), lambda a: np.where(a > 0, 1.0, 0.01).astype(a.dtype)),
+    'linear':  (lambda z: z,                           lambda a: np.ones_like(a)),
+    # tylko wyjście, z ~loss = crossent: delta wyjścia to wprost a - y
+    'softmax': (_softmax,                              lambda a: np.ones_like(a)),
+}
+
+
+def activation(name):
+    return ACTIVATIONS.get(name, ACTIVATIONS['tanh'])
+
+
+def _sigmoid_(z):
+    with np.errstate(over='ignore'):
+        np.negative(z, out=z)
+        np.exp(z, out=z)
+        z += 1.0
+        np.reciprocal(z, out=z)
+
+
+def _softmax_(z):
+    z -= np.max(z)
+    np.exp(z, out=z)
+    z /= np.sum(z)
+
+
+# te same funkcje w miejscu (out=z) — dla predict(), bez alokacji na warstwę
+ACTIVATIONS_INPLACE = {
+    'tanh':    lambda z: np.tanh(z, out=z),
+    'sigmoid': _sigmoid_,
+    'relu':    lambda z: np.maximum(z, 0.0, out=z),
+    'leaky':   lambda z: np.multiply(z, 0.01, out=z, where=z < 0),
+    'linear':  lambda z: None,
+    'softmax': _softmax_,
+}
+
+
+# ~loss -> loss of every sample (row) of a batch, summed over its outputs
+# (mse: averaged); log() clamped so a saturated output gives a large loss, not inf
+LOSSES = {
+    'mse':      lambda a, y: np.mean((a - y) ** 2, axis=1),
+    'bce':      lambda a, y: -np.sum(y * np.log(np.maximum(a, 1e-12))
+                                     + (1 - y) * np.log(np.maximum(1 - a, 1e-12)), axis=1),
+    'crossent': lambda a, y: -np.sum(y * np.log(np.maximum(a, 1e-12)), axis=1),
+}
+
+# ~loss -> the output activation its fused gradient is derived for
+LOSS_OUT = {'bce': 'sigmoid', 'crossent': 'softmax'}
+
+
+def loss_output(loss, act_out):
+    """
+    ~loss and ~act_out (None: not set) checked against each other.
+    Returns (loss, act_out); an unset act_out becomes the one the loss
+    needs (None for mse), and ~act_out = softmax alone means crossent.
+    """
+    if loss is None:
+        loss = 'crossent' if act_out == 'softmax' else 'mse'
+    if loss not in LOSSES:
+        raise ValueError(f"unknown ~loss '{loss}' (use {', '.join(LOSSES)})")
+    need = LOSS_OUT.get(loss)
+    if act_out is None:
+        return loss, need
+    if need and act_out != need:
+        raise ValueError(f"~loss = {loss} needs ~act_out = {need}")
+    if act_out == 'softmax' and loss != 'crossent':
+        raise ValueError("~act_out = softmax needs ~loss = crossent")
+    return loss, act_out
+
+
+# ~dtype -> typ tablic silnika (i wartości w pliku .kw)
+DTYPES = {'f64': np.float64, 'f32': np.float32}
+
+
+class NetEngine:
+    def __init__(self, layers, act='tanh', act_out=None, weights=None, biases=None, opt=None,
+                 dtype='f64', loss='mse'):
+        if dtype not in DTYPES:
+            raise ValueError(f"unknown ~dtype '{dtype}' (use {', '.join(DTYPES)})")
+        self.dtype = dtype
+        self.real = DTYPES[dtype]
+        self.layers = [int(n) for n in layers]
+        self.act_name = act
+        self.out_name = act_out or act
+        self.act_f, self.act_d = activation(self.act_name)
+        self.out_f, self.out_d = activation(self.out_name)
+        self.loss = loss
+        pairs = list(zip(self.layers, self.layers[1:]))
+        if weights is None:
+            weights = [[0.0] * (n_in * n_out) for n_in, n_out in pairs]
+        if biases is None:
+            biases = [[0.0] * n_out for _, n_out in pairs]
+        self.W = [np.array(w, dtype=self.real).reshape(n_out, n_in)
+                  for w, (n_in, n_out) in zip(weights, pairs)]
+        self.B = [np.array(b, dtype=self.real) for b in biases]
+        self.opt = opt or Optimizer()
+        self.track_norm = False   # ~metrics: step() then sets grad_norm
+        self.grad_norm = 0.0
+        self.Q = None             # quantize(): (int8 W, scale) per layer
+        self.compile()
+
+    @classmethod
+    def from_flat(cls, layers, W, B, act='tanh', act_out=None, opt=None, dtype='f64', loss='mse'):
+        """Engine from the flat W / B lists that net.write() stores."""
+        weights, biases, iw, ib = [], [], 0, 0
+        for n_in, n_out in zip(layers, layers[1:]):
+            weights.append(W[iw:iw + n_in * n_out]); iw += n_in * n_out
+            biases.append(B[ib:ib + n_out]);         ib += n_out
+        return cls(layers, act, act_out, weights, biases, opt, dtype, loss)
+
+    @classmethod
+    def initialized(cls, layers, act, act_out, init='xav', opt=None, dtype='f64', loss='mse'):
+        """Random weights (xav / he) drawn with random.gauss, zero biases."""
+        weights = []
+        for n_in, n_out in zip(layers, layers[1:]):
+            std = math.sqrt(2.0 / n_in) if init == 'he' else math.sqrt(2.0 / (n_in + n_out))
+            weights.append([random.gauss(0, std) for _ in range(n_in * n_out)])
+        return cls(layers, act, act_out, weights, opt=opt, dtype=dtype, loss=loss)
+
+    def compile(self):
+        """
+        Layer plan for predict(): (W, B, in-place activation, output
+        buffer) per layer. Layers write alternately into two buffers sized
+        for the widest layer, so one sample never allocates per layer.
+        Training updates W / B in place, so the plan stays valid.
+        """
+        width = max(self.layers[1:], default=0)
+        bufs = (np.empty(width, dtype=self.real), np.empty(width, dtype=self.real))
+        last = len(self.W) - 1
+        act_i = ACTIVATIONS_INPLACE.get(self.act_name, ACTIVATIONS_INPLACE['tanh'])
+        out_i = ACTIVATIONS_INPLACE.get(self.out_name, ACTIVATIONS_INPLACE['tanh'])
+        self.plan = [(w, b, out_i if li == last else act_i, bufs[li % 2][:w.shape[0]])
+                     for li, (w, b) in enumerate(zip(self.W, self.B))]
+
+    def quantize(self):
+        """
+        int8 weights with one scale per layer (max |w| -> 127). From now
+        on predict() / infer() quantize each layer's input with its own
+        scale, multiply in integers (int32 sums) and scale z back.
+        """
+        self.Q = []
+        for w in self.W:
+            m = float(np.max(np.abs(w))) if w.size else 0.0
+            s = m / 127 if m > 0 else 1.0
+            self.Q.append((np.rint(w / s).astype(np.int8), s))
+
+    def infer_q(self, X):
+        """infer() through the int8 weights of quantize()."""
+        a = np.asarray(X, dtype=np.float32)
+        last = len(self.Q) - 1
+        for li, ((wq, sw), b) in enumerate(zip(self.Q, self.B)):
+            m = np.max(np.abs(a), axis=1, keepdims=True)
+            sa = np.where(m > 0, m / 127, 1.0).astype(np.float32)
+            aq = np.rint(a / sa).astype(np.int32)
+            z = (aq @ wq.T.astype(np.int32)).astype(np.float32) * (sa * np.float32(sw)) + b.astype(np.float32)
+            a = self.out_f(z) if li == last else self.act_f(z)
+        return a
+
+    def forward(self, X):
+        """X: (batch, n_in). Returns the activations of every layer, input included."""
+        a = X
+        acts = [a]
+        last = len(self.W) - 1
+        for li, (w, b) in enumerate(zip(self.W, self.B)):
+            z = a @ w.T + b
+            a = self.out_f(z) if li == last else self.act_f(z)
+            acts.append(a)
+        return acts
+
+    def infer(self, X):
+        """Output layer only, for inference: no per-layer activations kept."""
+        if self.Q is not None:
+            return self.infer_q(X)
+        a = X
+        last = len(self.W) - 1
+        for li, (w, b) in enumerate(zip(self.W, self.B)):
+            z = a @ w.T
+            z += b
+            a = self.out_f(z) if li == last else self.act_f(z)
+        return a
+
+    def backward(self, acts, Y):
+        """
+        Per-sample deltas of every layer, shape (batch, n_out). With bce
+        (sigmoid output) and crossent (softmax output) the output delta of
+        the fused loss + activation is just a - y.
+        """
+        deltas = [None] * len(self.W)
+        deltas[-1] = acts[-1] - Y
+        if self.loss == 'mse':
+            deltas[-1] *= self.out_d(acts[-1])
+        for li in range(len(self.W) - 2, -1, -1):
+            deltas[li] = (deltas[li + 1] @ self.W[li + 1]) * self.act_d(acts[li + 1])
+        return deltas
+
+    def step(self, X, Y, lr):
+        """
+        One gradient step on the batch (gradients averaged over its rows).
+        Returns the summed per-sample ~loss measured before the update; with
+        track_norm, grad_norm is the L2 norm of the averaged gradient.
+        """
+        acts = self.forward(X)
+        loss = float(np.sum(LOSSES[self.loss](acts[-1], Y)))
+        deltas = self.backward(acts, Y)
+        n = X.shape[0]
+        if self.opt.name == 'sgd':
+            scale, g2 = lr / n, 0.0
+            for li, d in enumerate(deltas):
+                gW, gB = d.T @ acts[li], d.sum(axis=0)
+                self.W[li] -= scale * gW
+                self.B[li] -= scale * gB
+                if self.track_norm:
+                    g2 += float(np.vdot(gW, gW) + np.vdot(gB, gB))
+            if self.track_norm:
+                self.grad_norm = math.sqrt(g2) / n
+        else:
+            grads = [d.T @ acts[li] / n for li, d in enumerate(deltas)]
+            grads += [d.sum(axis=0) / n for d in deltas]
+            self.opt.update(self.W + self.B, grads, lr)
+            if self.track_norm:
+                self.grad_norm = math.sqrt(sum(float(np.vdot(g, g)) for g in grads))
+        return loss
+
+    def predict(self, inputs):
+        """One sample (list) -> output list, through the compiled plan."""
+        if self.Q is not None:
+            return self.infer_q(np.asarray(inputs, dtype=np.float64)[None, :self.layers[0]])[0].tolist()
+        a = np.asarray(inputs, dtype=self.real)[:self.layers[0]]
+        for w, b, f, out in self.plan:
+            np.dot(w, a, out=out)
+            out += b
+            f(out)
+            a = out
+        return a.tolist()
+
+    def opt_state(self):
+        return self.opt.state(len(self.W))
+
+    def data(self):
+        """Architecture, flat W / B and ~opt state: what net.write() saves."""
+        data = {
+            'layers':  self.layers,
+            'act':     self.act_name,
+            'act_out': self.out_name,
+            'W':       np.concatenate([w.ravel() for w in self.W]),
+            'B':       np.concatenate(self.B),
+        }
+        if self.dtype != 'f64':
+            data['dtype'] = self.dtype   # .kw: wartości 4-bajtowe
+        data.update(self.opt_state())
+        return data
+
+    def restore_opt(self, data):
+        return self.opt.restore(data, self.W + self.B, len(self.W))
+
+
+# ~schedule -> default ~decay (cosine: none, it ends at 0)
+SCHEDULES = {'step': 0.5, 'exp': 0.99, 'cosine': None, 'plateau': 0.5}
+
+
+def schedule_lr(schedule, lr, epoch, epochs, decay, warmup=0, every=1):
+    """
+    ~lr of one epoch: a linear ramp over the first ~warmup epochs, then
+    step (x decay every `every` epochs), exp (x decay per epoch) or
+    cosine (half a cosine down to 0 at the last epoch). plateau and no
+    schedule return ~lr; plateau cuts are applied by the training loop.
+    The generated C loop computes the same (net.py).
+    """
+    if epoch < warmup:
+        return lr * (epoch + 1) / warmup
+    t = epoch - warmup
+    if schedule == 'step':
+        return lr * decay ** (t // every)
+    if schedule == 'exp':
+        return lr * decay ** t
+    if schedule == 'cosine':
+        return lr * 0.5 * (1.0 + math.cos(math.pi * t / max(1, epochs - warmup)))
+    return lr
+
+
+# net.stats(): wartości ostatniego treningu, w tej kolejności (C: lista)
+STATS = ('epochs', 'time', 'samples_per_sec', 'loss', 'grad_norm', 'lr')
+
+
+# ~opt -> stan, który trzyma: m (prędkość / pierwszy moment), v (drugi moment)
+OPTIMIZERS = {
+    'sgd':      '',
+    'momentum': 'm',
+    'nesterov': 'm',
+    'rmsprop':  'v',
+    'adam':     'mv',
+}
+
+
+class Optimizer:
+    """
+    ~opt: turns averaged gradients into weight updates.
+
+        momentum  m = b1*m + g;                   w -= lr*m
+        nesterov  m = b1*m + g;                   w -= lr*(g + b1*m)
+        rmsprop   v = b2*v + (1-b2)*g^2;          w -= lr*g / (sqrt(v) + eps)
+        adam      m, v as above (m with 1-b1), bias-corrected by step t
+
+    The state arrays follow the parameter list W[0..], B[0..] the engine
+    passes in; state() / restore() use the flat mW, mB, vW, vB lists of
+    net.write().
+    """
+    def __init__(self, name='sgd', beta1=0.9, beta2=None, eps=1e-8):
+        if name not in OPTIMIZERS:
+            raise ValueError(f"unknown ~opt '{name}' (use {', '.join(OPTIMIZERS)})")
+        self.name = name
+        self.beta1 = float(beta1)
+        self.beta2 = float(beta2 if beta2 is not None else (0.9 if name == 'rmsprop' else 0.999))
+        self.eps = float(eps)
+        self.t = 0
+        self.m = None
+        self.v = None
+
+    def update(self, params, grads, lr):
+        kinds = OPTIMIZERS[self.name]
+        if 'm' in kinds and self.m is None:
+            self.m = [np.zeros_like(p) for p in params]
+        if 'v' in kinds and self.v is None:
+            self.v = [np.zeros_like(p) for p in params]
+        b1, b2, eps = self.beta1, self.beta2, self.eps
+        self.t += 1
+        if self.name == 'adam':
+            c1 = 1.0 - b1 ** self.t
+            c2 = 1.0 - b2 ** self.t
+        for i, (p, g) in enumerate(zip(params, grads)):
+            if self.name == 'momentum':
+                m = self.m[i]; m *= b1; m += g
+                p -= lr * m
+            elif self.name == 'nesterov':
+                m = self.m[i]; m *= b1; m += g
+                p -= lr * (g + b1 * m)
+            elif self.name == 'rmsprop':
+                v = self.v[i]; v *= b2; v += (1.0 - b2) * g * g
+                p -= lr * g / (np.sqrt(v) + eps)
+            elif self.name == 'adam':
+                m = self.m[i]; m *= b1; m += (1.0 - b1) * g
+                v = self.v[i]; v *= b2; v += (1.0 - b2) * g * g
+                p -= lr * (m / c1) / (np.sqrt(v / c2) + eps)
+            else:
+                p -= lr * g
+
+    def state(self, n_layers):
+        """Optimizer state for net.write() ({} for plain sgd), flat as W / B."""
+        if self.name == 'sgd':
+            return {}
+        data = {'opt': self.name, 'opt_t': self.t}
+        for key, arrays in (('m', self.m), ('v', self.v)):
+            if key in OPTIMIZERS[self.name] and arrays is not None:
+                data[key + 'W'] = np.concatenate([a.ravel() for a in arrays[:n_layers]])
+                data[key + 'B'] = np.concatenate(arrays[n_layers:])
+        return data
+
+    def restore(self, data, params, n_layers):
+        """Take back state() saved by net.write(), if it belongs to this ~opt."""
+        if data.get('opt') != self.name:
+            return False
+        self.t = int(data.get('opt_t', 0))
+        for key in OPTIMIZERS[self.name]:
+            flat_w, flat_b = data.get(key + 'W'), data.get(key + 'B')
+            if flat_w is None or flat_b is None:
+                continue
+            arrays, iw, ib = [], 0, 0
+            for p in params[:n_layers]:
+                arrays.append(np.array(flat_w[iw:iw + p.size], dtype=p.dtype).reshape(p.shape))
+                iw += p.size
+            for p in params[n_layers:]:
+                arrays.append(np.array(flat_b[ib:ib + p.size], dtype=p.dtype))
+                ib += p.size
+            setattr(self, key, arrays)
+        return True
+
+
+def as_matrix(rows, width, dtype=np.float64):
+    """Dataset column (list of lists) -> (n, width) float64 (or dtype) array."""
+    return np.array([list(r)[:width] for r in rows], dtype=dtype).reshape(len(rows), width)
@@ -0,0 +1,202 @@
+"""
+netfile.py — net weight files, as written by net.write() and read by net.load().
+
+Two formats, chosen by the file extension:
+
+  *.json  the readable format: {"layers", "act", "act_out", "W", "B", ...},
+          with "dtype": "f32" for nets trained with ~dtype = f32
+  *.kw    binary, little-endian, loadable with one read per array:
+
+      offset  size  field
+      0       4     magic "KUDW"
+      4       4     u32 version (1)
+      8       4     u32 dtype: bytes per value, 8 = float64, 4 = float32
+      12      4     u32 n_layers
+      16      4     u32 act      (index in ACTS)
+      20      4     u32 act_out  (index in ACTS)
+      24      4     u32 opt      (index in OPTS)
+      28      4     u32 CRC-32 of everything after the layer sizes
+      32      8     i64 opt_t
+      40      4*n   u32 layer sizes, padded with zeros to a multiple of 8
+      ...           W, B, then the ~opt state (mW, mB, vW, vB as in JSON)
+
+A ~checkpoint is a .kw file (whatever its extension) with the training
+position appended after the arrays, inside the CRC:
+
+      4     magic "KUCP"
+      8     i64 epochs done
+      8     f64 loss of the last epoch done      \  stats() of a run that
+      8     f64 grad_norm of the last epoch      |  resumes at the last epoch
+      8     f64 lr of the last epoch             /  and trains no more
+      8     f64 gauss_next of the RNG (NaN: none)
+      4     u32 n, then n u32 words of the RNG state (0 in C mode: no RNG)
+
+Both backends read and write both formats; load() here returns the same
+dict for either, with W / B (and the state arrays) as float64 arrays for
+.kw files and lists for JSON.
+"""
+
+import json
+import math
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from netengine import OPTIMIZERS
+
+KW_MAGIC   = b'KUDW'
+KW_VERSION = 1
+ACTS = ('tanh', 'sigmoid', 'relu', 'leaky', 'linear', 'softmax')
+OPTS = tuple(OPTIMIZERS)
+
+_HEAD = struct.Struct('<4s7Iq')
+CKPT_MAGIC = b'KUCP'
+_CKPT = struct.Struct('<4sqddddI')
+
+
+def is_kw(path):
+    return str(path).endswith('.kw')
+
+
+def _state_keys(opt):
+    return [key + p for key in OPTIMIZERS.get(opt, '') for p in 'WB']
+
+
+def _kw_header(buf, path):
+    if len(buf) < _HEAD.size:
+        raise ValueError(f"{path}: not a .kw file (too short)")
+    magic, version, dsize, n_layers, act, act_out, opt, crc, opt_t = _HEAD.unpack_from(buf)
+    if magic != KW_MAGIC:
+        raise ValueError(f"{path}: not a .kw file")
+    if version != KW_VERSION:
+        raise ValueError(f"{path}: unsupported .kw version {version}")
+    if dsize not in (4, 8):
+        raise ValueError(f"{path}: bad dtype size {dsize}")
+    layers = list(struct.unpack_from(f'<{n_layers}I', buf, _HEAD.size))
+    return {
+        'layers':  layers,
+        'act':     ACTS[act] if act < len(ACTS) else 'tanh',
+        'act_out': ACTS[act_out] if act_out < len(ACTS) else 'tanh',
+        'dtype':   'f32' if dsize == 4 else 'f64',
+        'opt':     OPTS[opt] if opt < len(OPTS) else 'sgd',
+        'opt_t':   opt_t,
+        '_dsize':  dsize,
+        '_crc':    crc,
+        '_offset': _HEAD.size + 4 * (n_layers + n_layers % 2),
+    }
+
+
+def load_header(path):
+    """Architecture only (layers, act, act_out, dtype, opt): no weights are parsed for .kw."""
+    if not is_kw(path):
+        data = load(path)
+        return {k: data[k] for k in ('layers', 'act', 'act_out', 'dtype', 'opt') if k in data}
+    with open(path, 'rb') as f:
+        head = f.read(_HEAD.size)
+        n_layers = _HEAD.unpack_from(head)[3] if len(head) == _HEAD.size else 0
+        head += f.read(4 * n_layers)
+    info = _kw_header(head, path)
+    return {k: v for k, v in info.items() if not k.startswith('_')}
+
+
+def load(path):
+    """The dict net.write() saved; raises FileNotFoundError / ValueError."""
+    if not is_kw(path):
+        with open(path) as f:
+            return json.load(f)
+    return _load_kw(path)
+
+
+def _load_kw(path, ckpt=False):
+    with open(path, 'rb') as f:
+        buf = f.read()
+    data = _kw_header(buf, path)
+    off, dsize = data.pop('_offset'), data.pop('_dsize')
+    if zlib.crc32(memoryview(buf)[off:]) != data.pop('_crc'):
+        raise ValueError(f"{path}: checksum mismatch (file damaged)")
+    layers = data['layers']
+    n_w = sum(a * b for a, b in zip(layers, layers[1:]))
+    n_b = sum(layers[1:])
+    dt = np.dtype('<f4' if dsize == 4 else '<f8')
+    for key, n in [('W', n_w), ('B', n_b)] + [(k, n_w if k[1] == 'W' else n_b)
+                                              for k in _state_keys(data['opt'])]:
+        if off + n * dsize > len(buf):
+            raise ValueError(f"{path}: truncated at '{key}'")
+        data[key] = np.frombuffer(buf, dtype=dt, count=n, offset=off).astype(np.float64)
+        off += n * dsize
+    if ckpt and buf[off:off + 4] == CKPT_MAGIC and off + _CKPT.size <= len(buf):
+        _, data['epoch'], data['loss'], data['grad_norm'], data['lr'], gauss, n = _CKPT.unpack_from(buf, off)
+        words = struct.unpack_from(f'<{n}I', buf, off + _CKPT.size) if n else ()
+        data['rng'] = (3, tuple(words), None if math.isnan(gauss) else gauss) if n else None
+    if data['opt'] == 'sgd':
+        del data['opt'], data['opt_t']
+    return data
+
+
+def save(path, data):
+    """Write data (layers, act, act_out, W, B, ~opt state) as JSON or .kw by extension."""
+    if not is_kw(path):
+        out = {k: (v.tolist() if isinstance(v, np.ndarray) else v) for k, v in data.items()}
+        with open(path, 'w') as f:
+            json.dump(out, f, indent=2)
+        return
+    _save_kw(path, data)
+
+
+def save_checkpoint(path, data, epoch, rng=None, last=(0.0, 0.0, 0.0)):
+    """
+    ~checkpoint: data as .kw plus the epochs done, the last epoch's
+    (loss, grad_norm, lr) and random.getstate(), written to path.tmp and
+    renamed over path, so a crash mid-write leaves the previous
+    checkpoint intact.
+    """
+    words, gauss = (rng[1], rng[2]) if rng else ((), None)
+    tail = _CKPT.pack(CKPT_MAGIC, int(epoch), *(float(v) for v in last),
+                      math.nan if gauss is None else gauss, len(words))
+    tail += struct.pack(f'<{len(words)}I', *words)
+    tmp = f'{path}.tmp'
+    _save_kw(tmp, data, tail)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path):
+    """load() of a save_checkpoint() file: adds 'epoch', 'loss', 'grad_norm', 'lr' and 'rng' (None: no RNG state)."""
+    data = _load_kw(path, ckpt=True)
+    if 'epoch' not in data:
+        raise ValueError(f"{path}: not a checkpoint (no training position)")
+    return data
+
+
+def _save_kw(path, data, tail=b''):
+    dt = np.dtype('<f4' if data.get('dtype') == 'f32' else '<f8')
+    opt = data.get('opt', 'sgd')
+    if opt not in OPTS:
+        opt = 'sgd'
+    arrays = [np.asarray(data['W'], dtype=dt), np.asarray(data['B'], dtype=dt)]
+    if all(k in data for k in _state_keys(opt)):
+        arrays += [np.asarray(data[k], dtype=dt) for k in _state_keys(opt)]
+    else:
+        opt = 'sgd'
+    crc = 0
+    for a in arrays:
+        crc = zlib.crc32(a.tobytes(), crc)
+    crc = zlib.crc32(tail, crc)
+    layers = [int(n) for n in data['layers']]
+    act = data.get('act', 'tanh')
+    act_out = data.get('act_out', act)
+    with open(path, 'wb') as f:
+        f.write(_HEAD.pack(KW_MAGIC, KW_VERSION, dt.itemsize, len(layers),
+                           ACTS.index(act) if act in ACTS else 0,
+                           ACTS.index(act_out) if act_out in ACTS else 0,
+                           OPTS.index(opt), crc, int(data.get('opt_t', 0))))
+        f.write(struct.pack(f'<{len(layers) + len(layers) % 2}I', *layers, *[0] * (len(layers) % 2)))
+        for a in arrays:
+            f.write(a.tobytes())
+        f.write(tail)
+
+
+def convert(src, dst):
+    """kuda convert: same weights, format of dst's extension."""
+    save(dst, load(src))
@@ -1,139 +1,222 @@
 from lexer import *
 
 # === Węzły AST ===
-
-class NumberNode:
+#
+# Każdy węzeł ma __slots__ zamiast __dict__ i wspólne pole `line` (0 gdy
+# nieznana). Pola wymienione w __slots__ są też kolejnością dzieci:
+# children() zwraca węzły z tych pól (także z list, krotek i słowników),
+# walk() przechodzi całe poddrzewo.
+
+class Node:
+    __slots__ = ('line',)
+
+    def children(self):
+        """Bezpośrednie węzły-dzieci, w kolejności źródła."""
+        out = []
+        for name in self.__slots__:
+            _collect(getattr(self, name), out)
+        return out
+
+    def __repr__(self):
+        fields = ', '.join(f'{n}={getattr(self, n)!r}' for n in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+def _collect(value, out):
+    if isinstance(value, Node):
+        out.append(value)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _collect(v, out)
+    elif isinstance(value, dict):
+        for v in value.values():
+            _collect(v, out)
+
+
+def walk(node):
+    """Wszystkie węzły poddrzewa (łącznie z node), w kolejności źródła."""
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        yield n
+        stack.extend(reversed(n.children()))
+
+
+class NumberNode(Node):
+    __slots__ = ('value',)
     def __init__(self, value, line=0): self.value = value; self.line = line
 
-class StringNode:
+class StringNode(Node):
+    __slots__ = ('value',)
     def __init__(self, value, line=0): self.value = value; self.line = line
 
-class BoolNode:
+class BoolNode(Node):
+    __slots__ = ('value',)
     def __init__(self, value, line=0): self.value = value; self.line = line
 
-class NoneNode:
+class NoneNode(Node):
+    __slots__ = ()
     def __init__(self, line=0): self.line = line
 
-class IdentNode:
+class IdentNode(Node):
+    __slots__ = ('name',)
     def __init__(self, name, line=0): self.name = name; self.line = line
 
-class AssignNode:
+class AssignNode(Node):
+    __slots__ = ('name', 'value')
     def __init__(self, name, value, line=0): self.name = name; self.value = value; self.line = line
 
-class BinOpNode:
+class BinOpNode(Node):
+    __slots__ = ('left', 'op', 'right')
     def __init__(self, left, op, right, line=0): self.left = left; self.op = op; self.right = right; self.line = line
 
-class UnaryOpNode:
+class UnaryOpNode(Node):
+    __slots__ = ('op', 'operand')
     def __init__(self, op, operand, line=0): self.op = op; self.operand = operand; self.line = line
 
-class CallNode:
+class CallNode(Node):
+    __slots__ = ('func', 'args')
     def __init__(self, func, args, line=0): self.func = func; self.args = args; self.line = line
 
-class AttrNode:
+class AttrNode(Node):
+    __slots__ = ('obj', 'attr')
     def __init__(self, obj, attr, line=0): self.obj = obj; self.attr = attr; self.line = line
 
-class IndexNode:
+class IndexNode(Node):
+    __slots__ = ('obj', 'index')
     def __init__(self, obj, index, line=0): self.obj = obj; self.index = index; self.line = line
 
-class IndexAssignNode:
+class IndexAssignNode(Node):
+    __slots__ = ('target', 'value')
     def __init__(self, target, value, line=0): self.target = target; self.value = value; self.line = line
 
-class ListNode:
+class ListNode(Node):
+    __slots__ = ('elements',)
     def __init__(self, elements, line=0): self.elements = elements; self.line = line
 
-class TupleNode:
+class TupleNode(Node):
+    __slots__ = ('elements',)
     def __init__(self, elements, line=0): self.elements = elements; self.line = line
 
-class DictNode:
+class DictNode(Node):
+    __slots__ = ('pairs',)
     def __init__(self, pairs, line=0): self.pairs = pairs; self.line = line  # lista (klucz, wartość)
 
-class AugAssignNode:
+class AugAssignNode(Node):
+    __slots__ = ('name', 'op', 'value')
     def __init__(self, name, op, value, line=0): self.name = name; self.op = op; self.value = value; self.line = line
 
-class ListCompNode:
-    def __init__(self, expr, var, iterable): self.expr = expr; self.var = var; self.iterable = iterable
+class ListCompNode(Node):
+    __slots__ = ('expr', 'var', 'iterable')
+    def __init__(self, expr, var, iterable, line=0): self.expr = expr; self.var = var; self.iterable = iterable; self.line = line
 
-class IfNode:
-    def __init__(self, cases, else_body):
+class IfNode(Node):
+    __slots__ = ('cases', 'else_body')
+    def __init__(self, cases, else_body, line=0):
         self.cases = cases      # lista (warunek, ciało)
         self.else_body = else_body
+        self.line = line
 
-class RepeatNode:
-    def __init__(self, count, body): self.count = count; self.body = body
+class RepeatNode(Node):
+    __slots__ = ('count', 'body')
+    def __init__(self, count, body, line=0): self.count = count; self.body = body; self.line = line
 
-class EachNode:
-    def __init__(self, var, iterable, body): self.var = var; self.iterable = iterable; self.body = body
+class EachNode(Node):
+    __slots__ = ('var', 'iterable', 'body')
+    def __init__(self, var, iterable, body, line=0): self.var = var; self.iterable = iterable; self.body = body; self.line = line
 
-class EachUnpackNode:
-    def __init__(self, vars, iterable, body): self.vars = vars; self.iterable = iterable; self.body = body
+class EachUnpackNode(Node):
+    __slots__ = ('vars', 'iterable', 'body')
+    def __init__(self, vars, iterable, body, line=0): self.vars = vars; self.iterable = iterable; self.body = body; self.line = line
 
-class TilNode:
-    def __init__(self, condition, body): self.condition = condition; self.body = body
+class TilNode(Node):
+    __slots__ = ('condition', 'body')
+    def __init__(self, condition, body, line=0): self.condition = condition; self.body = body; self.line = line
 
-class FunNode:
-    def __init__(self, name, params, body): self.name = name; self.params = params; self.body = body
+class FunNode(Node):
+    __slots__ = ('name', 'params', 'body')
+    def __init__(self, name, params, body, line=0): self.name = name; self.params = params; self.body = body; self.line = line
 
-class AnonFunNode:
-    def __init__(self, params, body): self.params = params; self.body = body
+class AnonFunNode(Node):
+    __slots__ = ('params', 'body')
+    def __init__(self, params, body, line=0): self.params = params; self.body = body; self.line = line
 
-class GiveNode:
-    def __init__(self, value): self.value = value
+class GiveNode(Node):
+    __slots__ = ('value',)
+    def __init__(self, value, line=0): self.value = value; self.line = line
 
-class YieldNode:
-    def __init__(self, value): self.value = value
+class YieldNode(Node):
+    __slots__ = ('value',)
+    def __init__(self, value, line=0): self.value = value; self.line = line
 
-class CheckNode:
-    def __init__(self, expr, cases, else_body):
+class CheckNode(Node):
+    __slots__ = ('expr', 'cases', 'else_body')
+    def __init__(self, expr, cases, else_body, line=0):
         self.expr      = expr       # wyrażenie do sprawdzenia
         self.cases     = cases      # lista (wartość, ciało)
         self.else_body = else_body  # ciało dla 'other' lub None
+        self.line      = line
 
-class ModelNode:
-    def __init__(self, name, body): self.name = name; self.body = body
+class ModelNode(Node):
+    __slots__ = ('name', 'body')
+    def __init__(self, name, body, line=0): self.name = name; self.body = body; self.line = line
 
-class NetNode:
-    def __init__(self, name, params): self.name = name; self.params = params
+class NetNode(Node):
+    __slots__ = ('name', 'params')
+    def __init__(self, name, params, line=0): self.name = name; self.params = params; self.line = line
     # params = dict of ~key -> value node
 
-class NetLoadNode:
-    def __init__(self, name, path_node):
+class NetLoadNode(Node):
+    __slots__ = ('name', 'path_node', 'body')
+    def __init__(self, name, path_node, line=0):
         self.name = name
         self.path_node = path_node
         self.body = []  # empty — no block body, needed by generic exec loops
+        self.line = line
 
-class UseNode:
-    def __init__(self, module, alias=None, filepath=None, absolute=False):
+class UseNode(Node):
+    __slots__ = ('module', 'alias', 'filepath', 'absolute')
+    def __init__(self, module, alias=None, filepath=None, absolute=False, line=0):
         self.module = module      # Python module name (e.g. 'numpy')
         self.alias = alias        # optional alias (for both modules and files)
         self.filepath = filepath  # Kuda file path (e.g. 'utils.kuda')
         self.absolute = absolute  # True if @"path" (relative to CWD)
+        self.line = line
 
-class ExternNode:
-    def __init__(self, name, params, ret_type='double', c_file=None):
+class ExternNode(Node):
+    __slots__ = ('name', 'params', 'ret_type', 'c_file')
+    def __init__(self, name, params, ret_type='double', c_file=None, line=0):
         self.name = name        # nazwa funkcji C (None jeśli to extern "plik.c")
         self.params = params    # lista (nazwa, typ)
         self.ret_type = ret_type
         self.c_file = c_file   # ścieżka do pliku .c do dołączenia
+        self.line = line
 
-class OutNode:
-    def __init__(self, value): self.value = value
+class OutNode(Node):
+    __slots__ = ('value',)
+    def __init__(self, value, line=0): self.value = value; self.line = line
 
-class TryNode:
-    def __init__(self, try_body, fail_clauses):
+class TryNode(Node):
+    __slots__ = ('try_body', 'fail_clauses')
+    def __init__(self, try_body, fail_clauses, line=0):
         self.try_body = try_body
         # fail_clauses: list of (error_type, var_name, body)
         # error_type: str like 'TypeError', 'ValueError', or None = catch all
         # var_name: str or None
         self.fail_clauses = fail_clauses
+        self.line = line
 
-class BreakNode:
-    pass
+class BreakNode(Node):
+    __slots__ = ()
+    def __init__(self, line=0): self.line = line
 
-class ContinueNode:
-    pass
+class ContinueNode(Node):
+    __slots__ = ()
+    def __init__(self, line=0): self.line = line
 
-class ProgramNode:
-    def __init__(self, statements): self.statements = statements
+class ProgramNode(Node):
+    __slots__ = ('statements',)
+    def __init__(self, statements, line=0): self.statements = statements; self.line = line
 
 
 # === Parser ===
@@ -197,7 +280,7 @@ class Parser:
         self.skip_newlines()
         statements = []
         while self.current().type != TT_EOF:
-            stmt = self.parse_statement()
+            stmt = self._parse_statement_at_line()
             if stmt:
                 statements.append(stmt)
             self.skip_newlines()
@@ -211,7 +294,7 @@ class Parser:
         self.skip_newlines()
         statements = []
         while self.current().type not in (TT_DEDENT, TT_EOF):
-            stmt = self.parse_statement()
+            stmt = self._parse_statement_at_line()
             if stmt:
                 statements.append(stmt)
             self.skip_newlines()
@@ -219,6 +302,14 @@ class Parser:
             self.advance()
         return statements
 
+    def _parse_statement_at_line(self):
+        """parse_statement() that also stamps the statement with its source line."""
+        line = self.current().line
+        stmt = self.parse_statement()
+        if stmt is not None and not stmt.line:
+            stmt.line = line
+        return stmt
+
     def parse_statement(self):
         tok = self.current()
 
@@ -599,7 +690,7 @@ class Parser:
 
     def parse_assign_or_expr(self):
         expr = self.parse_expr()
-        line = getattr(expr, 'line', 0)
+        line = expr.line
 
         if self.current().type == TT_ASSIGN:
             self.advance()
@@ -8,9 +8,10 @@ import os
 KUDA_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, KUDA_DIR)
 
-from lexer import Lexer, LexerError
-from parser import Parser, ParseError, UseNode
+from lexer import LexerError
+from parser import ParseError, UseNode
 from interpreter import Interpreter, RuntimeError_
+from astcache import parse_file
 
 
 class PythonBridge:
@@ -23,14 +24,8 @@ class PythonBridge:
     """
 
     def run(self, path):
-        with open(path, 'r', encoding='utf-8') as f:
-            source = f.read()
-
         try:
-            lexer = Lexer(source)
-            tokens = lexer.tokenize()
-            parser = Parser(tokens)
-            ast = parser.parse()
+            ast = parse_file(path)
         except LexerError as e:
             print(str(e)); sys.exit(1)
         except ParseError as e:
@@ -44,7 +39,7 @@ class PythonBridge:
 
         # Run the program with interpreter (Python libraries accessible)
         try:
-            interpreter.run(ast)
+            interpreter.run(ast, path)
         except RuntimeError_ as e:
             print(str(e)); sys.exit(1)
         except Exception as e:
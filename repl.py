@@ -0,0 +1,248 @@
+"""
+repl.py — interactive Kuda console (kuda repl).
+
+Lines are fed one at a time to a single Lexer (Lexer.feed), so a pasted
+block of hundreds of lines is lexed once, not re-lexed on every line. The
+lexer state says structurally when the pending input is a complete
+statement: no open bracket or string, no block header waiting for a body,
+and no open indented block. An indented block ends with the next line
+back at column 0 (unless it is othif / other / fail), or with an empty
+line when no more input is already waiting — so blank lines inside a
+pasted function do not cut it short. Only then is the token list parsed
+and run.
+
+REPL commands (a command line at column 0 also closes an open block):
+    :time <expr>   evaluate, print the value, wall time and allocated blocks
+    :prof <stmt>   run it and print time and allocations per Kuda function
+"""
+
+import re
+import sys
+import time
+
+from lexer import Lexer, LexerError, TT_COLON, TT_NEWLINE, TT_INDENT, TT_DEDENT, TT_EOF
+from parser import (Parser, ParseError, NumberNode, StringNode, BoolNode, NoneNode,
+                    IdentNode, BinOpNode, UnaryOpNode, CallNode, AttrNode, IndexNode,
+                    ListNode, TupleNode, DictNode, ListCompNode, AnonFunNode)
+from interpreter import Interpreter, RuntimeError_
+
+# linia w kolumnie 0, która kontynuuje otwarty blok zamiast go kończyć
+_CONTINUES_BLOCK = re.compile(r'(othif|other|fail)\b')
+_LAYOUT = (TT_NEWLINE, TT_INDENT, TT_DEDENT, TT_EOF)
+_EXPRESSIONS = (NumberNode, StringNode, BoolNode, NoneNode, IdentNode, BinOpNode,
+                UnaryOpNode, CallNode, AttrNode, IndexNode, ListNode, TupleNode,
+                DictNode, ListCompNode, AnonFunNode)
+
+
+class Repl:
+    def __init__(self, version, interp=None, more_input=None):
+        self.version = version
+        self.interp = interp or Interpreter()
+        self.more_input = more_input or (lambda: False)
+        self._reset()
+
+    def _reset(self):
+        self.lexer = None     # Lexer bieżącego, niedokończonego wejścia
+        self.pending = ''     # linie z niezamkniętym stringiem, czekające na resztę
+
+    # === Wejście linia po linii ===
+
+    def feed(self, line):
+        """
+        Feed one input line. Runs every statement it completes and returns
+        True while more input is needed.
+        """
+        if self.lexer is not None and self.pending == '' and len(self.lexer.indent_stack) > 1 \
+                and line[:1] not in ('', ' ', '\t', '#') and not _CONTINUES_BLOCK.match(line):
+            # powrót do kolumny 0 zamyka poprzedni blok
+            self._run_pending()
+
+        text = self.pending + line
+        chunk = text if self.lexer is None else '\n' + text
+        if self.lexer is None:
+            self.lexer = Lexer('')
+        try:
+            self.lexer.feed(chunk)
+        except LexerError as e:
+            if 'Unterminated string' in str(e):
+                self.pending = text + '\n'
+                return True
+            print(str(e))
+            self._reset()
+            return False
+        self.pending = ''
+
+        if self._complete(blank=line.strip() == '' or line.lstrip().startswith('#')):
+            self._run_pending()
+            return False
+        return True
+
+    def _complete(self, blank):
+        lx = self.lexer
+        if lx.paren_depth > 0:
+            return False
+        last = next((t for t in reversed(lx.tokens) if t.type not in _LAYOUT), None)
+        if last is not None and last.type == TT_COLON:
+            return False
+        if len(lx.indent_stack) > 1:
+            return blank and not self.more_input()
+        return True
+
+    def _run_pending(self):
+        lx, self.lexer = self.lexer, None
+        self.pending = ''
+        if lx is None:
+            return
+        tokens = lx.finish()
+        if all(t.type in _LAYOUT for t in tokens):
+            return
+        self._guarded(lambda: self.interp.run(Parser(tokens).parse()))
+
+    def _guarded(self, action):
+        try:
+            return action()
+        except (LexerError, ParseError, RuntimeError_) as e:
+            print(str(e))
+        except Exception as e:
+            line_no = self.interp.current_line
+            prefix = f'[Kuda] Line {line_no}: ' if line_no else '[Kuda] '
+            print(f'{prefix}{e}')
+
+    # === :time / :prof ===
+
+    def command(self, line):
+        name, _, arg = line.strip().partition(' ')
+        arg = arg.strip()
+        if name in (':time', ':prof') and not arg:
+            print(f'[Kuda] Usage: {name} <code>')
+        elif name == ':time':
+            self._guarded(lambda: self._time(arg))
+        elif name == ':prof':
+            self._guarded(lambda: self._prof(arg))
+        else:
+            print(f"[Kuda] Unknown REPL command: '{name}' (try :time or :prof)")
+
+    def _parse(self, source):
+        return Parser(Lexer(source).tokenize()).parse()
+
+    def _time(self, source):
+        ast = self._parse(source)
+        interp = self.interp
+        stmts = ast.statements
+        last = stmts[-1] if stmts else None
+        value = None
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        for stmt in stmts:
+            if stmt is last and isinstance(stmt, _EXPRESSIONS):
+                value = interp.eval(stmt, interp.global_env)
+            else:
+                interp.exec(stmt, interp.global_env)
+        elapsed = time.perf_counter() - start
+        blocks = sys.getallocatedblocks() - blocks
+        if value is not None:
+            print(interp._to_str(value))
+        print(f'[time] {_fmt_time(elapsed)}, {blocks:+d} live blocks')
+
+    def _prof(self, source):
+        import tracemalloc
+        ast = self._parse(source)
+        interp = self.interp
+        calls = {}   # nazwa funkcji Kuda -> [wywołania, czas łączny, bajty]
+        active = set()
+        call_function = interp._call_function
+
+        def profiled(func, args):
+            name = func.name or '<anon fun>'
+            if name in active:      # rekurencja — liczymy tylko zewnętrzne wywołanie
+                calls[name][0] += 1
+                return call_function(func, args)
+            row = calls.setdefault(name, [0, 0.0, 0])
+            row[0] += 1
+            active.add(name)
+            blocks = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            try:
+                return call_function(func, args)
+            finally:
+                row[1] += time.perf_counter() - start
+                row[2] += tracemalloc.get_traced_memory()[0] - blocks
+                active.discard(name)
+
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        interp._call_function = profiled
+        base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            interp.run(ast)
+        finally:
+            elapsed = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            del interp._call_function
+            if not was_tracing:
+                tracemalloc.stop()
+            print(f'[prof] {_fmt_time(elapsed)}, {_fmt_bytes(current - base)} retained, '
+                  f'peak {_fmt_bytes(peak - base)}')
+            if calls:
+                print(f'{"calls":>9} {"time":>10} {"retained":>10}  fun')
+                for name, (n, t, mem) in sorted(calls.items(), key=lambda kv: -kv[1][1])[:10]:
+                    print(f'{n:>9} {_fmt_time(t):>10} {_fmt_bytes(mem):>10}  {name}')
+
+    # === Pętla ===
+
+    def run(self):
+        self.more_input = _stdin_ready
+        print(f"Kuda v{self.version} REPL — type 'exit' or Ctrl+C to quit, :time / :prof to measure")
+        while True:
+            try:
+                try:
+                    line = input('... ' if self.lexer is not None else '>>> ')
+                except EOFError:
+                    print()
+                    self._run_pending()
+                    break
+                if self.lexer is None and line.strip() in ('exit', 'quit'):
+                    break
+                if line.startswith(':') and self.lexer is not None and self.pending == '' \
+                        and self.lexer.paren_depth == 0:
+                    # :time / :prof w kolumnie 0 zamyka otwarty blok (wklejone wejście
+                    # nie ma pustej linii, która by go zamknęła) — najpierw blok, potem komenda
+                    self._run_pending()
+                if self.lexer is None and line.lstrip().startswith(':'):
+                    self.command(line)
+                    continue
+                self.feed(line)
+            except KeyboardInterrupt:
+                print()
+                if self.lexer is not None:
+                    self._reset()  # anuluj niedokończony blok, nie wychodzi z REPL
+                else:
+                    break
+
+
+def _stdin_ready():
+    """True when more input is already waiting (a paste), so an empty line is not the end."""
+    try:
+        import select
+        return bool(select.select([sys.stdin], [], [], 0)[0])
+    except (ImportError, OSError, ValueError):
+        return False
+
+
+def _fmt_time(seconds):
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:.1f} us'
+    if seconds < 1:
+        return f'{seconds * 1e3:.2f} ms'
+    return f'{seconds:.3f} s'
+
+
+def _fmt_bytes(n):
+    if abs(n) < 1024:
+        return f'{n} B'
+    if abs(n) < 1024 * 1024:
+        return f'{n / 1024:.1f} KB'
+    return f'{n / (1024 * 1024):.1f} MB'